@@ -1,7 +1,6 @@
-from groq import Groq
 import re
 
-client = Groq()
+from scripts.llm_client import chat_completion
 
 CHUNK_SIZE = 1200
 MAX_TOKENS = 256
@@ -19,8 +18,7 @@ def chunk_text(text, size=CHUNK_SIZE):
 
 
 def summarize_chunk(chunk):
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
+    return chat_completion(
         messages=[
             {"role": "system", "content": SUMMARY_PROMPT},
             {"role": "user", "content": chunk}
@@ -28,7 +26,6 @@ def summarize_chunk(chunk):
         temperature=0.1,
         max_tokens=MAX_TOKENS
     )
-    return response.choices[0].message.content
 
 
 def summarize_document(text):
@@ -1,18 +1,13 @@
 import faiss
-import pickle
-from sentence_transformers import SentenceTransformer
 
-from config.settings import EMBED_MODEL, TOP_K
-
-
-INDEX_PATH = "embeddings/faiss.index"
-META_PATH = "embeddings/metadata.pkl"
+from config.settings import EMBED_MODEL, TOP_K, INDEX_PATH, CHUNK_STORE_PATH
+from scripts.chunk_store import ChunkStore
+from scripts.embedders import load_embedder
 
 
 def load_kb():
     index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "rb") as f:
-        metadata = pickle.load(f)
+    metadata = ChunkStore(CHUNK_STORE_PATH)
     return index, metadata
 
 
@@ -22,7 +17,8 @@ def search(query, index, metadata, embedder, k=TOP_K):
 
     results = []
     for idx in indices[0]:
-        results.append(metadata[idx])
+        if idx >= 0:
+            results.append(metadata[idx])
 
     return results
 
@@ -30,7 +26,7 @@ def search(query, index, metadata, embedder, k=TOP_K):
 if __name__ == "__main__":
     print("🔍 Loading knowledge base...")
     index, metadata = load_kb()
-    embedder = SentenceTransformer(EMBED_MODEL)
+    embedder = load_embedder(EMBED_MODEL)
 
     print("✅ KB loaded successfully\n")
 
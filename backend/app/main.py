@@ -1,28 +1,42 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, Request, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from typing import Optional
-import faiss
+import json
+import time
+import threading
 
+from config.settings import (
+    WARMUP_ON_STARTUP,
+    TOP_K,
+    KB_BATCH_MAX_SIZE,
+    KB_BATCH_MAX_WAIT_MS,
+    MAX_UPLOAD_BYTES,
+    UPLOAD_READ_BLOCK_BYTES,
+    REQUEST_ID_HEADER
+)
+from scripts import registry, telemetry
+from scripts.telemetry import span
+from scripts.executors import cpu_pool, run_cpu, run_io, iterate_in_executor, shutdown
+from scripts.micro_batcher import MicroBatcher
+from scripts.rag_groq import retrieve_batch, rewrite_query, build_context, call_llm
+from scripts.llm_client import llm_status
+from scripts.document_metadata import normalize_filters
 from scripts.upload_rag import (
-    build_temp_index,
+    DocumentTooLarge,
+    UnknownDocumentError,
+    StreamingIngest,
+    get_session,
     ask_question,
     summarize_by_sections,
-    summarize_document
+    summarize_document,
+    stream_answer,
+    iter_section_summaries,
+    stream_summary
 )
 
 app = FastAPI(title="Legal Document RAG API")
 
-#---------------------------------------------
-# Solving the memory problem
-#---------------------------------------------
-
-index = faiss.read_index(
-    "embeddings/faiss.index",
-    faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
-)
-
-
-
 
 # --------------------------------------------------
 # CORS (Firebase frontend support)
@@ -37,65 +51,470 @@ app.add_middleware(
 
 
 # --------------------------------------------------
-# HEALTH CHECK
+# UPLOAD SIZE LIMIT (BEFORE THE BODY IS PARSED)
+# --------------------------------------------------
+MIN_DOCUMENT_CHARS = 50
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + 64 * 1024   # headroom for the other form fields
+
+
+@app.middleware("http")
+async def limit_request_size(request: Request, call_next):
+    # Multipart bodies are spooled before the route runs, so reject oversized
+    # uploads from the declared length; StreamingIngest enforces the limit
+    # for bodies sent without one.
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_REQUEST_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds {MAX_REQUEST_BYTES} bytes"}
+        )
+    return await call_next(request)
+
+
+# --------------------------------------------------
+# REQUEST IDS, TRACES AND HTTP METRICS (OUTERMOST MIDDLEWARE)
+# --------------------------------------------------
+UNTRACED_PATHS = {"/metrics", "/health"}   # scrapes / probes would flush the trace buffer
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    # Streamed responses return before their body is produced: their spans
+    # keep arriving after the trace's duration_ms is set.
+    request_id = request.headers.get(REQUEST_ID_HEADER) or telemetry.new_request_id()
+    start = time.perf_counter()
+    status = 500
+    telemetry.HTTP_IN_FLIGHT.inc()
+
+    with telemetry.trace_request(
+        request_id, f"{request.method} {request.url.path}",
+        keep=request.url.path not in UNTRACED_PATHS
+    ) as trace:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            telemetry.HTTP_IN_FLIGHT.dec()
+            # Label by route template, never the raw path (unbounded label values)
+            route = request.scope.get("route")
+            telemetry.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=status
+            )
+            trace.attrs["status"] = status
+
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
+
+# --------------------------------------------------
+# STARTUP (MODELS LOAD LAZILY; OPTIONAL BACKGROUND WARM-UP)
+# --------------------------------------------------
+@app.on_event("startup")
+def start_warm_up():
+    if WARMUP_ON_STARTUP:
+        threading.Thread(
+            target=registry.warm_up, args=(WARMUP_ON_STARTUP,), daemon=True
+        ).start()
+
+
+@app.on_event("startup")
+def start_job_workers():
+    registry.get_job_queue().start()
+
+
+@app.on_event("startup")
+def start_kb_watcher():
+    registry.start_kb_watcher()
+
+
+@app.on_event("shutdown")
+def stop_pools():
+    registry.stop_kb_watcher()
+    registry.get_job_queue().stop()
+    shutdown()
+
+
+# --------------------------------------------------
+# HEALTH CHECK (LIVENESS + READINESS)
 # --------------------------------------------------
 @app.get("/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", **registry.status()}
+
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/traces")
+def traces(limit: int = 20):
+    return {"traces": telemetry.recent_traces(limit)}
+
+
+@app.get("/traces/{request_id}")
+def get_trace(request_id: str):
+    trace = telemetry.get_trace(request_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired request id")
+    return trace
+
+
+@app.get("/kb/cache/stats")
+def kb_cache_stats():
+    return registry.get_query_cache().stats()
+
+
+@app.post("/kb/reload")
+async def kb_reload():
+    # Also happens automatically when build_kb publishes a new version
+    try:
+        return await run_io(registry.reload_kb)
+    except Exception as exc:
+        raise HTTPException(
+            status_code=500, detail=f"Reload failed, still serving the previous KB: {exc!r}"
+        )
+
+
+@app.get("/llm/cache/stats")
+def llm_cache_stats():
+    cache = registry.get_llm_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@app.get("/llm/status")
+def get_llm_status():
+    # Backend, model order and per-model circuit breaker states
+    return llm_status()
 
 
 # --------------------------------------------------
-# DOCUMENT PROCESSING ENDPOINT
+# SHARED REQUEST HANDLING
 # --------------------------------------------------
-@app.post("/document/process")
-async def process_document(
-    mode: str = Form(...),
-    question: Optional[str] = Form(None),
-    file: Optional[UploadFile] = File(None),
-    text: Optional[str] = Form(None)
-):
-    if not file and not text:
-        raise HTTPException(status_code=400, detail="Provide either file or text")
+def validate_document_request(mode, question, file, text, document_id):
+    if not file and not text and not document_id:
+        raise HTTPException(status_code=400, detail="Provide either file, text or document_id")
 
     if mode not in ["qa", "section", "summary"]:
         raise HTTPException(status_code=400, detail="Invalid mode")
 
+    if mode == "qa" and not question:
+        raise HTTPException(status_code=400, detail="Question required for QA mode")
+
+
+def check_document_text(document_text):
+    if document_text is None:
+        return
+    if len(document_text.encode("utf-8")) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Document exceeds {MAX_UPLOAD_BYTES} bytes")
+    if len(document_text.strip()) < MIN_DOCUMENT_CHARS:
+        raise HTTPException(status_code=400, detail="Document text too short")
+
+
+async def read_upload(file: UploadFile) -> str:
+    """Whole upload as text (for durable jobs), read block by block up to the size limit."""
+    blocks, size = [], 0
+    while block := await file.read(UPLOAD_READ_BLOCK_BYTES):
+        size += len(block)
+        if size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Document exceeds {MAX_UPLOAD_BYTES} bytes")
+        blocks.append(block)
+    return b"".join(blocks).decode("utf-8", errors="ignore")
+
+
+async def ingest_upload(file: UploadFile):
+    """Decode and chunk an upload block by block on the CPU pool, then embed it unless already stored."""
+    ingest = StreamingIngest()
+    try:
+        with span("upload_ingest"):
+            while block := await file.read(UPLOAD_READ_BLOCK_BYTES):
+                await run_cpu(ingest.feed, block)
+            return await run_cpu(ingest.finish, MIN_DOCUMENT_CHARS)
+    except DocumentTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+async def load_document_session(mode, question, file, text, document_id):
+    validate_document_request(mode, question, file, text, document_id)
+
     # --------------------------------------------------
-    # LOAD DOCUMENT TEXT
+    # UPLOADS: STREAMED INTO A SESSION WITHOUT BUFFERING THE TEXT
     # --------------------------------------------------
     if file:
-        document_text = (await file.read()).decode("utf-8", errors="ignore")
-    else:
-        document_text = text
+        return await ingest_upload(file), None
 
-    if len(document_text.strip()) < 50:
-        raise HTTPException(status_code=400, detail="Document text too short")
+    # --------------------------------------------------
+    # LOAD OR BUILD DOCUMENT SESSION (EMBEDDED ONCE, ON THE CPU POOL)
+    # --------------------------------------------------
+    document_text = text
+    check_document_text(document_text)
+    try:
+        session = await run_cpu(get_session, document_text, document_id)
+    except UnknownDocumentError:
+        raise HTTPException(
+            status_code=404,
+            detail="Unknown document_id, upload the document again"
+        )
+
+    return session, document_text
+
+
+# --------------------------------------------------
+# DOCUMENT PROCESSING ENDPOINT
+# --------------------------------------------------
+@app.post("/document/process")
+async def process_document(
+    mode: str = Form(...),
+    question: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None)
+):
+    session, document_text = await load_document_session(
+        mode, question, file, text, document_id
+    )
 
     # --------------------------------------------------
-    # PROCESS BASED ON MODE
+    # PROCESS BASED ON MODE (BLOCKING LLM CALLS ON THE I/O POOL)
     # --------------------------------------------------
     if mode == "qa":
-        if not question:
-            raise HTTPException(status_code=400, detail="Question required for QA mode")
-
-        index, chunks = build_temp_index(document_text)
-        answer = ask_question(index, chunks, question)
+        answer = await run_io(ask_question, session.index, session.chunks, question)
 
         return {
             "mode": "qa",
+            "document_id": session.document_id,
             "answer": answer
         }
 
     elif mode == "section":
-        sections = summarize_by_sections(document_text)
+        sections = await run_io(summarize_by_sections, document_text, session.document_id)
         return {
             "mode": "section",
+            "document_id": session.document_id,
             "sections": sections
         }
 
     elif mode == "summary":
-        summary = summarize_document(document_text)
+        summary = await run_io(summarize_document, document_text, session.document_id)
         return {
             "mode": "summary",
+            "document_id": session.document_id,
             "summary": summary
         }
+
+
+# --------------------------------------------------
+# STREAMING VARIANT (SERVER-SENT EVENTS)
+# --------------------------------------------------
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_document_events(mode, question, session, document_text):
+    # Sync generator: stepped on the I/O pool by iterate_in_executor
+    yield sse_event("session", {"mode": mode, "document_id": session.document_id})
+
+    try:
+        if mode == "qa":
+            for piece in stream_answer(session.index, session.chunks, question):
+                yield sse_event("token", {"text": piece})
+
+        elif mode == "section":
+            for title, summary in iter_section_summaries(document_text, session.document_id):
+                yield sse_event("section", {"title": title, "summary": summary})
+
+        elif mode == "summary":
+            for event, data in stream_summary(document_text, session.document_id):
+                if event == "token":
+                    yield sse_event("token", {"text": data})
+                else:
+                    yield sse_event(event, data)
+
+    except Exception as exc:
+        yield sse_event("error", {"detail": str(exc)})
+        return
+
+    yield sse_event("done", {})
+
+
+@app.post("/document/process/stream")
+async def process_document_stream(
+    mode: str = Form(...),
+    question: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None)
+):
+    session, document_text = await load_document_session(
+        mode, question, file, text, document_id
+    )
+
+    return StreamingResponse(
+        iterate_in_executor(stream_document_events(mode, question, session, document_text)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# --------------------------------------------------
+# KNOWLEDGE-BASE SEARCH (MICRO-BATCHED)
+# --------------------------------------------------
+MAX_KB_K = 50
+
+
+def _search_batch(items):
+    # items: [(query, k, filters)]; one encode + one search at the largest k
+    # per distinct filter
+    results = [None] * len(items)
+    groups = {}
+    for position, (_, _, filters) in enumerate(items):
+        groups.setdefault(filters, []).append(position)
+
+    for filters, positions in groups.items():
+        found = retrieve_batch(
+            [items[p][0] for p in positions],
+            k=max(items[p][1] for p in positions),
+            filters=filters
+        )
+        for p, r in zip(positions, found):
+            results[p] = r[:items[p][1]]
+    return results
+
+
+kb_batcher = MicroBatcher(
+    _search_batch, KB_BATCH_MAX_SIZE, KB_BATCH_MAX_WAIT_MS, executor=cpu_pool()
+)
+
+
+def _validate_kb_request(query: str, k: int):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query must not be empty")
+    if not 1 <= k <= MAX_KB_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_KB_K}")
+
+
+def _validate_filters(filters):
+    if filters is not None and not registry.get_chunk_store().has_metadata:
+        raise HTTPException(
+            status_code=400,
+            detail="This knowledge base has no court / year / outcome metadata to filter on"
+        )
+
+
+@app.post("/kb/search")
+async def kb_search(
+    query: str = Form(...),
+    k: int = Form(TOP_K),
+    court: Optional[str] = Form(None),
+    year_from: Optional[int] = Form(None),
+    year_to: Optional[int] = Form(None),
+    outcome: Optional[str] = Form(None)
+):
+    _validate_kb_request(query, k)
+    filters = normalize_filters(court, year_from, year_to, outcome)
+    _validate_filters(filters)
+    # Batched searches run outside any one request's trace: time the wait here
+    with span("kb_search", k=k):
+        results = await kb_batcher.submit((query, k, filters))
+
+    return {
+        "query": query,
+        "results": results
+    }
+
+
+@app.post("/kb/ask")
+async def kb_ask(
+    query: str = Form(...),
+    mode: str = Form("qa"),
+    k: int = Form(TOP_K),
+    rewrite: bool = Form(True),
+    court: Optional[str] = Form(None),
+    year_from: Optional[int] = Form(None),
+    year_to: Optional[int] = Form(None),
+    outcome: Optional[str] = Form(None)
+):
+    _validate_kb_request(query, k)
+    if mode not in ["qa", "summary"]:
+        raise HTTPException(status_code=400, detail="Invalid mode")
+
+    filters = normalize_filters(court, year_from, year_to, outcome)
+    _validate_filters(filters)
+    search_query = await run_io(rewrite_query, query) if rewrite else query
+    with span("kb_search", k=k):
+        results = await kb_batcher.submit((search_query, k, filters))
+    context, citations = build_context(results)
+
+    answer = await run_io(
+        call_llm,
+        context,
+        search_query if mode == "qa" else None,
+        mode
+    )
+
+    return {
+        "mode": mode,
+        "query": query,
+        "rewritten_query": search_query,
+        "answer": answer,
+        "citations": citations
+    }
+
+
+# --------------------------------------------------
+# BACKGROUND JOBS (SUBMIT, POLL, CANCEL)
+# --------------------------------------------------
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    mode: str = Form(...),
+    question: Optional[str] = Form(None),
+    file: Optional[UploadFile] = File(None),
+    text: Optional[str] = Form(None),
+    document_id: Optional[str] = Form(None)
+):
+    validate_document_request(mode, question, file, text, document_id)
+
+    # Jobs keep the text in the queue so they can run again after a restart
+    document_text = await read_upload(file) if file else text
+    check_document_text(document_text)
+
+    if document_text is None:
+        # Fail fast on an unknown id instead of queueing a doomed job
+        try:
+            await run_cpu(get_session, None, document_id)
+        except UnknownDocumentError:
+            raise HTTPException(
+                status_code=404,
+                detail="Unknown document_id, upload the document again"
+            )
+
+    params = {"question": question, "text": document_text, "document_id": document_id}
+    job_id = await run_io(registry.get_job_queue().submit, mode, params)
+
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/stats")
+def job_stats():
+    return registry.get_job_queue().stats()
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    job = registry.get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job_id")
+    return job
+
+
+@app.delete("/jobs/{job_id}")
+def cancel_job(job_id: str):
+    job = registry.get_job_queue().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job_id")
+    return job
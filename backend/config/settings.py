@@ -1,10 +1,166 @@
+import os
+
 DATA_RAW_PATH = "data/raw/CJPE_ext_SCI_HCs_tribunals_dailyorder_dev_wo_RoD_ternary.csv"
 EXTRACTED_TEXT_PATH = "data/extracted"
+DOCUMENT_METADATA_PATH = "data/metadata.jsonl"   # court / year / outcome per extracted file
+
+# Ingested corpus (scripts/corpus.py): the CSV streamed into gzip JSONL shards
+# plus an offset index (id, sha256, metadata). build_kb reads it when present
+# and falls back to the EXTRACTED_TEXT_PATH files otherwise.
+CORPUS_PATH = "data/corpus"
+CORPUS_CSV_CHUNK_ROWS = 500                  # CSV rows parsed per pandas chunk
+CORPUS_SHARD_BYTES = 256 * 1024 * 1024       # compressed bytes before starting a new shard
+CORPUS_READ_BUFFER_BYTES = 8 * 1024 * 1024
+CORPUS_COMPRESSION_LEVEL = 6
+
+EMBED_MODEL = "all-mpnet-base-v2"                               # knowledge base
+UPLOAD_EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"   # uploaded documents
 
-EMBED_MODEL = "all-mpnet-base-v2"
+# Embedding runtime (scripts/embedders.py) for both models: "torch"
+# (SentenceTransformer), "onnx" or "onnx_int8" (ONNX Runtime, exported to
+# ONNX_MODEL_DIR on first use; int8 = dynamic weight quantization). Changing
+# it makes build_kb start over, so KB and query vectors stay comparable.
+# Check agreement / speed first: python -m scripts.benchmark_embedder
+EMBED_BACKEND = "torch"
+ONNX_MODEL_DIR = "models/onnx"
+ONNX_INTRA_OP_THREADS = None     # threads per encode call; None = ONNX Runtime default (physical cores)
+ONNX_INTER_OP_THREADS = 1
+ONNX_THREAD_SPINNING = False     # busy-wait between ops: lower latency, but burns idle CPU in the API
 
 CHUNK_SIZE_WORDS = 450
 CHUNK_OVERLAP = 50
+CHUNK_UNIT = "word"     # "word" | "char" | "token" (embedder tokenizer); applies to size and overlap
 
 TOP_K = 5
 
+# Knowledge-base artifacts
+INDEX_PATH = "embeddings/faiss.index"
+CHUNK_STORE_PATH = "embeddings/chunks"     # mmap chunk store (replaces metadata.pkl)
+LEXICAL_INDEX_PATH = "embeddings/bm25"     # BM25 inverted index over the same chunk rows
+SHARDS_PATH = "embeddings/shards"          # one index per court, for filtered search
+KB_VERSION_PATH = "embeddings/kb_version.json"   # written last by build_kb; the API reloads when it changes
+KB_RELOAD_POLL_SECONDS = 10                      # None disables the watcher (POST /kb/reload still works)
+
+# KB build: chunk dedup before embedding. Repeats are stored as aliases of
+# the first copy's row (one vector, every (file, chunk_id) location kept).
+DEDUP_MODE = "minhash"          # "minhash" (exact + near-duplicates) | "exact" | None
+DEDUP_NUM_PERM = 64             # MinHash signature length
+DEDUP_BANDS = 16                # LSH bands, must divide DEDUP_NUM_PERM
+DEDUP_SHINGLE_WORDS = 5
+DEDUP_THRESHOLD = 0.9           # estimated Jaccard similarity counted as a duplicate
+
+# Serving index type (see scripts/benchmark_index.py for recall/latency trade-offs)
+INDEX_TYPE = "flat"             # flat | ivf_flat | ivf_pq | hnsw | sq8 | fp16
+IVF_NLIST = 1024                # IVF cells, capped at num_vectors / 39
+PQ_M = 48                       # PQ sub-quantizers, must divide the dimension
+PQ_NBITS = 8
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+TRAIN_SAMPLE_SIZE = 100_000     # vectors sampled for IVF / PQ / SQ training
+NPROBE = 16                     # IVF cells scanned per query
+EF_SEARCH = 64                  # HNSW candidate list size per query
+
+# KB retrieval mode: "dense", "lexical", "hybrid" (reciprocal rank fusion of both),
+# or "auto" = lexical only for citation-style queries, hybrid otherwise
+# (dense when no lexical index has been built)
+RETRIEVAL_MODE = "auto"
+HYBRID_CANDIDATES = 50    # per-retriever depth fused in hybrid mode
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# KB sharding: one index per SHARD_FIELD value, so a court-filtered query
+# only scans that court's vectors. Other filters (year, outcome) use an ID
+# selector inside the shards searched.
+SHARD_FIELD = "court"
+SHARD_MIN_TRAINED_SIZE = 10_000   # smaller shards use a flat index instead of INDEX_TYPE
+SHARD_SEARCH_WORKERS = 4          # shards searched in parallel per query batch
+
+# /kb/search micro-batching: concurrent queries share one encode + one search
+KB_BATCH_MAX_SIZE = 32
+KB_BATCH_MAX_WAIT_MS = 5        # max latency added while a batch fills up
+
+# Query rewrite + query embedding cache (in-process LRU, optional SQLite store)
+QUERY_CACHE_MAX_ITEMS = 10_000
+QUERY_CACHE_TTL_SECONDS = 7 * 24 * 3600
+QUERY_CACHE_PATH = "cache/query_cache.sqlite3"   # None keeps the cache in memory only
+
+
+# Uploaded-document sessions (re-used across qa / section / summary calls)
+DOC_STORE_MAX_BYTES = 512 * 1024 * 1024
+DOC_STORE_SPILL_DIR = "cache/documents"     # None disables spill-to-disk
+DOC_STORE_SPILL_MAX_BYTES = 4 * 1024 * 1024 * 1024   # least recently used spills go first; None = no limit
+DOC_STORE_SPILL_TTL_SECONDS = 7 * 24 * 3600          # spills unused this long are deleted; None = keep
+
+# Streaming upload ingest (file uploads are decoded and chunked block by block, then
+# embedded once the content hash shows the document isn't already stored)
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024   # larger uploads are rejected with 413
+UPLOAD_READ_BLOCK_BYTES = 1024 * 1024
+UPLOAD_EMBED_BATCH_SIZE = 64          # chunks per encode() call
+
+# LLM
+LLM_MODEL = "llama-3.1-8b-instant"
+LLM_FALLBACK_MODELS = ["mixtral-8x7b-32768"]   # tried in order when LLM_MODEL fails or is skipped
+
+# LLM backend (scripts/llm_backends.py): "groq" (GROQ_API_KEY), "openai" for any
+# OpenAI-compatible server at LLM_BASE_URL (vLLM, llama.cpp, Ollama; bearer key
+# from LLM_API_KEY when set) or "mock" (offline, deterministic replies)
+LLM_BACKEND = "groq"
+LLM_BASE_URL = "http://localhost:8080/v1"
+LLM_TIMEOUT_SECONDS = 60
+LLM_POOL_MAX_CONNECTIONS = 64       # keep-alive connections shared by every call
+
+# LLM retries (scripts/llm_client.py): exponential backoff, or the server's
+# retry-after / x-ratelimit-reset-* when rate limited. A wait longer than
+# LLM_MAX_BACKOFF_SECONDS moves on to the next model instead.
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BACKOFF_SECONDS = 1.0     # doubled after every failed attempt
+LLM_MAX_BACKOFF_SECONDS = 20
+# Retries and hedges per window are capped at LLM_RETRY_BUDGET_MIN plus
+# LLM_RETRY_BUDGET_RATIO of the calls made, so an outage can't multiply load
+LLM_RETRY_BUDGET_RATIO = 0.2
+LLM_RETRY_BUDGET_MIN = 10
+LLM_RETRY_BUDGET_WINDOW_SECONDS = 10
+# Per-model circuit breaker: after LLM_BREAKER_FAILURES consecutive failures a
+# model is skipped for LLM_BREAKER_COOLDOWN_SECONDS, then one trial call decides
+LLM_BREAKER_FAILURES = 3
+LLM_BREAKER_COOLDOWN_SECONDS = 30
+# Hedging: send a duplicate of a (non-streaming) call still running after this long
+LLM_HEDGE_AFTER_MS = None           # e.g. 3000; None disables hedging
+
+# Content-addressed LLM response cache (key: model, prompts, temperature, max_tokens)
+LLM_CACHE_PATH = "cache/llm_cache.sqlite3"      # None disables the cache
+LLM_CACHE_MAX_BYTES = 256 * 1024 * 1024
+LLM_CACHE_TTL_SECONDS = None                    # None = keep until evicted by size
+
+# Long-document summaries: token-packed map calls + parallel tree reduce.
+# Budgets are counted with SUMMARY_TOKENIZER as a proxy for the LLM's own
+# tokenizer and leave headroom below the model context window.
+SUMMARY_TOKENIZER = UPLOAD_EMBED_MODEL
+SUMMARY_MAP_TOKEN_BUDGET = 3000       # document tokens per map call
+SUMMARY_REDUCE_TOKEN_BUDGET = 4000    # partial-summary tokens per reduce / final call
+
+# Concurrent LLM map step (summaries)
+SUMMARY_MAX_CONCURRENCY = 8       # max in-flight Groq calls per document
+
+# API worker pools (scripts/executors.py): keep blocking work off the event loop
+CPU_POOL_WORKERS = max(1, (os.cpu_count() or 2) - 1)   # encode + FAISS
+IO_POOL_WORKERS = 64                                   # blocking Groq calls / streams
+
+# Background jobs (/jobs API): durable SQLite queue + local worker threads
+JOB_DB_PATH = "cache/jobs.sqlite3"
+JOB_WORKERS = 2                         # jobs running at once (each fans out its own LLM calls)
+JOB_RESULT_TTL_SECONDS = 24 * 3600      # finished jobs are purged after this
+JOB_POLL_SECONDS = 1.0
+
+# API startup: resources loaded in the background right after boot
+# (see scripts/registry.WARMUP_TARGETS); everything else loads on first use
+WARMUP_ON_STARTUP = ["upload_embedder"]
+
+# Telemetry: Prometheus metrics on /metrics and request-scoped trace spans
+# (scripts/telemetry.py). Every request gets an id (taken from REQUEST_ID_HEADER
+# when the client sends one); the last TRACE_BUFFER_SIZE traces are kept for
+# /traces, and traces slower than TRACE_LOG_SLOW_MS are printed as JSON.
+REQUEST_ID_HEADER = "X-Request-ID"
+TRACE_BUFFER_SIZE = 256
+TRACE_LOG_SLOW_MS = 5000          # None disables slow-trace logging
@@ -0,0 +1,39 @@
+import os
+import json
+
+import numpy as np
+
+
+# ======================================================
+# WRITE-TEMP-THEN-RENAME HELPERS
+# ======================================================
+# os.replace is atomic on POSIX and Windows, so readers (and a process
+# restarted after a crash) see either the old file or the new one, never a
+# partially written mix.
+
+def _fsync_and_replace(tmp_path: str, path: str):
+    with open(tmp_path, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(path: str, obj):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    _fsync_and_replace(tmp_path, path)
+
+
+def atomic_save_npy(path: str, array: np.ndarray):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    _fsync_and_replace(tmp_path, path)
+
+
+def atomic_write_index(index, path: str):
+    import faiss
+
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    _fsync_and_replace(tmp_path, path)
@@ -0,0 +1,107 @@
+import re
+import time
+import random
+import argparse
+
+from scripts.chunk_text import iter_chunks
+
+
+# ======================================================
+# SYNTHETIC JUDGMENT TEXT
+# ======================================================
+VOCAB = (
+    "the appellant respondent court held that under section of the code "
+    "criminal procedure bail application was filed before high tribunal "
+    "learned counsel submitted order dated petition dismissed allowed "
+    "evidence witness judgment impugned accused state government"
+).split()
+
+
+def synthetic_judgment(target_bytes: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    sentences = []
+    size = 0
+    while size < target_bytes:
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(6, 60))]
+        sentence = " ".join(words).capitalize() + "."
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return " ".join(sentences)
+
+
+# ======================================================
+# PREVIOUS IMPLEMENTATION (FOR COMPARISON)
+# ======================================================
+def legacy_chunk_text(text, max_words=450, overlap=50):
+    sentences = re.split(r'(?<=[.?!])\s+', text)
+    chunks = []
+    current = []
+
+    for sent in sentences:
+        current.append(sent)
+        if len(" ".join(current).split()) >= max_words:
+            chunks.append(" ".join(current))
+            current = current[-overlap:]
+
+    if current:
+        chunks.append(" ".join(current))
+
+    return chunks
+
+
+# ======================================================
+# BENCHMARK
+# ======================================================
+def time_call(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chunker scaling benchmark")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[0.25, 0.5, 1, 2, 4, 8])
+    parser.add_argument("--legacy-max-mb", type=float, default=0.5,
+                        help="skip the quadratic legacy chunker above this size")
+    parser.add_argument("--tokenizer", default=None,
+                        help="HF tokenizer name to also benchmark unit='token'")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+
+    modes = [("word", 450, 50), ("char", 1200, 150)]
+    if tokenizer is not None:
+        modes.append(("token", 380, 40))
+
+    header = f"{'size MB':>8} {'impl':>8} {'chunks':>7} {'seconds':>9} {'s / MB':>8}"
+    print(header)
+    print("-" * len(header))
+
+    for size_mb in args.sizes_mb:
+        text = synthetic_judgment(int(size_mb * 1024 * 1024))
+        mb = len(text.encode("utf-8")) / (1024 * 1024)
+
+        for unit, max_size, overlap in modes:
+            seconds, n = time_call(
+                lambda: sum(1 for _ in iter_chunks(text, max_size, overlap, unit, tokenizer)),
+                args.repeat
+            )
+            print(f"{mb:8.2f} {unit:>8} {n:7d} {seconds:9.3f} {seconds / mb:8.3f}")
+
+        if size_mb <= args.legacy_max_mb:
+            seconds, chunks = time_call(lambda: legacy_chunk_text(text), 1)
+            print(f"{mb:8.2f} {'legacy':>8} {len(chunks):7d} {seconds:9.3f} {seconds / mb:8.3f}")
+
+    print("\nA flat 's / MB' column across sizes means linear scaling.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from config.settings import (
+    EMBED_MODEL,
+    TOP_K,
+    CHUNK_STORE_PATH,
+    CORPUS_PATH,
+    CHUNK_SIZE_WORDS,
+    CHUNK_OVERLAP,
+    ONNX_MODEL_DIR
+)
+from scripts.embedders import (
+    EMBED_BACKENDS,
+    MODEL_FILES,
+    OnnxEmbedder,
+    export_dir,
+    export_onnx,
+    load_embedder
+)
+
+
+# ======================================================
+# SAMPLE TEXT
+# ======================================================
+QUERY_WORDS = 16     # queries are the opening words of held-out chunks
+
+
+def load_texts(count: int):
+    """`count` chunk texts from the KB chunk store, else chunked from the corpus."""
+    if os.path.exists(CHUNK_STORE_PATH):
+        from scripts.chunk_store import ChunkStore
+        store = ChunkStore(CHUNK_STORE_PATH)
+        rows = np.random.default_rng(0).permutation(len(store))[:count]
+        return [store[int(i)]["text"] for i in rows]
+
+    from scripts.corpus import CorpusReader, has_corpus
+    from scripts.chunk_text import iter_chunks
+    if not has_corpus(CORPUS_PATH):
+        raise SystemExit(f"❌ Need a chunk store ({CHUNK_STORE_PATH}) or corpus ({CORPUS_PATH}) to sample")
+
+    texts = []
+    for record in CorpusReader(CORPUS_PATH).iter_records():
+        texts.extend(iter_chunks(record["text"], CHUNK_SIZE_WORDS, CHUNK_OVERLAP))
+        if len(texts) >= count:
+            break
+    return texts[:count]
+
+
+# ======================================================
+# QUALITY (AGAINST THE PYTORCH EMBEDDINGS)
+# ======================================================
+def normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def top_k(queries, corpus, k):
+    scores = normalize(queries) @ normalize(corpus).T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def quality(reference, candidate, ref_queries, cand_queries, k):
+    cosine = (normalize(reference) * normalize(candidate)).sum(axis=1)
+    truth = top_k(ref_queries, reference, k)
+    found = top_k(cand_queries, candidate, k)
+    recall = sum(len(set(f) & set(t)) for f, t in zip(found, truth)) / truth.size
+    return {"cosine_mean": float(cosine.mean()), "cosine_min": float(cosine.min()),
+            f"recall@{k}": recall}
+
+
+# ======================================================
+# THROUGHPUT
+# ======================================================
+def throughput(embedder, texts, batch_size):
+    embedder.encode(texts[:batch_size], batch_size=batch_size)   # warm-up: first run allocates
+    start = time.perf_counter()
+    vectors = embedder.encode(texts, batch_size=batch_size)
+    seconds = time.perf_counter() - start
+    return np.asarray(vectors, dtype="float32"), len(texts) / seconds
+
+
+def query_latency(embedder, queries):
+    """p50 / p99 ms for one query per call, the shape of a KB search."""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedder.encode([query], batch_size=1)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.percentile(latencies, 50)), float(np.percentile(latencies, 99))
+
+
+def make_embedder(model, backend, threads):
+    if backend == "torch":
+        return load_embedder(model, "torch")
+    return OnnxEmbedder(model, quantized=backend == "onnx_int8", root=ONNX_MODEL_DIR,
+                        intra_threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding backend agreement / throughput benchmark")
+    parser.add_argument("--model", default=EMBED_MODEL)
+    parser.add_argument("--backends", nargs="+", default=list(EMBED_BACKENDS), choices=EMBED_BACKENDS)
+    parser.add_argument("--samples", type=int, default=512, help="chunks to embed")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0],
+                        help="ONNX intra-op thread counts to try (0 = runtime default)")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    texts = load_texts(args.samples + args.queries)
+    held_out = min(args.queries, len(texts) // 2)   # small KBs: split what there is
+    corpus = texts[:len(texts) - held_out]
+    queries = [" ".join(t.split()[:QUERY_WORDS]) for t in texts[len(texts) - held_out:]]
+    print(f"📦 {args.model}: {len(corpus)} chunks, {len(queries)} queries, "
+          f"batch {args.batch_size}, k={args.k}\n")
+
+    # PyTorch is the reference every other backend is scored against
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    if len(backends) > 1 and not os.path.exists(
+            os.path.join(export_dir(args.model), MODEL_FILES["onnx_int8"])):
+        export_onnx(args.model)   # before timing starts
+    reference = None
+    results = []
+
+    header = (f"{'backend':>10} {'threads':>7} {'texts/s':>9} {'q p50 ms':>9} {'q p99 ms':>9} "
+              f"{'cos mean':>9} {'cos min':>8} {'recall@k':>9}")
+    print(header)
+    print("-" * len(header))
+
+    for backend in backends:
+        for threads in ([0] if backend == "torch" else args.threads):
+            embedder = make_embedder(args.model, backend, threads or None)
+            vectors, rate = throughput(embedder, corpus, args.batch_size)
+            query_vectors = np.asarray(embedder.encode(queries, batch_size=args.batch_size), dtype="float32")
+            p50, p99 = query_latency(embedder, queries)
+
+            if reference is None:
+                reference = (vectors, query_vectors)
+            scores = quality(reference[0], vectors, reference[1], query_vectors, args.k)
+            results.append({"backend": backend, "threads": threads or None, "texts_per_second": rate,
+                            "query_p50_ms": p50, "query_p99_ms": p99, **scores})
+
+            print(f"{backend:>10} {threads or '-':>7} {rate:9.1f} {p50:9.2f} {p99:9.2f} "
+                  f"{scores['cosine_mean']:9.4f} {scores['cosine_min']:8.4f} "
+                  f"{scores[f'recall@{args.k}']:9.3f}")
+            del embedder
+
+    print("\ncos / recall@k compare each backend's vectors and top-k neighbours with PyTorch's.")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "samples": len(corpus), "queries": len(queries),
+                       "batch_size": args.batch_size, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
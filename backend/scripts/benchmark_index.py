@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+import faiss
+import numpy as np
+
+from config.settings import INDEX_PATH, TOP_K
+from scripts.index_factory import build_index, search_params
+
+
+# ======================================================
+# HELPERS
+# ======================================================
+def current_rss() -> int:
+    """Resident set size in bytes (Linux), 0 when unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+# Run in a fresh interpreter so freed build memory cannot hide the growth
+_LOAD_RSS_SCRIPT = """
+import sys, faiss
+from scripts.benchmark_index import current_rss
+before = current_rss()
+index = faiss.read_index(sys.argv[1])
+print(current_rss() - before)
+"""
+
+
+def load_rss(index_path: str) -> int:
+    result = subprocess.run(
+        [sys.executable, "-c", _LOAD_RSS_SCRIPT, index_path],
+        capture_output=True, text=True, check=True
+    )
+    return max(int(result.stdout.strip().splitlines()[-1]), 0)
+
+
+def load_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        # Clustered data behaves much more like sentence embeddings than
+        # uniform noise does.
+        centers = rng.normal(size=(256, args.dim)).astype("float32")
+        labels = rng.integers(0, len(centers), size=args.synthetic)
+        vectors = centers[labels] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype("float32")
+        return np.ascontiguousarray(vectors, dtype="float32")
+
+    index = faiss.read_index(args.index)
+    if isinstance(index, faiss.IndexIDMap):
+        index = faiss.downcast_index(index.index)   # KB indexes map row ids; only the vectors matter here
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def measure(index, queries, k, params):
+    latencies = []
+    found = np.empty((len(queries), k), dtype="int64")
+    for i, q in enumerate(queries):
+        start = time.perf_counter()
+        _, idx = index.search(q[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        found[i] = idx[0]
+    latencies = np.array(latencies) * 1000
+    return found, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+# ======================================================
+# BENCHMARK
+# ======================================================
+CONFIGS = [
+    ("flat", {}),
+    ("ivf_flat", {"nprobe": 8}),
+    ("ivf_flat", {"nprobe": 32}),
+    ("ivf_pq", {"nprobe": 8}),
+    ("ivf_pq", {"nprobe": 32}),
+    ("hnsw", {"ef_search": 32}),
+    ("hnsw", {"ef_search": 128}),
+    ("sq8", {}),
+    ("fp16", {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ANN index recall / latency / size benchmark")
+    parser.add_argument("--index", default=INDEX_PATH, help="flat index to take vectors from")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="use N synthetic vectors instead of --index")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    vectors = load_vectors(args)
+    rng = np.random.default_rng(1)
+
+    # Queries are perturbed held-out corpus vectors
+    query_ids = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[query_ids] + 0.05 * rng.normal(size=(len(query_ids), vectors.shape[1]))
+    queries = np.ascontiguousarray(queries, dtype="float32")
+
+    print(f"📦 {len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}\n")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, args.k)
+    del exact
+
+    header = (f"{'index':>9} {'knob':>14} {'recall@k':>9} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'disk MB':>8} {'RAM MB':>8} {'build s':>8}")
+    print(header)
+    print("-" * len(header))
+
+    for index_type, knobs in CONFIGS:
+        start = time.perf_counter()
+        index = build_index([vectors], vectors.shape[1], index_type)
+        build_seconds = time.perf_counter() - start
+
+        with tempfile.NamedTemporaryFile(suffix=".index", delete=False) as tmp:
+            tmp_path = tmp.name
+        faiss.write_index(index, tmp_path)
+        disk_mb = os.path.getsize(tmp_path) / 1e6
+        ram_mb = load_rss(tmp_path) / 1e6
+        os.remove(tmp_path)
+
+        params = search_params(index, **knobs) if knobs else search_params(index)
+        found, p50, p99 = measure(index, queries, args.k, params)
+
+        knob = ", ".join(f"{k}={v}" for k, v in knobs.items()) or "-"
+        print(f"{index_type:>9} {knob:>14} {recall_at_k(found, truth):9.3f} {p50:8.3f} "
+              f"{p99:8.3f} {disk_mb:8.1f} {ram_mb:8.1f} {build_seconds:8.1f}")
+        del index
+
+    print("\nRAM MB is the RSS growth of a fresh process loading the written index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import time
+import asyncio
+import argparse
+
+import numpy as np
+
+from config.settings import KB_BATCH_MAX_SIZE, KB_BATCH_MAX_WAIT_MS, TOP_K
+from scripts.micro_batcher import MicroBatcher
+from scripts.rag_groq import retrieve, retrieve_batch
+
+
+# ======================================================
+# PER-REQUEST vs MICRO-BATCHED KB SEARCH
+# ======================================================
+QUERIES = [
+    "conditions imposed while granting anticipatory bail",
+    "what was the final order of the court",
+    "whether the delay in filing the appeal was condoned",
+    "compensation awarded under the motor vehicles act",
+    "interpretation of section 138 negotiable instruments act",
+    "grounds for quashing the FIR under section 482",
+    "was the termination of service held to be illegal",
+    "findings on the dying declaration",
+]
+
+
+async def run_concurrent(search, n, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await search(f"{QUERIES[i % len(QUERIES)]} ({i})")
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    elapsed = time.perf_counter() - start
+    return n / elapsed, np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000
+
+
+async def main(args):
+    loop = asyncio.get_running_loop()
+    retrieve(QUERIES[0])   # load model + index outside the timings
+
+    async def unbatched(query):
+        return await loop.run_in_executor(None, retrieve, query, args.k)
+
+    batcher = MicroBatcher(
+        lambda queries: retrieve_batch(queries, args.k),
+        args.max_batch, args.max_wait_ms
+    )
+
+    print(f"{'mode':>10} {'qps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, search in (("unbatched", unbatched), ("batched", batcher.submit)):
+        qps, p50, p99 = await run_concurrent(search, args.requests, args.concurrency)
+        print(f"{name:>10} {qps:8.1f} {p50:8.1f} {p99:8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="KB search throughput with and without micro-batching")
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--max-batch", type=int, default=KB_BATCH_MAX_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=KB_BATCH_MAX_WAIT_MS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,400 @@
+import os
+import sys
+import json
+import time
+import random
+import signal
+import socket
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config.settings import INDEX_PATH, TOP_K
+from scripts.benchmark_chunking import synthetic_judgment
+from scripts.benchmark_kb_search import QUERIES
+from scripts.load_test_health import post_form
+from scripts.fake_groq import FakeGroqConfig, serve_in_background
+
+
+# ======================================================
+# STAGE-LEVEL BENCHMARK SUITE
+# ======================================================
+# Every in-process stage runs in a fresh interpreter, so its peak RSS is
+# its own. End-to-end stages start the API (uvicorn) against a local fake
+# Groq server and report the server's peak RSS. Results are written as
+# JSON; --compare flags regressions against an earlier run, e.g.
+#   python -m scripts.benchmark_suite --output bench_main.json
+#   (switch commits)
+#   python -m scripts.benchmark_suite --compare bench_main.json
+#
+# Runs must not warm each other up: inputs are salted per run (--salt to
+# repeat one), and every process under test runs with the LLM / query
+# caches off and session spill in a scratch directory (ISOLATED_SETTINGS),
+# which also keeps fake-server replies out of the real caches.
+
+MICRO_STAGES = (
+    "clean_text", "upload_clean_text", "chunk_text", "upload_chunk_text",
+    "build_temp_index", "retrieve", "build_context"
+)
+PROCESS_MODES = ("qa", "section", "summary")
+STAGES = MICRO_STAGES + tuple(f"process_{mode}" for mode in PROCESS_MODES)
+
+# Compared across runs; lower is better for latency, higher for throughput
+COMPARED_METRICS = {"p50_ms": -1, "p95_ms": -1, "ops_per_second": 1}
+
+
+def isolated_settings(scratch: str) -> dict:
+    return {
+        "LLM_CACHE_PATH": None,
+        "QUERY_CACHE_PATH": None,
+        "DOC_STORE_SPILL_DIR": os.path.join(scratch, "documents"),
+    }
+
+
+# argv[1]: JSON settings overrides, applied before anything imports them
+_ISOLATED_SCRIPT = """
+import sys, json
+import config.settings as settings
+for name, value in json.loads(sys.argv.pop(1)).items():
+    setattr(settings, name, value)
+{run}
+"""
+
+_RUN_SUITE = "from scripts.benchmark_suite import main; main()"
+_RUN_API = ('import uvicorn; '
+            'uvicorn.run("app.main:app", host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")')
+
+
+def isolated_command(run: str, overrides: dict, *argv) -> list:
+    return [sys.executable, "-c", _ISOLATED_SCRIPT.format(run=run), json.dumps(overrides), *argv]
+
+
+class Skip(Exception):
+    """Stage cannot run in this environment (e.g. no KB index built)."""
+
+
+# ======================================================
+# METRICS
+# ======================================================
+def peak_rss_bytes(pid: int = None) -> int:
+    """Peak resident set size of this process (or `pid`, Linux only); 0 when unavailable."""
+    if pid is None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024   # bytes on macOS, KiB on Linux
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def summarize(latencies, wall_seconds: float, processed_bytes: int = None,
+              peak_rss: int = 0, errors: int = 0) -> dict:
+    ms = np.asarray(latencies, dtype="float64") * 1000
+    result = {
+        "iterations": len(ms),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 4),
+        "ops_per_second": round(len(ms) / wall_seconds, 3) if wall_seconds else None,
+        "mean_ms": round(float(ms.mean()), 3) if len(ms) else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3) if len(ms) else None,
+        "p95_ms": round(float(np.percentile(ms, 95)), 3) if len(ms) else None,
+        "p99_ms": round(float(np.percentile(ms, 99)), 3) if len(ms) else None,
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+    }
+    if processed_bytes is not None and wall_seconds:
+        result["mb_per_second"] = round(processed_bytes / 2**20 / wall_seconds, 3)
+    return result
+
+
+def time_each(fn, inputs, warmup: int = 1):
+    """Call fn(x) for every input sequentially; returns per-call latencies (s)."""
+    for x in inputs[:warmup]:
+        fn(x)
+    latencies = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+# ======================================================
+# IN-PROCESS STAGES
+# ======================================================
+def documents(args):
+    # Distinct (and per-run) documents so no session / embedding cache turns runs into hits
+    return [synthetic_judgment(args.doc_kb * 1024, seed=f"{args.salt}:{i}") for i in range(args.iterations)]
+
+
+def queries(args):
+    return [f"{QUERIES[i % len(QUERIES)]} ({args.salt}-{i})" for i in range(args.iterations)]
+
+
+def run_micro_stage(name: str, args) -> dict:
+    """(latencies, processed bytes) for one MICRO_STAGES entry."""
+    if name in ("clean_text", "upload_clean_text", "chunk_text", "upload_chunk_text", "build_temp_index"):
+        docs = documents(args)
+        processed = sum(len(d.encode("utf-8")) for d in docs)
+
+        if name == "clean_text":
+            from scripts.clean_text import clean_text as fn
+        elif name == "upload_clean_text":
+            from scripts.upload_rag import clean_text as fn
+        elif name == "chunk_text":
+            from scripts.chunk_text import chunk_text as fn
+        elif name == "upload_chunk_text":
+            from scripts.upload_rag import chunk_text as fn
+        else:
+            from scripts.upload_rag import build_temp_index as fn
+            fn(synthetic_judgment(4096, seed=f"{args.salt}:warmup"))   # load the embedder outside the timings
+
+        return time_each(fn, docs, warmup=0), processed
+
+    from scripts.rag_groq import retrieve, build_context
+
+    if name == "retrieve":
+        if not os.path.exists(INDEX_PATH):
+            raise Skip(f"no KB index at {INDEX_PATH} (run python -m scripts.build_kb)")
+        retrieve(QUERIES[0], k=args.k)   # load model + index outside the timings
+        return time_each(lambda q: retrieve(q, k=args.k), queries(args), warmup=0), None
+
+    if name == "build_context":
+        if os.path.exists(INDEX_PATH):
+            result_sets = [retrieve(q, k=args.k) for q in queries(args)]
+        else:
+            from scripts.upload_rag import chunk_text
+            result_sets = [
+                [{"text": chunk, "source": f"doc_{i}.txt", "chunk_id": n}
+                 for n, chunk in enumerate(chunk_text(doc)[:args.k])]
+                for i, doc in enumerate(documents(args))
+            ]
+        return time_each(build_context, result_sets), None
+
+    raise ValueError(f"unknown stage {name!r}")
+
+
+def micro_stage_in_subprocess(name: str, args, overrides: dict) -> dict:
+    command = isolated_command(
+        _RUN_SUITE, overrides, "--run-stage", name, "--iterations", str(args.iterations),
+        "--doc-kb", str(args.doc_kb), "--k", str(args.k), "--salt", str(args.salt)
+    )
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+# ======================================================
+# END-TO-END STAGES (/document/process AGAINST FAKE GROQ)
+# ======================================================
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_api(groq_url: str, overrides: dict):
+    port = free_port()
+    env = {**os.environ, "GROQ_BASE_URL": groq_url, "GROQ_API_KEY": os.environ.get("GROQ_API_KEY", "fake")}
+    server = subprocess.Popen(
+        isolated_command(_RUN_API, overrides, str(port)),
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+
+    deadline = time.perf_counter() + 120
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=5) as response:
+                if json.loads(response.read()).get("ready"):
+                    return server, url
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    server.kill()
+    raise RuntimeError("API server did not become ready within 120 s")
+
+
+def run_process_stage(mode: str, args, groq_url: str, overrides: dict) -> dict:
+    server, url = start_api(groq_url, overrides)
+    try:
+        def fields(i):
+            # Distinct text per request: no session store or LLM cache hits
+            text = synthetic_judgment(args.doc_kb * 1024, seed=f"{args.salt}:{mode}:{i}")
+            fields = {"mode": mode, "text": text}
+            if mode == "qa":
+                fields["question"] = f"{QUERIES[i % len(QUERIES)]} ({args.salt}-{i})"
+            return fields
+
+        post_form(f"{url}/document/process", fields(-1), 600)   # models + first session
+
+        def one(i):
+            start = time.perf_counter()
+            try:
+                post_form(f"{url}/document/process", fields(i), 600)
+                return time.perf_counter() - start, False
+            except Exception:
+                return time.perf_counter() - start, True
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(one, range(args.requests)))
+        wall = time.perf_counter() - start
+
+        latencies = [seconds for seconds, failed in outcomes if not failed]
+        return summarize(
+            latencies, wall, peak_rss=peak_rss_bytes(server.pid),
+            errors=sum(failed for _, failed in outcomes)
+        )
+    finally:
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+
+# ======================================================
+# REPORT + COMPARE
+# ======================================================
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, check=True)
+        return {"commit": commit.stdout.strip(), "dirty": bool(dirty.stdout.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def print_table(stages: dict):
+    print(f"\n{'stage':>20} {'ops/s':>9} {'MB/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8}")
+    for name, r in stages.items():
+        if "p50_ms" not in r:
+            print(f"{name:>20}   {r.get('skipped') or r.get('error')}")
+            continue
+        print(f"{name:>20} {r['ops_per_second'] or 0:9.2f} {r.get('mb_per_second', 0):8.2f} "
+              f"{r['p50_ms'] or 0:9.2f} {r['p95_ms'] or 0:9.2f} {r['p99_ms'] or 0:9.2f} "
+              f"{r['peak_rss_mb']:8.1f}" + (f"  ({r['errors']} errors)" if r["errors"] else ""))
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Print metric changes per stage; returns the regressions beyond `tolerance`."""
+    regressions = []
+    print(f"\nvs {baseline['meta'].get('commit') or 'baseline'} (tolerance {tolerance:.0%}):")
+    for name, r in current["stages"].items():
+        before = baseline["stages"].get(name, {})
+        for metric, direction in COMPARED_METRICS.items():
+            new, old = r.get(metric), before.get(metric)
+            if not new or not old:
+                continue
+            change = (new - old) / old
+            worse = -change * direction > tolerance
+            print(f"{name:>20} {metric:>15} {old:10.2f} -> {new:10.2f} ({change:+.1%})"
+                  + ("  REGRESSION" if worse else ""))
+            if worse:
+                regressions.append((name, metric, change))
+    return regressions
+
+
+# ======================================================
+# CLI
+# ======================================================
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks (micro + end-to-end)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--iterations", type=int, default=20, help="inputs per in-process stage")
+    parser.add_argument("--doc-kb", type=int, default=100, help="synthetic document size")
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--requests", type=int, default=16, help="requests per end-to-end mode")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--groq-latency-ms", type=float, default=300.0)
+    parser.add_argument("--groq-jitter-ms", type=float, default=50.0)
+    parser.add_argument("--groq-tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--groq-completion-tokens", type=int, default=200)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative slowdown")
+    parser.add_argument("--salt", type=int, default=None,
+                        help="input salt (default: random per run; reuse one to repeat its inputs)")
+    parser.add_argument("--run-stage", choices=MICRO_STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.salt is None:
+        args.salt = random.randrange(2**31)
+
+    if args.run_stage:
+        # Child process: one stage, one JSON line on stdout
+        try:
+            start = time.perf_counter()
+            latencies, processed = run_micro_stage(args.run_stage, args)
+            result = summarize(latencies, sum(latencies), processed, peak_rss_bytes())
+            result["load_seconds"] = round(time.perf_counter() - start - sum(latencies), 3)
+        except Skip as exc:
+            result = {"skipped": str(exc)}
+        print(json.dumps(result))
+        return
+
+    groq_config = FakeGroqConfig(
+        args.groq_latency_ms, args.groq_jitter_ms,
+        args.groq_tokens_per_second, args.groq_completion_tokens
+    )
+    report = {
+        "meta": {
+            **git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("run_stage", "compare", "output")},
+        },
+        "stages": {}
+    }
+
+    groq_server = None
+    scratch = tempfile.TemporaryDirectory(prefix="nayaya_bench_")
+    overrides = isolated_settings(scratch.name)
+    try:
+        for name in args.stages:
+            print(f"⏱️ {name}...", flush=True)
+            if name in MICRO_STAGES:
+                report["stages"][name] = micro_stage_in_subprocess(name, args, overrides)
+                continue
+
+            if groq_server is None:
+                groq_server, groq_url = serve_in_background(groq_config)
+            try:
+                report["stages"][name] = run_process_stage(name[len("process_"):], args, groq_url, overrides)
+            except RuntimeError as exc:
+                report["stages"][name] = {"error": str(exc)}
+    finally:
+        if groq_server is not None:
+            groq_server.shutdown()
+        scratch.cleanup()
+
+    print_table(report["stages"])
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,141 +1,661 @@
 import os
-import pickle
+import json
+import time
+import shutil
+import hashlib
+import argparse
 import numpy as np
-import faiss
 from tqdm import tqdm
 
-from sentence_transformers import SentenceTransformer
-
 from config.settings import (
     EXTRACTED_TEXT_PATH,
+    CORPUS_PATH,
     EMBED_MODEL,
+    EMBED_BACKEND,
     CHUNK_SIZE_WORDS,
-    CHUNK_OVERLAP
+    CHUNK_OVERLAP,
+    CHUNK_UNIT,
+    INDEX_PATH,
+    CHUNK_STORE_PATH,
+    LEXICAL_INDEX_PATH,
+    DOCUMENT_METADATA_PATH,
+    KB_VERSION_PATH,
+    INDEX_TYPE
 )
 
 from scripts.clean_text import clean_text
-from scripts.chunk_text import chunk_text
+from scripts.chunk_text import iter_chunks
+from scripts.pipeline import prefetch
+from scripts.chunk_store import ChunkStore, ChunkStoreWriter
+from scripts.atomic_io import atomic_write_json, atomic_save_npy, atomic_write_index
+from scripts.index_factory import build_index
+from scripts.lexical_index import build_lexical_index
+from scripts.document_metadata import METADATA_FIELDS, load_document_metadata
+from scripts.corpus import CorpusReader, has_corpus
+from scripts.embedders import load_embedder
+from scripts.shards import build_shards
+from scripts.dedup import ChunkDeduper
 
 
 # ==============================
 # CONFIG
 # ==============================
 BATCH_SIZE = 32                  # safe on CPU
-MAX_CHUNKS = 20000               # fast demo (set None for full scale)
+MAX_CHUNKS = None                # e.g. 20000 for a fast demo; None for full scale
 CHECKPOINT_EVERY = 10            # batches
+DOCUMENT_QUEUE_SIZE = 8          # cleaned documents waiting to be chunked
+BATCH_QUEUE_SIZE = 4             # chunk batches waiting to be embedded
+HASH_BLOCK_BYTES = 1024 * 1024
 EMBEDDINGS_DIR = "embeddings"
 
-INDEX_PATH = os.path.join(EMBEDDINGS_DIR, "faiss.index")
-META_PATH = os.path.join(EMBEDDINGS_DIR, "metadata.pkl")
-STATE_PATH = os.path.join(EMBEDDINGS_DIR, "state.pkl")
+# Kept between builds: every embedded row's vector, so an update only
+# embeds new / changed documents and re-indexes the rest from disk
+VECTORS_DIR = os.path.join(EMBEDDINGS_DIR, "vectors")
+MANIFEST_PATH = os.path.join(EMBEDDINGS_DIR, "kb_manifest.json")
+STATE_LOG_PATTERN = "state_{:05d}.jsonl"   # per-file / segment records, in VECTORS_DIR
+STATE_LOG_SLACK = 1000                     # superseded records tolerated before a rewrite
+DEDUP_REPORT_PATH = os.path.join(EMBEDDINGS_DIR, "dedup_report.json")
 
 
 # ==============================
-# SETUP
+# DOCUMENT SCAN (CONTENT HASHES)
 # ==============================
-os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
+def list_documents():
+    return sorted(os.listdir(EXTRACTED_TEXT_PATH))
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def scan_documents(known, corpus=None):
+    """
+    filename -> {"sha256", "size", "mtime"} for every extracted document.
+    Files whose size and mtime match their `known` entry are not re-hashed.
+    A corpus already knows its hashes, so scanning it reads only its index.
+    """
+    if corpus is not None:
+        return corpus.scan()
+
+    scanned = {}
+    for filename in tqdm(list_documents(), desc="Scanning documents", unit="file"):
+        path = os.path.join(EXTRACTED_TEXT_PATH, filename)
+        stat = os.stat(path)
+        entry = known.get(filename)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            sha256 = entry["sha256"]
+        else:
+            sha256 = file_digest(path)
+        scanned[filename] = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime}
+    return scanned
 
-embedder = SentenceTransformer(EMBED_MODEL)
 
-dimension = embedder.get_sentence_embedding_dimension()
+# ==============================
+# PIPELINE STAGES
+# ==============================
+def iter_documents(filenames, corpus=None):
+    """Stage 1: file -> cleaned text."""
+    if corpus is not None:
+        # One buffered forward pass over the shards when `filenames` is in corpus order
+        for record in corpus.iter_records(filenames):
+            yield record["id"], clean_text(record["text"])
+        return
+
+    for filename in filenames:
+        file_path = os.path.join(EXTRACTED_TEXT_PATH, filename)
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            text = clean_text(f.read())
+
+        yield filename, text
+
+
+def iter_batches(documents, start_chunks, tokenizer, document_metadata=None,
+                 deduper=None, first_row=0):
+    """
+    Stage 2: cleaned text -> chunks -> batches of BATCH_SIZE distinct chunks.
+    With a `deduper`, repeated chunks ride along in the batch marked
+    "duplicate_of" (the row of their first copy) instead of being embedded.
+
+    Yields (batch, finished): `finished` names the documents whose last
+    chunk is in this batch or an earlier one.
+    """
+    document_metadata = document_metadata or {}
+    batch, finished = [], []
+    unique = 0
+    next_row = first_row
+
+    for filename, text in documents:
+        metadata = document_metadata.get(filename, {})
+        start_chunk = start_chunks.get(filename, 0)
+        chunks = iter_chunks(
+            text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP,
+            unit=CHUNK_UNIT, tokenizer=tokenizer
+        )
+
+        for chunk_id, chunk in enumerate(chunks):
+            if chunk_id < start_chunk:
+                continue
+
+            record = {
+                "text": chunk,
+                "source_file": filename,
+                "chunk_id": chunk_id,
+                **metadata
+            }
+
+            duplicate_of = deduper.find_or_add(chunk, next_row, metadata) if deduper else None
+            if duplicate_of is not None:
+                record["duplicate_of"] = duplicate_of
+                batch.append(record)
+                continue
+
+            batch.append(record)
+            next_row += 1
+            unique += 1
+
+            if unique == BATCH_SIZE:
+                yield batch, finished
+                batch, finished = [], []
+                unique = 0
+
+        finished.append(filename)
+
+    if batch or finished:
+        yield batch, finished
 
 
 # ==============================
-# LOAD OR INIT STATE
+# MANIFEST (COMMITTED STATE)
 # ==============================
-if os.path.exists(STATE_PATH):
-    print("🔁 Resuming from checkpoint...")
-    with open(STATE_PATH, "rb") as f:
-        state = pickle.load(f)
+# "files" maps each indexed document to its content hash and the chunk
+# store rows / aliases it added. Rows of one document are contiguous
+# because documents are embedded one after another.
+#
+# "files" and "segments" grow with the corpus, so they are not part of
+# kb_manifest.json: each checkpoint appends the changed entries to a state
+# log and the (fixed-size) manifest records how many of its bytes are
+# committed. Bytes past that are ignored and cut off on the next append.
+
+def new_manifest(dimension):
+    return {
+        "embed_model": EMBED_MODEL,
+        "embed_backend": EMBED_BACKEND,
+        "dimension": dimension,
+        "dedup_scope": list(METADATA_FIELDS),   # aliases never cross these fields
+        "version": 0,            # last KB version published to the API
+        "num_chunks": 0,         # chunk store rows (= vectors), live or not
+        "num_aliases": 0,        # duplicate chunks stored as aliases
+        "num_retired": 0,        # chunk store retired entries
+        "embed_seconds": 0.0,    # encode time spent on the distinct chunks
+        "segments": [],          # [{"file": ..., "rows": ...}] in row order
+        "files": {},             # filename -> new_file_entry()
+        "state_log": None        # {"file", "bytes", "records"}: committed part of the state log
+    }
+
+
+def new_file_entry(scan, row, alias):
+    return {
+        **scan,
+        "rows": [row, row],          # [start, end) chunk store rows
+        "aliases": [alias, alias],   # [start, end) chunk store aliases
+        "next_chunk": 0,             # resume position while not complete
+        "complete": False
+    }
+
+
+def load_manifest(dimension, rebuild=False):
+    if os.path.exists(MANIFEST_PATH) and not rebuild:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("state_log"):
+            read_state_log(manifest)
+        else:
+            manifest["state_log"] = None   # inline files / segments: the next checkpoint writes a log
+
+        # Vectors from another runtime (int8 especially) are close, not equal
+        backend = manifest.get("embed_backend", "torch")
+        if (manifest["embed_model"] != EMBED_MODEL or backend != EMBED_BACKEND
+                or manifest["dimension"] != dimension):
+            print("⚠️ KB was built with a different embedding model or backend, starting over.")
+        elif manifest.get("dedup_scope") != list(METADATA_FIELDS):
+            # Older builds aliased chunks across courts, which filters and shards can't see
+            print("⚠️ KB deduplicated chunks across court / year / outcome, starting over.")
+        else:
+            print(f"🔁 Updating KB version {manifest['version']} "
+                  f"({len(manifest['files'])} documents)...")
+            return manifest
 
-    start_idx = state["next_chunk"]
-    metadata = state["metadata"]
-    index = faiss.read_index(INDEX_PATH)
-
-else:
     print("🆕 Starting fresh KB build...")
-    start_idx = 0
-    metadata = []
-    index = faiss.IndexFlatL2(dimension)
+    shutil.rmtree(VECTORS_DIR, ignore_errors=True)
+    shutil.rmtree(CHUNK_STORE_PATH, ignore_errors=True)
+    manifest = new_manifest(dimension)
+
+    # Keep counting up, so a running API never mistakes the new KB for one it serves
+    if os.path.exists(KB_VERSION_PATH):
+        with open(KB_VERSION_PATH, "r", encoding="utf-8") as f:
+            manifest["version"] = json.load(f)["version"]
+    return manifest
+
+
+def plan_update(manifest, scanned, order=None, dirty=None, aliasers=None):
+    """
+    Compare committed documents with the ones on disk. Returns the names to
+    embed (an interrupted document first, so its rows stay contiguous), the
+    chunk to start each one at, and the names whose rows must be retired.
+    New documents are sorted by `order` (a key function), else by name.
+    Entries refreshed in place are added to `dirty`. `aliasers(retire)`
+    names further documents to retire and embed again with them.
+    """
+    files = manifest["files"]
+    retire, start_chunks = [], {}
+
+    for filename, entry in files.items():
+        scan = scanned.get(filename)
+        if scan is not None and scan["sha256"] == entry["sha256"]:
+            if dirty is not None and any(entry.get(k) != v for k, v in scan.items()):
+                dirty.add(filename)
+            entry.update(scan)   # refresh size / mtime so the next scan can skip hashing
+            if entry["complete"]:
+                continue
+            if (entry["rows"][1] == manifest["num_chunks"]
+                    and entry["aliases"][1] == manifest["num_aliases"]):
+                start_chunks[filename] = entry["next_chunk"]
+                continue
+        retire.append(filename)
+
+    if aliasers is not None and retire:
+        for filename in aliasers(retire):
+            start_chunks.pop(filename, None)
+            retire.append(filename)
+
+    resumed = list(start_chunks)
+    added = sorted((f for f in scanned if f not in files or f in retire), key=order)
+    return resumed + added, start_chunks, retire
+
+
+def write_manifest(manifest):
+    atomic_write_json(MANIFEST_PATH, {
+        key: value for key, value in manifest.items() if key not in ("files", "segments")
+    })
+
+
+def _state_records(manifest):
+    for segment in manifest["segments"]:
+        yield {"segment": segment}
+    for filename, entry in manifest["files"].items():
+        yield {"file": filename, "entry": entry}
+
+
+def read_state_log(manifest):
+    """Replay the committed part of the state log into "segments" / "files"."""
+    log = manifest["state_log"]
+    with open(os.path.join(VECTORS_DIR, log["file"]), "rb") as f:
+        data = f.read(log["bytes"])
+
+    segments, files = [], {}
+    for line in data.splitlines():
+        record = json.loads(line)
+        if "segment" in record:
+            segments.append(record["segment"])
+        elif record["entry"] is None:
+            files.pop(record["file"], None)
+        else:
+            files[record["file"]] = record["entry"]
+    manifest["segments"], manifest["files"] = segments, files
+
+
+def append_state_log(manifest, records):
+    log = manifest["state_log"]
+    with open(os.path.join(VECTORS_DIR, log["file"]), "ab") as f:
+        f.truncate(log["bytes"])   # drop records of a checkpoint that never committed
+        f.write("".join(json.dumps(record) + "\n" for record in records).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        log["bytes"] = f.tell()
+    log["records"] += len(records)
+
+
+def rewrite_state_log(manifest):
+    """
+    Start a new log holding only the current state. The caller commits it
+    with write_manifest(); returns the old log file to delete after that.
+    """
+    old = manifest["state_log"]
+    generation = int(old["file"][len("state_"):-len(".jsonl")]) + 1 if old else 0
+    manifest["state_log"] = {"file": STATE_LOG_PATTERN.format(generation), "bytes": 0, "records": 0}
+    append_state_log(manifest, list(_state_records(manifest)))
+    return old["file"] if old else None
+
+
+def save_checkpoint(manifest, pending, chunk_store, dirty):
+    """
+    Append-only checkpoint: only the vectors embedded since the previous
+    checkpoint are written, as a new segment, and only the `dirty` files'
+    entries are appended to the state log. The chunk store is committed
+    next and the manifest last; its atomic rename is the commit point, so
+    anything written after the previous manifest is ignored on resume.
+    """
+    records = []
+    if pending:
+        vectors = np.concatenate(pending)
+        segment = {"file": f"vectors_{len(manifest['segments']):05d}.npy", "rows": len(vectors)}
+        atomic_save_npy(os.path.join(VECTORS_DIR, segment["file"]), vectors)
+        manifest["segments"].append(segment)
+        records.append({"segment": segment})
+        pending.clear()
+
+    chunk_store.commit()
+    manifest["num_chunks"] = chunk_store.count
+    manifest["num_aliases"] = chunk_store.alias_count
+    manifest["num_retired"] = chunk_store.retired_count
+
+    records += [{"file": name, "entry": manifest["files"].get(name)} for name in sorted(dirty)]
+    dirty.clear()
+    old_log = None
+    if manifest["state_log"] is None:
+        old_log = rewrite_state_log(manifest)
+    elif records:
+        append_state_log(manifest, records)
+    write_manifest(manifest)
+    if old_log:
+        os.remove(os.path.join(VECTORS_DIR, old_log))
 
 
 # ==============================
-# COLLECT ALL CHUNKS
+# DEDUP (RESUME + REPORT)
 # ==============================
-print("📦 Collecting and chunking documents...")
-
-all_chunks = []
-
-for filename in os.listdir(EXTRACTED_TEXT_PATH):
-    file_path = os.path.join(EXTRACTED_TEXT_PATH, filename)
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = clean_text(f.read())
-
-    chunks = chunk_text(text, CHUNK_SIZE_WORDS, CHUNK_OVERLAP)
-
-    for chunk_id, chunk in enumerate(chunks):
-        all_chunks.append({
-            "text": chunk,
-            "source_file": filename,
-            "chunk_id": chunk_id
-        })
-
-if MAX_CHUNKS:
-    all_chunks = all_chunks[:MAX_CHUNKS]
-
-total_chunks = len(all_chunks)
-print(f"✅ Total chunks to embed: {total_chunks}")
+def restore_deduper(num_chunks, num_aliases, retiring=()):
+    """
+    Deduper that already knows the committed rows, so an update keeps
+    deduplicating against them. Only rows still live once the `retiring`
+    manifest entries are retired count: a changed document must not
+    alias its new chunks to its own old text.
+    """
+    deduper = ChunkDeduper()
+    if not deduper.enabled or not num_chunks:
+        return deduper
+
+    chunk_store = ChunkStore(CHUNK_STORE_PATH)
+    try:
+        live = chunk_store.live_mask(
+            num_chunks, num_aliases,
+            [row for entry in retiring for row in range(*entry["rows"])],
+            [alias for entry in retiring for alias in range(*entry["aliases"])]
+        )
+        for row in tqdm(np.flatnonzero(live), desc="Restoring dedup state", unit="chunk"):
+            deduper.find_or_add(chunk_store.text(int(row)), int(row), chunk_store.metadata(int(row)))
+    finally:
+        chunk_store.close()
+
+    deduper.exact_duplicates = deduper.near_duplicates = 0
+    return deduper
+
+
+def retire_aliasers(manifest):
+    """
+    plan_update() hook: documents aliasing a row that the retiring documents
+    own. Such a row would stay live through the alias while serving the
+    retired document's text and citation, so the aliasing documents are
+    retired and embedded again too (repeated until nothing else is hit).
+    """
+    files = manifest["files"]
+
+    def aliasers(retire):
+        if not manifest["num_aliases"]:
+            return []
+        chunk_store = ChunkStore(CHUNK_STORE_PATH)
+        try:
+            retiring, frontier, found = set(retire), list(retire), []
+            while frontier:
+                rows = [row for f in frontier for row in range(*files[f]["rows"])]
+                gone = [alias for f in retiring for alias in range(*files[f]["aliases"])]
+                sources = chunk_store.alias_sources(rows, manifest["num_aliases"], gone)
+                frontier = sorted(f for f in sources if f in files and f not in retiring)
+                retiring.update(frontier)
+                found += frontier
+            return found
+        finally:
+            chunk_store.close()
+
+    return aliasers
+
+
+def dedup_report(manifest, deduper, index):
+    """Embedding time and index bytes saved by not embedding the aliases."""
+    chunks, aliases = manifest["num_chunks"], manifest["num_aliases"]
+    seconds_per_chunk = manifest["embed_seconds"] / chunks if chunks else 0.0
+    bytes_per_vector = os.path.getsize(INDEX_PATH) / index.ntotal if index.ntotal else 0.0
+
+    return {
+        **deduper.stats(),     # exact / near split covers this run only
+        "total_chunks": chunks + aliases,
+        "embedded_chunks": chunks,
+        "duplicate_chunks": aliases,
+        "duplicate_ratio": round(aliases / (chunks + aliases), 4) if chunks + aliases else 0.0,
+        "embed_seconds": round(manifest["embed_seconds"], 2),
+        "embed_seconds_saved": round(aliases * seconds_per_chunk, 2),
+        "index_bytes": os.path.getsize(INDEX_PATH),
+        "index_bytes_saved": int(aliases * bytes_per_vector)
+    }
 
 
 # ==============================
-# EMBEDDING LOOP (WITH CHECKPOINT)
+# COMPACTION + PUBLISH
 # ==============================
-print("🚀 Building embeddings...")
-
-for i in tqdm(range(start_idx, total_chunks, BATCH_SIZE), desc="Embedding"):
-    batch = all_chunks[i:i + BATCH_SIZE]
-    texts = [item["text"] for item in batch]
-
-    embeddings = embedder.encode(texts)
-    embeddings = np.array(embeddings).astype("float32")
-
-    index.add(embeddings)
-
-    for item in batch:
-        metadata.append({
-            "source_file": item["source_file"],
-            "chunk_id": item["chunk_id"],
-            "text": item["text"]
-        })
-
-    # --------------------------
-    # CHECKPOINT SAVE
-    # --------------------------
-    if ((i // BATCH_SIZE) + 1) % CHECKPOINT_EVERY == 0:
-        faiss.write_index(index, INDEX_PATH)
-
-        with open(META_PATH, "wb") as f:
-            pickle.dump(metadata, f)
-
-        with open(STATE_PATH, "wb") as f:
-            pickle.dump({
-                "next_chunk": i + BATCH_SIZE,
-                "metadata": metadata
-            }, f)
-
-        print(f"💾 Checkpoint saved at chunk {i + BATCH_SIZE}")
+def compact(manifest, index_type=INDEX_TYPE):
+    """
+    Index the live chunk store rows from the stored vectors: the serving
+    index (searchable under row ids), the per-court shards and the BM25
+    index. Retired rows stay on disk but drop out of every index.
+    """
+    print(f"🧱 Compacting {len(manifest['segments'])} segments ({index_type} index)...")
+
+    # Segments stay mmapped; IVF / PQ / SQ training only reads a sample
+    segments = [
+        np.load(os.path.join(VECTORS_DIR, segment["file"]), mmap_mode="r")
+        for segment in manifest["segments"]
+    ]
+
+    chunk_store = ChunkStore(CHUNK_STORE_PATH)
+    try:
+        num_vectors = sum(len(segment) for segment in segments)
+        if not len(chunk_store) == num_vectors == manifest["num_chunks"]:
+            raise RuntimeError(
+                f"Chunk store has {len(chunk_store)} rows and {num_vectors} vectors are stored, "
+                f"but {manifest['num_chunks']} chunks were committed"
+            )
+
+        live = chunk_store.live_mask()
+        index = build_index(segments, manifest["dimension"], index_type, rows=np.flatnonzero(live))
+        atomic_write_index(index, INDEX_PATH)
+
+        # Shards and BM25 cover the same rows, so every hit shares the FAISS ids
+        print("🗂️ Building per-court shards...")
+        build_shards(segments, chunk_store, manifest["dimension"], index_type=index_type)
+
+        print("🔤 Building BM25 lexical index...")
+        build_lexical_index(chunk_store, LEXICAL_INDEX_PATH, live=live)
+    finally:
+        chunk_store.close()
+
+    return index
+
+
+def publish(manifest, index):
+    """Bump the KB version; a running API swaps to the new artifacts when it sees it."""
+    manifest["version"] += 1
+
+    # Superseded entries pile up in the state log across updates; start a
+    # fresh one once they outnumber the live ones
+    old_log = None
+    live = len(manifest["segments"]) + len(manifest["files"])
+    if manifest["state_log"]["records"] > 2 * live + STATE_LOG_SLACK:
+        old_log = rewrite_state_log(manifest)
+    write_manifest(manifest)
+    if old_log:
+        os.remove(os.path.join(VECTORS_DIR, old_log))
+    atomic_write_json(KB_VERSION_PATH, {
+        "version": manifest["version"],
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "documents": len(manifest["files"]),
+        "chunks": int(index.ntotal)
+    })
 
 
 # ==============================
-# FINAL SAVE
+# BUILD / UPDATE
 # ==============================
-faiss.write_index(index, INDEX_PATH)
-
-with open(META_PATH, "wb") as f:
-    pickle.dump(metadata, f)
-
-if os.path.exists(STATE_PATH):
-    os.remove(STATE_PATH)
-
-print("✅ Knowledge base build completed successfully.")
+def main(rebuild=False):
+    embedder = load_embedder(EMBED_MODEL)
+    dimension = embedder.get_sentence_embedding_dimension()
+
+    state = load_manifest(dimension, rebuild)
+    os.makedirs(VECTORS_DIR, exist_ok=True)
+    files = state["files"]
+
+    # The ingested corpus when there is one; extract_text's old per-file output otherwise
+    corpus = CorpusReader(CORPUS_PATH) if has_corpus(CORPUS_PATH) else None
+    print(f"📚 Reading documents from {CORPUS_PATH if corpus else EXTRACTED_TEXT_PATH}")
+
+    scanned = scan_documents(files, corpus)
+    dirty = set()   # files whose entries changed since the last checkpoint
+    to_embed, start_chunks, retire = plan_update(
+        state, scanned, corpus.position if corpus else None, dirty, retire_aliasers(state)
+    )
+    changed = [f for f in retire if f in scanned]
+    print(f"📄 {len(scanned)} documents: "
+          f"{len(to_embed) - len(changed) - len(start_chunks)} new, {len(changed)} changed, "
+          f"{len(retire) - len(changed)} deleted, {len(start_chunks)} resumed")
+
+    # Before the writer truncates anything: its header may still count rows
+    # past the checkpoint
+    deduper = restore_deduper(
+        state["num_chunks"], state["num_aliases"], [files[filename] for filename in retire]
+    )
+
+    # Anything past the last checkpoint belongs to batches that will be redone
+    chunk_store = ChunkStoreWriter(
+        CHUNK_STORE_PATH, truncate_to=state["num_chunks"],
+        truncate_aliases_to=state["num_aliases"], truncate_retired_to=state["num_retired"]
+    )
+    pending = []
+
+    for filename in retire:
+        entry = files.pop(filename)
+        dirty.add(filename)
+        chunk_store.retire(range(*entry["rows"]), range(*entry["aliases"]))
+
+    if not to_embed and not retire and os.path.exists(KB_VERSION_PATH):
+        save_checkpoint(state, pending, chunk_store, dirty)
+        chunk_store.close()
+        if corpus:
+            corpus.close()
+        print(f"✅ Knowledge base is up to date (version {state['version']}).")
+        return
+
+    # file -> clean -> chunk -> batch run in background threads connected
+    # by bounded queues, so reading/chunking overlaps with embedding and
+    # memory stays flat regardless of corpus size.
+    documents = prefetch(iter_documents(to_embed, corpus), DOCUMENT_QUEUE_SIZE)
+    batches = prefetch(
+        iter_batches(
+            documents, start_chunks, embedder.tokenizer,
+            corpus.metadata() if corpus else load_document_metadata(DOCUMENT_METADATA_PATH),
+            deduper=deduper, first_row=state["num_chunks"]
+        ),
+        BATCH_QUEUE_SIZE
+    )
+
+    print("🚀 Building embeddings...")
+    progress = tqdm(desc="Embedding", unit="chunk")
+
+    for batch_no, (batch, finished) in enumerate(batches, start=1):
+        if MAX_CHUNKS and chunk_store.count >= MAX_CHUNKS:
+            break
+
+        unique = [item for item in batch if "duplicate_of" not in item]
+        if MAX_CHUNKS and chunk_store.count + len(unique) > MAX_CHUNKS:
+            # Cut right after the last distinct chunk that still fits; the
+            # documents in this batch stay incomplete and resume next run
+            unique = unique[:MAX_CHUNKS - chunk_store.count]
+            batch = batch[:batch.index(unique[-1]) + 1]
+            finished = []
+        aliases = [item for item in batch if "duplicate_of" in item]
+
+        row, alias = chunk_store.count, chunk_store.alias_count
+        if unique:
+            started = time.perf_counter()
+            embeddings = embedder.encode([item["text"] for item in unique], batch_size=BATCH_SIZE)
+            embeddings = np.array(embeddings).astype("float32")
+            state["embed_seconds"] += time.perf_counter() - started
+
+            pending.append(embeddings)
+            chunk_store.extend(unique)
+        chunk_store.add_aliases(aliases)
+
+        for item in batch:
+            dirty.add(item["source_file"])
+            entry = files.get(item["source_file"])
+            if entry is None:
+                entry = files[item["source_file"]] = new_file_entry(
+                    scanned[item["source_file"]], row, alias
+                )
+            if "duplicate_of" in item:
+                alias += 1
+                entry["aliases"][1] = alias
+            else:
+                row += 1
+                entry["rows"][1] = row
+            entry["next_chunk"] = item["chunk_id"] + 1
+
+        for filename in finished:
+            if filename not in files:   # produced no chunks
+                files[filename] = new_file_entry(scanned[filename], row, alias)
+            files[filename]["complete"] = True
+            dirty.add(filename)
+
+        progress.update(len(batch))
+
+        # --------------------------
+        # CHECKPOINT SAVE
+        # --------------------------
+        if batch_no % CHECKPOINT_EVERY == 0:
+            save_checkpoint(state, pending, chunk_store, dirty)
+            print(f"💾 Checkpoint saved ({chunk_store.count} chunks, "
+                  f"{sum(entry['complete'] for entry in files.values())} documents)")
+
+    progress.close()
+    batches.close()
+    if corpus:
+        corpus.close()
+
+    # ==============================
+    # FINAL SAVE + COMPACTION
+    # ==============================
+    save_checkpoint(state, pending, chunk_store, dirty)
+    chunk_store.close()
+
+    index = compact(state)
+    publish(state, index)
+
+    report = dedup_report(state, deduper, index)
+    atomic_write_json(DEDUP_REPORT_PATH, report)
+
+    print(f"♻️ Dedup: {report['duplicate_chunks']} of {report['total_chunks']} chunks were duplicates "
+          f"(~{report['embed_seconds_saved']}s embedding, "
+          f"~{report['index_bytes_saved'] / 2**20:.1f} MiB index saved)")
+    print(f"✅ Knowledge base version {state['version']} published ({index.ntotal} chunks).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the KB, or update it for documents added, changed or deleted since the last run"
+    )
+    parser.add_argument("--rebuild", action="store_true",
+                        help="discard the existing KB and embed every document again")
+    main(parser.parse_args().rebuild)
@@ -0,0 +1,535 @@
+import os
+import json
+import mmap
+
+import numpy as np
+
+from scripts.atomic_io import atomic_write_json
+from scripts.document_metadata import METADATA_FIELDS, CATEGORY_FIELDS, UNKNOWN
+
+
+# ======================================================
+# ON-DISK LAYOUT
+# ======================================================
+# <path>/header.json   {"version", "count", "source_width", "categories", "aliases",
+#                      "retired"}  (commit point)
+# <path>/offsets.u64   count + 1 byte offsets into text.bin
+# <path>/text.bin      UTF-8 chunk texts, back to back
+# <path>/meta2.bin     fixed-width rows: source_file (bytes), chunk_id (u32),
+#                      court / outcome (u16 codes into header categories),
+#                      year (u16, 0 = unknown)
+# <path>/aliases.bin   fixed-width rows: row (u32), source_file, chunk_id (u32);
+#                      further locations of a deduplicated chunk's text
+# <path>/retired.bin   (kind u8, index u32): row locations (kind 0) and aliases
+#                      (kind 1) of documents deleted or changed since they
+#                      were added. A row is live while any location is.
+#
+# Version 1 stores (meta.bin without court / year / outcome) are still
+# readable; `python -m scripts.migrate_metadata --upgrade` converts them.
+#
+# Rows are never rewritten or renumbered: row i is FAISS id i in every
+# build of the KB. Everything is opened read-only with mmap, so a
+# lookup touches only the pages of the rows it returns.
+
+FORMAT_VERSION = 2
+SOURCE_WIDTH = 64
+
+HEADER_FILE = "header.json"
+OFFSETS_FILE = "offsets.u64"
+TEXT_FILE = "text.bin"
+META_FILES = {1: "meta.bin", 2: "meta2.bin"}
+ALIASES_FILE = "aliases.bin"
+RETIRED_FILE = "retired.bin"
+
+RETIRED_ROW, RETIRED_ALIAS = 0, 1
+RETIRED_DTYPE = np.dtype([("kind", "u1"), ("index", "<u4")])
+
+OFFSET_DTYPE = np.dtype("<u8")
+
+
+def meta_dtype(source_width: int = SOURCE_WIDTH, version: int = FORMAT_VERSION):
+    fields = [("source_file", f"S{source_width}"), ("chunk_id", "<u4")]
+    if version >= 2:
+        fields += [("court", "<u2"), ("year", "<u2"), ("outcome", "<u2")]
+    return np.dtype(fields)
+
+
+def alias_dtype(source_width: int = SOURCE_WIDTH):
+    return np.dtype([("row", "<u4"), ("source_file", f"S{source_width}"), ("chunk_id", "<u4")])
+
+
+def _empty_categories():
+    return {field: [UNKNOWN] for field in CATEGORY_FIELDS}
+
+
+def read_header(path: str):
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        return None
+    with open(header_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_header(path: str, header: dict):
+    atomic_write_json(os.path.join(path, HEADER_FILE), header)
+
+
+# ======================================================
+# WRITER (APPEND ONLY)
+# ======================================================
+class ChunkStoreWriter:
+    """
+    Appends chunk records to a store. Rows only become visible to readers
+    once `commit()` rewrites the header; anything appended after the last
+    commit is truncated away when the store is reopened.
+    """
+
+    def __init__(self, path: str, truncate_to: int = None,
+                 source_width: int = SOURCE_WIDTH, truncate_aliases_to: int = None,
+                 truncate_retired_to: int = None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+        header = read_header(path)
+        if header is not None and header["version"] != FORMAT_VERSION:
+            if header["count"]:
+                raise ValueError(
+                    f"Chunk store at {path} is version {header['version']}; "
+                    f"run `python -m scripts.migrate_metadata --upgrade` first"
+                )
+            header = None
+
+        if header is None:
+            header = {
+                "version": FORMAT_VERSION,
+                "count": 0,
+                "source_width": source_width,
+                "categories": _empty_categories(),
+                "aliases": 0,
+                "retired": 0
+            }
+            for name in (OFFSETS_FILE, TEXT_FILE, META_FILES[FORMAT_VERSION],
+                         ALIASES_FILE, RETIRED_FILE):
+                open(os.path.join(path, name), "wb").close()
+            with open(os.path.join(path, OFFSETS_FILE), "wb") as f:
+                f.write(np.zeros(1, dtype=OFFSET_DTYPE).tobytes())
+            _write_header(path, header)
+
+        self.source_width = header["source_width"]
+        self._meta_dtype = meta_dtype(self.source_width)
+        self._alias_dtype = alias_dtype(self.source_width)
+        self.categories = header["categories"]
+        self._codes = {
+            field: {value: code for code, value in enumerate(values)}
+            for field, values in self.categories.items()
+        }
+
+        self.count = header["count"]
+        if truncate_to is not None:
+            if truncate_to > self.count:
+                raise ValueError(
+                    f"cannot truncate store with {self.count} rows to {truncate_to}"
+                )
+            self.count = truncate_to
+
+        self.alias_count = header.get("aliases", 0)
+        if truncate_aliases_to is not None:
+            if truncate_aliases_to > self.alias_count:
+                raise ValueError(
+                    f"cannot truncate store with {self.alias_count} aliases to {truncate_aliases_to}"
+                )
+            self.alias_count = truncate_aliases_to
+
+        self.retired_count = header.get("retired", 0)
+        if truncate_retired_to is not None:
+            if truncate_retired_to > self.retired_count:
+                raise ValueError(
+                    f"cannot truncate store with {self.retired_count} retired entries "
+                    f"to {truncate_retired_to}"
+                )
+            self.retired_count = truncate_retired_to
+
+        self._rollback_uncommitted()
+
+        self._offsets = open(os.path.join(path, OFFSETS_FILE), "ab")
+        self._text = open(os.path.join(path, TEXT_FILE), "ab")
+        self._meta = open(os.path.join(path, META_FILES[FORMAT_VERSION]), "ab")
+        self._aliases = open(os.path.join(path, ALIASES_FILE), "ab")
+        self._retired = open(os.path.join(path, RETIRED_FILE), "ab")
+        self._text_end = self._text.tell()
+
+    def _rollback_uncommitted(self):
+        offsets = np.fromfile(
+            os.path.join(self.path, OFFSETS_FILE), dtype=OFFSET_DTYPE, count=self.count + 1
+        )
+        text_end = int(offsets[self.count])
+
+        with open(os.path.join(self.path, OFFSETS_FILE), "r+b") as f:
+            f.truncate((self.count + 1) * OFFSET_DTYPE.itemsize)
+        with open(os.path.join(self.path, TEXT_FILE), "r+b") as f:
+            f.truncate(text_end)
+        with open(os.path.join(self.path, META_FILES[FORMAT_VERSION]), "r+b") as f:
+            f.truncate(self.count * self._meta_dtype.itemsize)
+        with open(os.path.join(self.path, ALIASES_FILE), "ab") as f:
+            f.truncate(self.alias_count * self._alias_dtype.itemsize)
+        with open(os.path.join(self.path, RETIRED_FILE), "ab") as f:
+            f.truncate(self.retired_count * RETIRED_DTYPE.itemsize)
+
+    def _code(self, field: str, value) -> int:
+        value = value or UNKNOWN
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.categories[field])
+            self.categories[field].append(value)
+        return code
+
+    def append(self, text: str, source_file: str, chunk_id: int, **metadata):
+        self.extend([{"text": text, "source_file": source_file, "chunk_id": chunk_id, **metadata}])
+
+    def extend(self, records):
+        if not records:
+            return
+
+        encoded = [r["text"].encode("utf-8") for r in records]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=OFFSET_DTYPE, count=len(encoded))
+        offsets = self._text_end + np.cumsum(lengths, dtype=OFFSET_DTYPE)
+
+        meta = np.zeros(len(records), dtype=self._meta_dtype)
+        for row, record in zip(meta, records):
+            row["source_file"] = self._source(record["source_file"])
+            row["chunk_id"] = record["chunk_id"]
+            row["court"] = self._code("court", record.get("court"))
+            row["outcome"] = self._code("outcome", record.get("outcome"))
+            row["year"] = record.get("year") or 0
+
+        self._text.write(b"".join(encoded))
+        self._offsets.write(offsets.tobytes())
+        self._meta.write(meta.tobytes())
+
+        self._text_end = int(offsets[-1])
+        self.count += len(records)
+
+    def _source(self, source_file: str) -> bytes:
+        source = source_file.encode("utf-8")
+        if len(source) > self.source_width:
+            raise ValueError(f"source_file longer than {self.source_width} bytes: {source_file!r}")
+        return source
+
+    def add_aliases(self, records):
+        """
+        Record further locations of already stored chunks: each record has
+        "duplicate_of" (the row holding the text), "source_file", "chunk_id".
+        """
+        if not records:
+            return
+
+        aliases = np.zeros(len(records), dtype=self._alias_dtype)
+        for alias, record in zip(aliases, records):
+            if not 0 <= record["duplicate_of"] < self.count:
+                raise ValueError(f"alias of unknown row {record['duplicate_of']}")
+            alias["row"] = record["duplicate_of"]
+            alias["source_file"] = self._source(record["source_file"])
+            alias["chunk_id"] = record["chunk_id"]
+
+        self._aliases.write(aliases.tobytes())
+        self.alias_count += len(records)
+
+    def retire(self, rows=(), aliases=()):
+        """
+        Mark row locations and aliases as gone (their document was deleted
+        or changed). Texts and row ids stay; the rows just stop being live.
+        """
+        retired = np.zeros(len(rows) + len(aliases), dtype=RETIRED_DTYPE)
+        retired["kind"][len(rows):] = RETIRED_ALIAS
+        retired["index"] = np.concatenate([
+            np.asarray(rows, dtype="<u4"), np.asarray(aliases, dtype="<u4")
+        ])
+        if len(rows) and retired["index"][:len(rows)].max() >= self.count:
+            raise ValueError("cannot retire rows past the end of the store")
+        if len(aliases) and retired["index"][len(rows):].max() >= self.alias_count:
+            raise ValueError("cannot retire aliases past the end of the store")
+
+        self._retired.write(retired.tobytes())
+        self.retired_count += len(retired)
+
+    def commit(self):
+        for f in (self._text, self._offsets, self._meta, self._aliases, self._retired):
+            f.flush()
+            os.fsync(f.fileno())
+
+        _write_header(self.path, {
+            "version": FORMAT_VERSION,
+            "count": self.count,
+            "source_width": self.source_width,
+            "categories": self.categories,
+            "aliases": self.alias_count,
+            "retired": self.retired_count
+        })
+
+    def close(self):
+        self.commit()
+        for f in (self._text, self._offsets, self._meta, self._aliases, self._retired):
+            f.close()
+
+
+# ======================================================
+# READER (MMAP, O(1) LOOKUP BY ROW ID)
+# ======================================================
+class ChunkStore:
+
+    def __init__(self, path: str):
+        header = read_header(path)
+        if header is None:
+            raise FileNotFoundError(f"No chunk store at {path}")
+        if header["version"] not in META_FILES:
+            raise ValueError(f"Unsupported chunk store version {header['version']}")
+
+        self.path = path
+        self.count = header["count"]
+        self.version = header["version"]
+        self.categories = header.get("categories")
+        dtype = meta_dtype(header["source_width"], self.version)
+
+        self._offsets = np.memmap(
+            os.path.join(path, OFFSETS_FILE), dtype=OFFSET_DTYPE,
+            mode="r", shape=(self.count + 1,)
+        )
+        self._meta = np.memmap(
+            os.path.join(path, META_FILES[self.version]), dtype=dtype,
+            mode="r", shape=(self.count,)
+        ) if self.count else np.zeros(0, dtype=dtype)
+
+        self.alias_count = header.get("aliases", 0)
+        self._aliases = np.memmap(
+            os.path.join(path, ALIASES_FILE), dtype=alias_dtype(header["source_width"]),
+            mode="r", shape=(self.alias_count,)
+        ) if self.alias_count else np.zeros(0, dtype=alias_dtype(header["source_width"]))
+        self._alias_order = None
+
+        self.retired_count = header.get("retired", 0)
+        self._retired = np.fromfile(
+            os.path.join(path, RETIRED_FILE), dtype=RETIRED_DTYPE, count=self.retired_count
+        ) if self.retired_count else np.zeros(0, dtype=RETIRED_DTYPE)
+        self._live = None
+
+        text_size = int(self._offsets[-1])
+        self._text_file = open(os.path.join(path, TEXT_FILE), "rb")
+        self._text = mmap.mmap(
+            self._text_file.fileno(), text_size, access=mmap.ACCESS_READ
+        ) if text_size else b""
+
+    def __len__(self):
+        return self.count
+
+    def _check(self, i: int) -> int:
+        i = int(i)
+        if not 0 <= i < self.count:
+            raise IndexError(f"chunk row {i} out of range (0..{self.count - 1})")
+        return i
+
+    def text(self, i: int) -> str:
+        i = self._check(i)
+        start, end = int(self._offsets[i]), int(self._offsets[i + 1])
+        return self._text[start:end].decode("utf-8")
+
+    def source_file(self, i: int) -> str:
+        return self._meta[self._check(i)]["source_file"].decode("utf-8")
+
+    def chunk_id(self, i: int) -> int:
+        return int(self._meta[self._check(i)]["chunk_id"])
+
+    @property
+    def has_metadata(self) -> bool:
+        return self.version >= 2
+
+    def metadata(self, i: int) -> dict:
+        """court / year / outcome of row i (empty for version 1 stores)."""
+        if not self.has_metadata:
+            return {}
+        row = self._meta[self._check(i)]
+        return {
+            "court": self.categories["court"][row["court"]],
+            "year": int(row["year"]) or None,
+            "outcome": self.categories["outcome"][row["outcome"]],
+        }
+
+    def __getitem__(self, i: int) -> dict:
+        i = self._check(i)
+        row = self._meta[i]
+        return {
+            "source_file": row["source_file"].decode("utf-8"),
+            "chunk_id": int(row["chunk_id"]),
+            "text": self.text(i),
+            **self.metadata(i)
+        }
+
+    def column(self, field: str):
+        """Raw per-row values of a metadata field (codes for court / outcome)."""
+        if not self.has_metadata:
+            raise ValueError(
+                f"Chunk store at {self.path} has no {field} metadata; "
+                f"run `python -m scripts.migrate_metadata --upgrade`"
+            )
+        return self._meta[field]
+
+    def codes(self, field: str, values) -> list:
+        lookup = {value: code for code, value in enumerate(self.categories[field])}
+        return [lookup[v] for v in values if v in lookup]
+
+    def filter_mask(self, filters):
+        """
+        Boolean mask over rows for a normalize_filters() key, or None when
+        the search is unfiltered. Vectorized over the mmapped metadata.
+        """
+        if filters is None:
+            return None
+
+        courts, years, outcomes = filters
+        mask = np.ones(self.count, dtype=bool)
+
+        if courts is not None:
+            mask &= np.isin(self.column("court"), self.codes("court", courts))
+        if outcomes is not None:
+            mask &= np.isin(self.column("outcome"), self.codes("outcome", outcomes))
+        if years is not None:
+            year = self.column("year")
+            low, high = years
+            mask &= year > 0
+            if low is not None:
+                mask &= year >= low
+            if high is not None:
+                mask &= year <= high
+
+        return mask
+
+    def _liveness(self):
+        """(row location live, alias live, row live) boolean masks, computed once."""
+        if self._live is None:
+            retired = self._retired
+            row_live = np.ones(self.count, dtype=bool)
+            row_live[retired["index"][retired["kind"] == RETIRED_ROW]] = False
+            alias_live = np.ones(self.alias_count, dtype=bool)
+            alias_live[retired["index"][retired["kind"] == RETIRED_ALIAS]] = False
+
+            live = row_live.copy()
+            live[self._aliases["row"][alias_live]] = True
+            self._live = row_live, alias_live, live
+        return self._live
+
+    def live_mask(self, num_rows: int = None, num_aliases: int = None,
+                  retiring_rows=(), retiring_aliases=()):
+        """
+        Rows with at least one live location: the rows every index is built
+        over. build_kb asks ahead of a commit: only the first `num_rows` rows /
+        `num_aliases` aliases, with the `retiring_*` locations counted as gone.
+        """
+        if num_rows is None and num_aliases is None and not retiring_rows and not retiring_aliases:
+            return self._liveness()[2]
+
+        row_live, alias_live, _ = self._liveness()
+        row_live = row_live[:num_rows].copy()
+        alias_live = alias_live[:num_aliases].copy()
+        row_live[list(retiring_rows)] = False
+        alias_live[list(retiring_aliases)] = False
+
+        live = row_live.copy()
+        alias_rows = self._aliases["row"][:len(alias_live)][alias_live]
+        live[alias_rows[alias_rows < len(live)]] = True
+        return live
+
+    def alias_sources(self, rows, num_aliases: int = None, retiring_aliases=()) -> set:
+        """
+        Source files with a live alias (among the first `num_aliases`, the
+        `retiring_aliases` counted as gone) pointing at any of `rows`.
+        """
+        _, alias_live, _ = self._liveness()
+        alias_live = alias_live[:num_aliases].copy()
+        alias_live[list(retiring_aliases)] = False
+        aliases = self._aliases[:len(alias_live)]
+        hits = alias_live & np.isin(aliases["row"], np.fromiter(rows, dtype=np.int64))
+        return {source.decode("utf-8") for source in np.unique(aliases["source_file"][hits])}
+
+    def locations(self, i: int) -> list:
+        """Every live (source_file, chunk_id) whose chunk text is stored at row i."""
+        i = self._check(i)
+        row_live, alias_live, _ = self._liveness()
+        row = self._meta[i]
+        locations = []
+        if row_live[i]:
+            locations.append((row["source_file"].decode("utf-8"), int(row["chunk_id"])))
+
+        if self.alias_count:
+            if self._alias_order is None:
+                self._alias_order = np.argsort(self._aliases["row"], kind="stable")
+                self._alias_rows = self._aliases["row"][self._alias_order]
+            lo, hi = np.searchsorted(self._alias_rows, [i, i + 1])
+            for n in self._alias_order[lo:hi]:
+                if alias_live[n]:
+                    alias = self._aliases[n]
+                    locations.append((alias["source_file"].decode("utf-8"), int(alias["chunk_id"])))
+
+        return locations
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def close(self):
+        if isinstance(self._text, mmap.mmap):
+            self._text.close()
+        self._text_file.close()
+
+
+# ======================================================
+# VERSION 1 -> 2 (ADD COURT / YEAR / OUTCOME)
+# ======================================================
+def upgrade_chunk_store(path: str, document_metadata: dict):
+    """
+    Rewrite a version 1 store's metadata with court / year / outcome looked
+    up by source file. The new meta file is written first and the header
+    last, so an interrupted upgrade leaves a readable version 1 store.
+    """
+    header = read_header(path)
+    if header is None or header["version"] != 1:
+        raise ValueError(f"{path} is not a version 1 chunk store")
+
+    count = header["count"]
+    old = np.fromfile(
+        os.path.join(path, META_FILES[1]),
+        dtype=meta_dtype(header["source_width"], 1), count=count
+    )
+
+    writer_codes = {field: {UNKNOWN: 0} for field in CATEGORY_FIELDS}
+    new = np.zeros(count, dtype=meta_dtype(header["source_width"], 2))
+    new["source_file"] = old["source_file"]
+    new["chunk_id"] = old["chunk_id"]
+
+    # One lookup per distinct source file, then broadcast to its rows
+    sources, inverse = np.unique(old["source_file"], return_inverse=True)
+    per_source = {field: np.zeros(len(sources), dtype="<u2") for field in METADATA_FIELDS}
+    for n, source in enumerate(sources):
+        metadata = document_metadata.get(source.decode("utf-8"), {})
+        per_source["year"][n] = metadata.get("year") or 0
+        for field in CATEGORY_FIELDS:
+            codes = writer_codes[field]
+            per_source[field][n] = codes.setdefault(metadata.get(field) or UNKNOWN, len(codes))
+
+    for field in METADATA_FIELDS:
+        new[field] = per_source[field][inverse]
+
+    meta_path = os.path.join(path, META_FILES[2])
+    with open(meta_path + ".tmp", "wb") as f:
+        f.write(new.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(meta_path + ".tmp", meta_path)
+
+    _write_header(path, {
+        "version": 2,
+        "count": count,
+        "source_width": header["source_width"],
+        "categories": {field: list(codes) for field, codes in writer_codes.items()}
+    })
+    os.remove(os.path.join(path, META_FILES[1]))
+    return count
@@ -1,19 +1,213 @@
-from nltk.tokenize import sent_tokenize
-import nltk
-nltk.download("punkt")
+import re
+from collections import deque
+from functools import lru_cache
 
-def chunk_text(text, max_words=450, overlap=50):
-    sentences = sent_tokenize(text)
-    chunks = []
-    current = []
+from config.settings import CHUNK_SIZE_WORDS, CHUNK_OVERLAP
+
+
+# ======================================================
+# SENTENCE SPLITTING (LAZY, SINGLE PASS)
+# ======================================================
+# A sentence ends at . ? or ! followed by whitespace and something that can
+# start a new sentence (capital letter, digit, opening quote or bracket).
+_SENTENCE_END = re.compile(r'(?<=[.?!])\s+(?=["\'(\[]?[A-Z0-9])')
+
+# Common in Indian judgments; a full stop after these is not a sentence end.
+ABBREVIATIONS = {
+    "no", "nos", "v", "vs", "ltd", "pvt", "co", "corp", "sec", "secs", "art",
+    "arts", "cl", "para", "paras", "r", "rr", "o", "s", "ss", "mr", "mrs",
+    "ms", "dr", "sh", "smt", "hon'ble", "j", "jj", "cj", "etc", "viz", "ors",
+    "anr", "govt", "dt", "p", "pp", "vol", "ed", "sr", "jr", "st", "crl",
+    "cri", "civ", "misc", "appl", "i.e", "e.g", "u/s", "r/w",
+}
+
+_INITIALS = re.compile(r'(?:[a-z]\.)*[a-z]')
+
+UNITS = ("word", "char", "token")
+
+# Sentences longer than this many chars are split into pieces so that
+# streamed input never accumulates an unbounded pending tail. Each cut is
+# the last space within the first MAX_PENDING_CHARS of what is left of the
+# sentence, after a character that can't end one, so it depends only on the
+# text: feeding it in any blocks gives the same pieces, and the same chunks,
+# as splitting it whole.
+MAX_PENDING_CHARS = 20000
+_FORCED_CUT = re.compile(r'(?<=[^\s.?!]) ')
+
+# A pending tail that may still turn out to be a sentence boundary
+_UNDECIDED_TAIL = re.compile(r'\s+["\'(\[]?\Z')
+
+
+def _is_abbreviation(text: str, start: int, end: int) -> bool:
+    tail = text[max(start, end - 24):end].split()
+    if not tail:
+        return False
+    word = tail[-1].lstrip("([\"'").rstrip(".").lower()
+    return word in ABBREVIATIONS or bool(_INITIALS.fullmatch(word))
+
+
+def iter_sentences(text: str):
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.start()
+        if _is_abbreviation(text, start, end):
+            continue
+        yield text[start:end]
+        start = match.end()
+
+    if start < len(text):
+        yield text[start:]
+
+
+def _forced_cut(sentence: str):
+    """Where to cut a sentence longer than MAX_PENDING_CHARS, or None."""
+    cut = None
+    for match in _FORCED_CUT.finditer(sentence, 0, MAX_PENDING_CHARS):
+        cut = match.start()
+    if cut is None:
+        match = _FORCED_CUT.search(sentence, MAX_PENDING_CHARS)
+        cut = match.start() if match else None
+    return cut
+
+
+# ======================================================
+# STREAMING CHUNKER
+# ======================================================
+class Chunker:
+    """
+    Packs sentences into chunks of at most `max_size` units, where a unit is
+    a word, a character or a tokenizer token. Consecutive chunks share the
+    last `overlap` units (counted the same way) of the previous chunk.
+
+    Work is linear in the input: every word is costed once and a running
+    total is kept, so nothing is re-joined or re-split while packing.
+    Text can be fed incrementally with `feed()`; chunks are yielded as soon
+    as they are complete.
+    """
+
+    def __init__(self, max_size: int = CHUNK_SIZE_WORDS, overlap: int = CHUNK_OVERLAP,
+                 unit: str = "word", tokenizer=None):
+        if unit not in UNITS:
+            raise ValueError(f"unit must be one of {UNITS}, got {unit!r}")
+        if unit == "token" and tokenizer is None:
+            raise ValueError("unit='token' requires a tokenizer")
+        if not 0 <= overlap < max_size:
+            raise ValueError("overlap must be >= 0 and smaller than max_size")
+
+        self.max_size = max_size
+        self.overlap = overlap
+        self.unit = unit
 
-    for sent in sentences:
-        current.append(sent)
-        if len(" ".join(current).split()) >= max_words:
-            chunks.append(" ".join(current))
-            current = current[-overlap:]
+        if unit == "word":
+            self._cost = lambda word: 1
+        elif unit == "char":
+            # +1 for the joining space; the chunk text is one char shorter
+            self._cost = lambda word: len(word) + 1
+        else:
+            tokenize = getattr(tokenizer, "tokenize", tokenizer)
+            # Word-piece / BPE tokenizers pre-split on whitespace, so the sum
+            # of per-word counts equals the count for the whole chunk.
+            self._cost = lru_cache(maxsize=65536)(lambda word: max(1, len(tokenize(word))))
 
-    if current:
-        chunks.append(" ".join(current))
+        self._words = deque()
+        self._costs = deque()
+        self._total = 0
+        self._fresh = 0          # words added since the last emitted chunk
+        self._pending = ""       # possibly incomplete trailing sentence
+        self._continued = False  # _pending is the rest of a sentence already cut
 
-    return chunks
+    # --------------------------
+    # PUBLIC API
+    # --------------------------
+    def feed(self, text: str):
+        buffer = self._pending + text
+        sentences = iter_sentences(buffer)
+
+        previous = next(sentences, None)
+        for sentence in sentences:
+            yield from self._add_sentence(previous, self._continued)
+            self._continued = False
+            previous = sentence
+
+        self._pending = previous or ""
+
+        # Cut only within the part that is surely this sentence, where
+        # splitting it whole would cut too
+        while True:
+            tail = _UNDECIDED_TAIL.search(self._pending)
+            known = self._pending[:tail.start()] if tail else self._pending
+            cut = _forced_cut(known) if len(known) > MAX_PENDING_CHARS else None
+            if cut is None:
+                break
+            yield from self._add_words(self._pending[:cut], self._continued)
+            self._continued = True
+            self._pending = self._pending[cut + 1:]
+
+    def finish(self):
+        if self._pending:
+            yield from self._add_sentence(self._pending, self._continued)
+            self._pending = ""
+        self._continued = False
+
+        if self._fresh:
+            yield self._emit()
+
+        self._words.clear()
+        self._costs.clear()
+        self._total = 0
+
+    def split(self, text: str):
+        yield from self.feed(text)
+        yield from self.finish()
+
+    # --------------------------
+    # INTERNALS
+    # --------------------------
+    def _add_sentence(self, sentence: str, continued: bool = False):
+        while len(sentence) > MAX_PENDING_CHARS:
+            cut = _forced_cut(sentence)
+            if cut is None:
+                break
+            yield from self._add_words(sentence[:cut], continued)
+            continued = True
+            sentence = sentence[cut + 1:]
+        yield from self._add_words(sentence, continued)
+
+    def _add_words(self, sentence: str, continued: bool):
+        words = sentence.split()
+        costs = [self._cost(w) for w in words]
+
+        # Prefer to break at a sentence boundary, not at a forced cut
+        if not continued and self._fresh and self._total + sum(costs) > self.max_size:
+            yield self._emit()
+
+        # Sentences longer than a whole chunk are split between words
+        for word, cost in zip(words, costs):
+            if self._fresh and self._total + cost > self.max_size:
+                yield self._emit()
+            self._words.append(word)
+            self._costs.append(cost)
+            self._total += cost
+            self._fresh += 1
+
+    def _emit(self) -> str:
+        chunk = " ".join(self._words)
+
+        while self._words and self._total > self.overlap:
+            self._words.popleft()
+            self._total -= self._costs.popleft()
+
+        self._fresh = 0
+        return chunk
+
+
+# ======================================================
+# CONVENIENCE WRAPPERS
+# ======================================================
+def iter_chunks(text, max_size=CHUNK_SIZE_WORDS, overlap=CHUNK_OVERLAP,
+                unit="word", tokenizer=None):
+    yield from Chunker(max_size, overlap, unit, tokenizer).split(text)
+
+
+def chunk_text(text, max_words=450, overlap=50):
+    return list(iter_chunks(text, max_words, overlap, unit="word"))
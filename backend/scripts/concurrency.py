@@ -0,0 +1,166 @@
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config.settings import (
+    SUMMARY_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_RETRY_BUDGET_RATIO,
+    LLM_RETRY_BUDGET_MIN,
+    LLM_RETRY_BUDGET_WINDOW_SECONDS,
+    LLM_BREAKER_FAILURES,
+    LLM_BREAKER_COOLDOWN_SECONDS
+)
+
+
+# ======================================================
+# RETRY (EXPONENTIAL BACKOFF)
+# ======================================================
+def call_with_retry(fn, *args, retries: int = LLM_MAX_RETRIES,
+                    backoff: float = LLM_RETRY_BACKOFF_SECONDS, **kwargs):
+    for attempt in range(retries + 1):
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+class RetryBudget:
+    """
+    Caps retries at `min_retries` plus `ratio` of the calls made within a
+    sliding `window`. While a dependency is down every call fails; without
+    a budget each one would be retried and the outage multiplies the load.
+    """
+
+    def __init__(self, ratio: float = LLM_RETRY_BUDGET_RATIO, min_retries: int = LLM_RETRY_BUDGET_MIN,
+                 window: float = LLM_RETRY_BUDGET_WINDOW_SECONDS):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        for times in (self._calls, self._retries):
+            while times and times[0] < now - self.window:
+                times.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._calls.append(now)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False when it is used up."""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._calls):
+                return False
+            self._retries.append(now)
+            return True
+
+
+# ======================================================
+# CIRCUIT BREAKER
+# ======================================================
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failures; open rejects calls
+    for `cooldown` seconds, then half-open lets a single trial call through:
+    success closes the breaker, failure opens it again. A trial that never
+    reports back (e.g. an abandoned stream) is replaced after another cooldown.
+    """
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES,
+                 cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.cooldown:
+                self.state = "half_open"    # this caller is the trial
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failures:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures}
+
+
+# ======================================================
+# BOUNDED CONCURRENT MAP (ORDER PRESERVING)
+# ======================================================
+def bounded_map(fn, items, max_in_flight: int = SUMMARY_MAX_CONCURRENCY,
+                retries: int = 0):
+    """
+    Apply `fn` to every item with at most `max_in_flight` calls running at
+    once. Results come back in input order; with `retries`, each call is
+    retried on its own, so one flaky request never restarts the whole batch.
+    (LLM calls already retry inside llm_client, so the default is none.)
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = max(1, min(max_in_flight, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # One context copy per call: the caller's trace follows each item
+        futures = [
+            pool.submit(contextvars.copy_context().run, call_with_retry, fn, item, retries=retries)
+            for item in items
+        ]
+        return [future.result() for future in futures]
+
+
+def bounded_as_completed(fn, items, max_in_flight: int = SUMMARY_MAX_CONCURRENCY,
+                         retries: int = 0):
+    """
+    Like bounded_map, but yield (position, result) pairs as soon as each
+    call finishes, for callers that stream partial results.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    workers = max(1, min(max_in_flight, len(items)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(contextvars.copy_context().run, call_with_retry, fn, item, retries=retries): position
+            for position, item in enumerate(items)
+        }
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # Consumer went away (e.g. client disconnected): drop queued calls
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,294 @@
+import os
+import json
+import zlib
+import shutil
+import hashlib
+import argparse
+
+from config.settings import (
+    DATA_RAW_PATH,
+    CORPUS_PATH,
+    CORPUS_CSV_CHUNK_ROWS,
+    CORPUS_SHARD_BYTES,
+    CORPUS_READ_BUFFER_BYTES,
+    CORPUS_COMPRESSION_LEVEL
+)
+from scripts.document_metadata import NAME_COLUMNS, _first, extract_metadata
+
+
+# ======================================================
+# INGESTED CORPUS (GZIP JSONL SHARDS + OFFSET INDEX)
+# ======================================================
+# Layout under CORPUS_PATH:
+#   corpus_00000.jsonl.gz, ...  one gzip member per document, holding one
+#                               {"id", "text", "metadata", "columns"} line.
+#                               Concatenated members are a valid .jsonl.gz,
+#                               and each one can be inflated on its own.
+#   index.jsonl                 append-only; one line per written document:
+#                               {"id", "shard", "offset", "length", "sha256",
+#                                "chars", "metadata"}. A later line for the
+#                               same id wins; {"id", "deleted": true} drops it.
+#
+# Index lines are written only after the shard bytes they point at are on
+# disk, so after a crash the index is the truth: opening a writer cuts the
+# last shard back to the last indexed byte.
+
+INDEX_FILE = "index.jsonl"
+SHARD_PATTERN = "corpus_{:05d}.jsonl.gz"
+
+
+def shard_path(path: str, shard: int) -> str:
+    return os.path.join(path, SHARD_PATTERN.format(shard))
+
+
+def has_corpus(path: str = CORPUS_PATH) -> bool:
+    return os.path.exists(os.path.join(path, INDEX_FILE))
+
+
+def text_digest(text: str) -> str:
+    # Same bytes extract_text used to write, so hashes match the old per-file scan
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _read_index(path: str, repair: bool = False):
+    """
+    id -> live index entry, in write order. A torn last line (crash mid
+    append) is ignored, or cut off when `repair` is set.
+    """
+    index_path = os.path.join(path, INDEX_FILE)
+    entries = {}
+    if not os.path.exists(index_path):
+        return entries
+
+    valid = 0
+    with open(index_path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            valid += len(line)
+            entries.pop(entry["id"], None)
+            if not entry.get("deleted"):
+                entries[entry["id"]] = entry
+
+    if repair and valid != os.path.getsize(index_path):
+        with open(index_path, "r+b") as f:
+            f.truncate(valid)
+    return entries
+
+
+class CorpusWriter:
+    """Appends documents to the corpus; unchanged documents are skipped."""
+
+    def __init__(self, path: str = CORPUS_PATH, rebuild: bool = False,
+                 shard_bytes: int = CORPUS_SHARD_BYTES,
+                 compression_level: int = CORPUS_COMPRESSION_LEVEL):
+        if rebuild:
+            shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+        self.path = path
+        self.shard_bytes = shard_bytes
+        self.compression_level = compression_level
+        self.entries = _read_index(path, repair=True)
+        self._pending = []
+
+        # Resume after the last indexed byte; anything past it was never committed
+        self.shard, end = 0, 0
+        for entry in self.entries.values():
+            if (entry["shard"], entry["offset"] + entry["length"]) > (self.shard, end):
+                self.shard, end = entry["shard"], entry["offset"] + entry["length"]
+        orphan = self.shard + 1
+        while os.path.exists(shard_path(path, orphan)):
+            os.remove(shard_path(path, orphan))
+            orphan += 1
+
+        self._shard_file = open(shard_path(path, self.shard), "ab")
+        self._shard_file.truncate(end)
+        self._shard_file.seek(end)
+        self._index_file = open(os.path.join(path, INDEX_FILE), "a", encoding="utf-8")
+
+    def add(self, doc_id: str, text: str, metadata: dict, columns: dict = None):
+        """Write one document. Returns False when it is already stored unchanged."""
+        sha256 = text_digest(text)
+        known = self.entries.get(doc_id)
+        if known is not None and known["sha256"] == sha256:
+            if known["metadata"] == metadata:
+                return False
+            # Same text, new metadata: point a fresh index line at the old bytes
+            entry = {**known, "metadata": metadata}
+            self.entries[doc_id] = entry
+            self._pending.append(entry)
+            return True
+
+        if self._shard_file.tell() >= self.shard_bytes:
+            self.flush()
+            self._shard_file.close()
+            self.shard += 1
+            self._shard_file = open(shard_path(self.path, self.shard), "ab")
+
+        record = json.dumps(
+            {"id": doc_id, "text": text, "metadata": metadata, "columns": columns or {}},
+            ensure_ascii=False
+        ) + "\n"
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, 31)   # gzip member
+        data = compressor.compress(record.encode("utf-8")) + compressor.flush()
+
+        offset = self._shard_file.tell()
+        self._shard_file.write(data)
+
+        entry = {"id": doc_id, "shard": self.shard, "offset": offset, "length": len(data),
+                 "sha256": sha256, "chars": len(text), "metadata": metadata}
+        self.entries[doc_id] = entry
+        self._pending.append(entry)
+        return True
+
+    def delete(self, doc_id: str):
+        if self.entries.pop(doc_id, None) is not None:
+            self._pending.append({"id": doc_id, "deleted": True})
+
+    def flush(self):
+        """Make written documents durable, then index them."""
+        if not self._pending:
+            return
+        self._shard_file.flush()
+        os.fsync(self._shard_file.fileno())
+
+        self._index_file.write("".join(json.dumps(entry) + "\n" for entry in self._pending))
+        self._index_file.flush()
+        os.fsync(self._index_file.fileno())
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._shard_file.close()
+        self._index_file.close()
+
+
+class CorpusReader:
+    """Sequential (buffered) and random access to the corpus by document id."""
+
+    def __init__(self, path: str = CORPUS_PATH, buffer_bytes: int = CORPUS_READ_BUFFER_BYTES):
+        self.path = path
+        self.buffer_bytes = buffer_bytes
+        self.entries = _read_index(path)
+        self._files = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.entries
+
+    def position(self, doc_id):
+        """Sort key that turns a list of ids into one forward pass over the shards."""
+        entry = self.entries[doc_id]
+        return entry["shard"], entry["offset"]
+
+    def ids(self):
+        return sorted(self.entries, key=self.position)
+
+    def scan(self):
+        """doc id -> {"sha256", "size", "mtime"}, the shape build_kb's manifest keeps."""
+        return {
+            doc_id: {"sha256": entry["sha256"], "size": entry["chars"], "mtime": None}
+            for doc_id, entry in self.entries.items()
+        }
+
+    def metadata(self):
+        return {doc_id: entry["metadata"] for doc_id, entry in self.entries.items()}
+
+    def _file(self, shard: int):
+        f = self._files.get(shard)
+        if f is None:
+            f = self._files[shard] = open(shard_path(self.path, shard), "rb",
+                                          buffering=self.buffer_bytes)
+        return f
+
+    def _read(self, entry):
+        f = self._file(entry["shard"])
+        if f.tell() != entry["offset"]:   # consecutive documents need no seek
+            f.seek(entry["offset"])
+        record = json.loads(zlib.decompress(f.read(entry["length"]), 31))
+        record["metadata"] = entry["metadata"]   # may have been updated in the index only
+        return record
+
+    def get(self, doc_id: str) -> dict:
+        return self._read(self.entries[doc_id])
+
+    def iter_records(self, ids=None):
+        """Records for `ids` (default: all, in storage order), in the order given."""
+        for doc_id in self.ids() if ids is None else ids:
+            yield self._read(self.entries[doc_id])
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+# ======================================================
+# CSV -> CORPUS (STREAMED IN CHUNKS)
+# ======================================================
+def document_id(row: dict, row_number: int, seen: dict) -> str:
+    """
+    The CSV's own name / id column when it has one (stable if rows are
+    reordered), else the row number as extract_text used to name files.
+    """
+    doc_id = _first(row, NAME_COLUMNS) or f"doc_{row_number:05d}.txt"
+    seen[doc_id] = seen.get(doc_id, 0) + 1
+    return doc_id if seen[doc_id] == 1 else f"{doc_id}#{seen[doc_id]}"
+
+
+def ingest_csv(csv_path: str = DATA_RAW_PATH, path: str = CORPUS_PATH, rebuild: bool = False,
+               chunk_rows: int = CORPUS_CSV_CHUNK_ROWS):
+    import pandas as pd
+
+    writer = CorpusWriter(path, rebuild=rebuild)
+    seen, ingested, written, skipped = {}, set(), 0, 0
+
+    # dtype=str / no NA parsing: ids and labels come through exactly as written
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+    for chunk in reader:
+        if "text" not in chunk.columns:
+            raise ValueError("CSV must contain a 'text' column")
+
+        for row_number, row in zip(chunk.index, chunk.to_dict("records")):
+            text = row.pop("text").strip()
+            if not text:
+                continue
+            doc_id = document_id(row, row_number, seen)
+            ingested.add(doc_id)
+            if writer.add(doc_id, text, extract_metadata(row), row):
+                written += 1
+            else:
+                skipped += 1
+        writer.flush()
+
+    # Documents no longer in the CSV (or now empty) leave the corpus
+    deleted = [doc_id for doc_id in writer.entries if doc_id not in ingested]
+    for doc_id in deleted:
+        writer.delete(doc_id)
+    writer.close()
+
+    print(f"✅ Corpus at {path}: {len(writer.entries)} documents "
+          f"({written} written, {skipped} unchanged, {len(deleted)} removed)")
+    return writer.entries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream the CJPE CSV into the indexed corpus")
+    parser.add_argument("--csv", default=DATA_RAW_PATH)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--rebuild", action="store_true",
+                        help="discard the existing corpus instead of appending changes")
+    parser.add_argument("--show", metavar="ID", help="print one document and exit")
+    args = parser.parse_args()
+
+    if args.show:
+        print(json.dumps(CorpusReader(args.corpus).get(args.show), ensure_ascii=False, indent=2))
+    else:
+        ingest_csv(args.csv, args.corpus, args.rebuild)
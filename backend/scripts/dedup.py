@@ -0,0 +1,150 @@
+import re
+import zlib
+import hashlib
+
+import numpy as np
+
+from config.settings import (
+    DEDUP_MODE,
+    DEDUP_NUM_PERM,
+    DEDUP_BANDS,
+    DEDUP_SHINGLE_WORDS,
+    DEDUP_THRESHOLD
+)
+from scripts.document_metadata import METADATA_FIELDS
+
+
+# ======================================================
+# EXACT + NEAR-DUPLICATE CHUNK DETECTION (MINHASH / LSH)
+# ======================================================
+# Cause titles, "Downloaded on ..." footers and adjournment orders repeat
+# across thousands of daily orders. Each distinct chunk is embedded once;
+# repeats are recorded as aliases of the first copy's row. Chunks only
+# merge within one court / year / outcome: filters and court shards look at
+# the row's own metadata, so a copy from another court would never match.
+
+DEDUP_MODES = ("minhash", "exact", None)
+
+_PRIME = np.uint64(4294967291)   # largest prime below 2**32: (a * h + b) stays below 2**64
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class ChunkDeduper:
+    """
+    A chunk duplicates an earlier one when their normalized texts are equal
+    or, in "minhash" mode, when the estimated Jaccard similarity of their
+    word shingles is at least `threshold`.
+
+    Near-duplicates are found with MinHash signatures split into
+    `bands` LSH bands; only chunks sharing a band bucket are compared.
+    Both are keyed by the chunk's `scope_fields` metadata as well.
+    """
+
+    def __init__(self, mode: str = DEDUP_MODE, num_perm: int = DEDUP_NUM_PERM,
+                 bands: int = DEDUP_BANDS, shingle_words: int = DEDUP_SHINGLE_WORDS,
+                 threshold: float = DEDUP_THRESHOLD, seed: int = 1,
+                 scope_fields=METADATA_FIELDS):
+        if mode not in DEDUP_MODES:
+            raise ValueError(f"DEDUP_MODE must be one of {DEDUP_MODES}, got {mode!r}")
+        if num_perm % bands:
+            raise ValueError("DEDUP_NUM_PERM must be a multiple of DEDUP_BANDS")
+
+        self.mode = mode
+        self.scope_fields = tuple(scope_fields)
+        self.shingle_words = shingle_words
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), size=(num_perm, 1), dtype=np.uint64)
+
+        self._exact = {}                                  # digest -> row
+        self._buckets = [{} for _ in range(bands)]        # band key -> [rows]
+        self._signatures = np.zeros((1024, num_perm), dtype=np.uint32)
+        self._signature_rows = {}                         # row -> signature slot
+
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    # --------------------------
+    # HASHING
+    # --------------------------
+    def _scope(self, metadata) -> bytes:
+        metadata = metadata or {}
+        return "\x1f".join(str(metadata.get(f) or "") for f in self.scope_fields).encode("utf-8")
+
+    def _digest(self, normalized: str, scope: bytes = b"") -> bytes:
+        return hashlib.blake2b(scope + b"\x00" + normalized.encode("utf-8"), digest_size=16).digest()
+
+    def signature(self, normalized: str):
+        words = normalized.split()
+        n = self.shingle_words
+        shingles = [" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))]
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        ) % _PRIME
+        return ((self._a * hashes[None, :] + self._b) % _PRIME).min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature, scope: bytes = b""):
+        r = self.rows_per_band
+        return [scope + signature[i * r:(i + 1) * r].tobytes() for i in range(self.bands)]
+
+    # --------------------------
+    # PUBLIC API
+    # --------------------------
+    def find_or_add(self, text: str, row: int, metadata=None):
+        """
+        Row of the earlier chunk with the same scope `metadata` that `text`
+        duplicates, or None after registering `text` as a new distinct
+        chunk stored at `row`.
+        """
+        if not self.enabled:
+            return None
+
+        normalized = normalize(text)
+        scope = self._scope(metadata)
+        digest = self._digest(normalized, scope)
+        existing = self._exact.get(digest)
+        if existing is not None:
+            self.exact_duplicates += 1
+            return existing
+
+        if self.mode == "minhash":
+            signature = self.signature(normalized)
+            keys = self._band_keys(signature, scope)
+
+            candidates = set()
+            for bucket, key in zip(self._buckets, keys):
+                candidates.update(bucket.get(key, ()))
+            for candidate in sorted(candidates):
+                other = self._signatures[self._signature_rows[candidate]]
+                if np.mean(other == signature) >= self.threshold:
+                    self.near_duplicates += 1
+                    return candidate
+
+            slot = len(self._signature_rows)
+            if slot == len(self._signatures):
+                self._signatures = np.concatenate([self._signatures, np.zeros_like(self._signatures)])
+            self._signatures[slot] = signature
+            self._signature_rows[row] = slot
+            for bucket, key in zip(self._buckets, keys):
+                bucket.setdefault(key, []).append(row)
+
+        self._exact[digest] = row
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+        }
@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+# ======================================================
+# DOCUMENT ID (CONTENT HASH)
+# ======================================================
+def document_hash(text: str) -> str:
+    """SHA-256 of the UTF-8 document text; doubles as the public document_id."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class UnknownDocumentError(LookupError):
+    """A document_id that is not in the store and came without its text."""
+
+
+# ======================================================
+# SESSION
+# ======================================================
+class DocumentSession:
+    """Everything needed to answer follow-up questions about one upload."""
+
+    def __init__(self, document_id, index, chunks, embeddings):
+        self.document_id = document_id
+        self.index = index
+        self.chunks = chunks
+        self.embeddings = embeddings
+
+    @property
+    def nbytes(self) -> int:
+        # IndexFlat keeps its own copy of the vectors, so count them twice
+        text_bytes = sum(len(c) for c in self.chunks)
+        return 2 * self.embeddings.nbytes + text_bytes
+
+
+# ======================================================
+# STORE (LRU IN MEMORY + OPTIONAL SPILL TO DISK)
+# ======================================================
+class DocumentStore:
+    """
+    Content-hash keyed cache of (faiss index, chunks, embeddings).
+
+    Sessions are kept in memory up to `max_bytes` and evicted least recently
+    used first. When `spill_dir` is set, evicted sessions are written to disk
+    and transparently reloaded on the next lookup. The spill directory is
+    pruned to `spill_max_bytes` (least recently used first) and sessions
+    untouched for `spill_ttl_seconds` are dropped; None disables either.
+    """
+
+    def __init__(self, max_bytes: int, spill_dir: str = None,
+                 spill_max_bytes: int = None, spill_ttl_seconds: float = None):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_max_bytes = spill_max_bytes
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._prune_lock = threading.Lock()
+
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            self.prune_spill()
+
+    # --------------------------
+    # PUBLIC API
+    # --------------------------
+    def get(self, document_id: str):
+        with self._lock:
+            session = self._sessions.get(document_id)
+            if session is not None:
+                self._sessions.move_to_end(document_id)
+                return session
+
+        session = self._load_spilled(document_id)
+        if session is not None:
+            self._insert(session)
+        return session
+
+    def put(self, session: DocumentSession):
+        self._insert(session)
+        return session
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions_in_memory": len(self._sessions),
+                "bytes_in_memory": self._bytes,
+                "max_bytes": self.max_bytes,
+                "spill_dir": self.spill_dir,
+                "spill_max_bytes": self.spill_max_bytes,
+                "spill_ttl_seconds": self.spill_ttl_seconds,
+            }
+
+    def prune_spill(self):
+        """
+        Delete expired spilled sessions, then the least recently used ones
+        until the directory fits in `spill_max_bytes`. Returns the number of
+        sessions removed. Safe to run from several workers at once.
+        """
+        if not self.spill_dir or (self.spill_max_bytes is None and self.spill_ttl_seconds is None):
+            return 0
+
+        with self._prune_lock:
+            now = time.time()
+            entries, removed = [], 0
+            for name in os.listdir(self.spill_dir):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                    size = sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+                except OSError:
+                    continue   # removed by another worker meanwhile
+
+                expired = self.spill_ttl_seconds is not None and now - mtime > self.spill_ttl_seconds
+                if name.endswith(".tmp"):
+                    # A spill still being written; only a crashed one ever expires
+                    if expired:
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+                if expired:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+                else:
+                    entries.append((mtime, size, path))
+
+            if self.spill_max_bytes is not None:
+                total = sum(size for _, size, _ in entries)
+                for _, size, path in sorted(entries):
+                    if total <= self.spill_max_bytes:
+                        break
+                    shutil.rmtree(path, ignore_errors=True)
+                    total -= size
+                    removed += 1
+            return removed
+
+    # --------------------------
+    # INTERNALS
+    # --------------------------
+    def _insert(self, session: DocumentSession):
+        evicted = []
+        with self._lock:
+            old = self._sessions.pop(session.document_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+
+            self._sessions[session.document_id] = session
+            self._bytes += session.nbytes
+
+            # Never evict the session we just inserted
+            while self._bytes > self.max_bytes and len(self._sessions) > 1:
+                _, victim = self._sessions.popitem(last=False)
+                self._bytes -= victim.nbytes
+                evicted.append(victim)
+
+        for victim in evicted:
+            self._spill(victim)
+
+    def _spill_path(self, document_id: str):
+        if not self.spill_dir:
+            return None
+        # document ids are hex digests, but never trust them as path parts
+        if not all(c in "0123456789abcdef" for c in document_id):
+            return None
+        return os.path.join(self.spill_dir, document_id)
+
+    def _spill(self, session: DocumentSession):
+        path = self._spill_path(session.document_id)
+        if path is None or os.path.isdir(path):
+            return
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp_path, exist_ok=True)
+
+        faiss.write_index(session.index, os.path.join(tmp_path, "faiss.index"))
+        np.save(os.path.join(tmp_path, "embeddings.npy"), session.embeddings)
+        with open(os.path.join(tmp_path, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump(session.chunks, f)
+
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # Another worker spilled the same document first
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return
+        self.prune_spill()
+
+    def _load_spilled(self, document_id: str):
+        path = self._spill_path(document_id)
+        if path is None or not os.path.isdir(path):
+            return None
+
+        try:
+            index = faiss.read_index(os.path.join(path, "faiss.index"))
+            embeddings = np.load(os.path.join(path, "embeddings.npy"))
+            with open(os.path.join(path, "chunks.json"), "r", encoding="utf-8") as f:
+                chunks = json.load(f)
+        except (OSError, ValueError, RuntimeError):
+            return None
+
+        # The directory mtime is the LRU clock for pruning
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return DocumentSession(document_id, index, chunks, embeddings)
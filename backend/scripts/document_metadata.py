@@ -0,0 +1,124 @@
+import os
+import re
+import json
+
+from config.settings import DOCUMENT_METADATA_PATH
+
+
+# ======================================================
+# PER-DOCUMENT METADATA (COURT / YEAR / OUTCOME)
+# ======================================================
+# Extracted from the CJPE CSV next to each document's text and carried
+# into the chunk store, so KB search can be restricted to one forum,
+# a range of years or an outcome.
+
+METADATA_FIELDS = ("court", "year", "outcome")
+CATEGORY_FIELDS = ("court", "outcome")     # stored as codes; year is numeric
+
+UNKNOWN = ""
+
+# First matching column wins; the id / name column is the fallback for
+# court and year when the CSV has no dedicated column.
+COURT_COLUMNS = ("court", "court_name", "forum", "source")
+YEAR_COLUMNS = ("year", "date", "judgment_date", "decision_date")
+OUTCOME_COLUMNS = ("outcome", "decision", "label")
+NAME_COLUMNS = ("name", "id", "doc_id", "case_id", "file")
+
+COURT_PATTERNS = (
+    ("supreme_court", re.compile(r"supreme|(?<![a-z])sci?(?![a-z])", re.IGNORECASE)),
+    ("high_court", re.compile(r"high.?court|(?<![a-z])hcs?(?![a-z])", re.IGNORECASE)),
+    ("tribunal", re.compile(r"tribunal|itat|nclat|nclt|ncdrc|(?<![a-z])cat(?![a-z])", re.IGNORECASE)),
+    ("daily_order", re.compile(r"daily.?order", re.IGNORECASE)),
+)
+
+# CJPE ternary labels: 0 = rejected, 1 = accepted, 2 = partly accepted
+OUTCOME_LABELS = {"0": "rejected", "1": "accepted", "2": "partly_accepted"}
+
+_YEAR = re.compile(r"(?<!\d)(1[89]\d\d|20\d\d)(?!\d)")
+
+
+def _first(row: dict, columns):
+    for column in columns:
+        value = row.get(column)
+        if value is not None and str(value).strip() and str(value).lower() != "nan":
+            return str(value).strip()
+    return None
+
+
+def _court(value):
+    if value is None:
+        return None
+    for court, pattern in COURT_PATTERNS:
+        if pattern.search(value):
+            return court
+    return None
+
+
+def extract_metadata(row: dict) -> dict:
+    """Metadata for one CSV row (a dict of column -> value)."""
+    name = _first(row, NAME_COLUMNS)
+    court_value = _first(row, COURT_COLUMNS)
+
+    court = _court(court_value) or _court(name)
+    if court is None and court_value:
+        court = re.sub(r"[^a-z0-9]+", "_", court_value.lower()).strip("_")
+
+    year = None
+    for value in (_first(row, YEAR_COLUMNS), name):
+        match = _YEAR.search(value) if value else None
+        if match:
+            year = int(match.group(1))
+            break
+
+    outcome = _first(row, OUTCOME_COLUMNS)
+    if outcome is not None:
+        outcome = outcome[:-2] if outcome.endswith(".0") else outcome
+        outcome = OUTCOME_LABELS.get(outcome, outcome.lower())
+
+    return {"court": court or UNKNOWN, "year": year or 0, "outcome": outcome or UNKNOWN}
+
+
+# ======================================================
+# SIDE-CAR FILE (ONE JSON LINE PER EXTRACTED DOCUMENT)
+# ======================================================
+def write_metadata_line(f, filename: str, metadata: dict):
+    f.write(json.dumps({"file": filename, **metadata}, ensure_ascii=False) + "\n")
+
+
+def load_document_metadata(path: str = DOCUMENT_METADATA_PATH) -> dict:
+    """filename -> metadata; empty when the corpus was extracted without metadata."""
+    if not os.path.exists(path):
+        return {}
+
+    metadata = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                metadata[record.pop("file")] = record
+    return metadata
+
+
+# ======================================================
+# SEARCH FILTERS
+# ======================================================
+def normalize_filters(court=None, year_from=None, year_to=None, outcome=None):
+    """
+    Hashable filter key: (courts, (year_from, year_to), outcomes), or None
+    for an unfiltered search. Courts / outcomes accept a string (comma
+    separated) or a list.
+    """
+    def values(value):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = value.split(",")
+        value = tuple(sorted({v.strip().lower() for v in value if v and v.strip()}))
+        return value or None
+
+    courts, outcomes = values(court), values(outcome)
+    years = (year_from, year_to) if year_from is not None or year_to is not None else None
+
+    if courts is None and years is None and outcomes is None:
+        return None
+    return courts, years, outcomes
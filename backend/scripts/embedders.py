@@ -0,0 +1,203 @@
+import os
+import json
+import shutil
+import inspect
+import argparse
+
+import numpy as np
+
+from config.settings import (
+    EMBED_MODEL,
+    UPLOAD_EMBED_MODEL,
+    EMBED_BACKEND,
+    ONNX_MODEL_DIR,
+    ONNX_INTRA_OP_THREADS,
+    ONNX_INTER_OP_THREADS,
+    ONNX_THREAD_SPINNING
+)
+
+
+# ======================================================
+# EMBEDDING BACKENDS
+# ======================================================
+# Every backend exposes the part of SentenceTransformer the pipeline uses:
+#   encode(texts, batch_size) -> float32 array, .tokenizer (for token
+#   chunking / counting), get_sentence_embedding_dimension().
+# "onnx" runs the same network (transformer + pooling + normalize, as one
+# graph) under ONNX Runtime; "onnx_int8" uses dynamically quantized weights.
+
+EMBED_BACKENDS = ("torch", "onnx", "onnx_int8")
+
+MODEL_FILES = {"onnx": "model.onnx", "onnx_int8": "model_int8.onnx"}
+CONFIG_FILE = "embedder.json"
+
+
+def embedder_id(name: str, backend: str = EMBED_BACKEND) -> str:
+    """Cache / manifest key: vectors from different backends are not mixed."""
+    return name if backend == "torch" else f"{name}@{backend}"
+
+
+def export_dir(name: str, root: str = ONNX_MODEL_DIR) -> str:
+    return os.path.join(root, name.replace("/", "__"))
+
+
+# ======================================================
+# EXPORT (PYTORCH -> ONNX, OPTIONAL INT8)
+# ======================================================
+def _sentence_graph(model, input_names):
+    import torch
+
+    class SentenceEmbedding(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(dict(zip(input_names, inputs)))["sentence_embedding"]
+
+    return SentenceEmbedding().eval()
+
+
+def export_onnx(name: str, root: str = ONNX_MODEL_DIR, quantize: bool = True) -> str:
+    """
+    Export a SentenceTransformer to `export_dir(name)`: model.onnx, the
+    tokenizer and embedder.json, plus model_int8.onnx when `quantize`.
+    Written to a temp directory and renamed, so a half-done export is
+    never loaded.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    target = export_dir(name, root)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    print(f"📦 Exporting {name} to ONNX...")
+    model = SentenceTransformer(name, device="cpu")
+    sample = model.tokenizer(["export sample"], return_tensors="pt")
+    input_names = list(sample.keys())
+
+    # The TorchScript exporter handles these models without onnxscript
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    with torch.no_grad():
+        torch.onnx.export(
+            _sentence_graph(model, input_names),
+            tuple(sample[key] for key in input_names),
+            os.path.join(tmp, MODEL_FILES["onnx"]),
+            input_names=input_names,
+            output_names=["sentence_embedding"],
+            dynamic_axes={
+                **{key: {0: "batch", 1: "sequence"} for key in input_names},
+                "sentence_embedding": {0: "batch"}
+            },
+            opset_version=17,
+            **extra
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(
+            os.path.join(tmp, MODEL_FILES["onnx"]),
+            os.path.join(tmp, MODEL_FILES["onnx_int8"]),
+            weight_type=QuantType.QInt8,
+            per_channel=True
+        )
+
+    model.tokenizer.save_pretrained(tmp)
+    with open(os.path.join(tmp, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "model": name,
+            "dimension": model.get_sentence_embedding_dimension(),
+            "max_seq_length": model.max_seq_length,
+            "inputs": input_names
+        }, f, indent=2)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    print(f"✅ Exported {name} to {target}")
+    return target
+
+
+# ======================================================
+# ONNX RUNTIME EMBEDDER
+# ======================================================
+def session_options(intra_threads=ONNX_INTRA_OP_THREADS, inter_threads=ONNX_INTER_OP_THREADS,
+                    spinning=ONNX_THREAD_SPINNING):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if intra_threads:
+        options.intra_op_num_threads = intra_threads
+    if inter_threads:
+        options.inter_op_num_threads = inter_threads
+    options.add_session_config_entry("session.intra_op.allow_spinning", "1" if spinning else "0")
+    return options
+
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible encoder backed by an ONNX Runtime session."""
+
+    def __init__(self, name: str, quantized: bool = False, root: str = ONNX_MODEL_DIR,
+                 intra_threads=ONNX_INTRA_OP_THREADS, inter_threads=ONNX_INTER_OP_THREADS):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = export_dir(name, root)
+        model_file = os.path.join(path, MODEL_FILES["onnx_int8" if quantized else "onnx"])
+        if not os.path.exists(model_file):
+            export_onnx(name, root, quantize=True)
+
+        with open(os.path.join(path, CONFIG_FILE), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.name = name
+        self.max_seq_length = self.config["max_seq_length"]
+        self.tokenizer = AutoTokenizer.from_pretrained(path)
+        self.session = ort.InferenceSession(
+            model_file, session_options(intra_threads, inter_threads),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dimension"]
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs):
+        single = isinstance(sentences, str)
+        sentences = [sentences] if single else list(sentences)
+        output = np.empty((len(sentences), self.config["dimension"]), dtype="float32")
+
+        # Longest first, as SentenceTransformer does: batches pad to similar lengths
+        order = sorted(range(len(sentences)), key=lambda i: -len(sentences[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            features = self.tokenizer(
+                [sentences[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np"
+            )
+            inputs = {key: features[key].astype("int64") for key in self.input_names}
+            output[batch] = self.session.run(None, inputs)[0]
+
+        return output[0] if single else output
+
+
+def load_embedder(name: str, backend: str = EMBED_BACKEND):
+    if backend not in EMBED_BACKENDS:
+        raise ValueError(f"EMBED_BACKEND must be one of {EMBED_BACKENDS}, got {backend!r}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    return OnnxEmbedder(name, quantized=backend == "onnx_int8")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export embedding models to ONNX (+ int8)")
+    parser.add_argument("--models", nargs="+", default=[EMBED_MODEL, UPLOAD_EMBED_MODEL])
+    parser.add_argument("--root", default=ONNX_MODEL_DIR)
+    parser.add_argument("--no-int8", action="store_true", help="skip the quantized model")
+    args = parser.parse_args()
+
+    for model_name in args.models:
+        export_onnx(model_name, args.root, quantize=not args.no_int8)
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from config.settings import CPU_POOL_WORKERS, IO_POOL_WORKERS
+
+
+# ======================================================
+# DEDICATED CPU / I/O POOLS
+# ======================================================
+# Async routes must never run encoder, FAISS or blocking HTTP work on the
+# event loop. CPU stages (SentenceTransformer encode, FAISS build/search)
+# go to a small pool sized to the cores; blocking LLM calls go to a larger
+# I/O pool. Both are threads: torch and faiss release the GIL, and the
+# document sessions they work on live in this process.
+#
+# Work is run in a copy of the caller's context, so request-scoped state
+# (the telemetry trace) follows it into the pool.
+
+_pools = {}
+_pools_guard = threading.Lock()
+
+
+def _pool(name: str, workers: int) -> ThreadPoolExecutor:
+    with _pools_guard:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+            _pools[name] = pool
+        return pool
+
+
+def cpu_pool() -> ThreadPoolExecutor:
+    return _pool("cpu", CPU_POOL_WORKERS)
+
+
+def io_pool() -> ThreadPoolExecutor:
+    return _pool("io", IO_POOL_WORKERS)
+
+
+def hedge_pool() -> ThreadPoolExecutor:
+    # Hedged LLM calls: separate from the I/O pool, whose threads wait on them
+    return _pool("hedge", IO_POOL_WORKERS)
+
+
+async def run_cpu(fn, *args):
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(cpu_pool(), context.run, fn, *args)
+
+
+async def run_io(fn, *args):
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(io_pool(), context.run, fn, *args)
+
+
+_DONE = object()
+
+
+async def iterate_in_executor(iterator, executor=None):
+    """Drive a blocking (sync) iterator from async code, one step per executor call."""
+    loop = asyncio.get_running_loop()
+    executor = executor or io_pool()
+    iterator = iter(iterator)
+    context = contextvars.copy_context()   # steps run one at a time, so one copy serves all
+
+    try:
+        while True:
+            item = await loop.run_in_executor(executor, context.run, next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            # Runs the generator's cleanup (e.g. cancelling queued LLM calls)
+            await loop.run_in_executor(executor, context.run, close)
+
+
+def shutdown():
+    with _pools_guard:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
@@ -0,0 +1,160 @@
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# ======================================================
+# LOCAL GROQ-COMPATIBLE CHAT COMPLETIONS SERVER
+# ======================================================
+# Stands in for api.groq.com in benchmarks, with a configurable time to
+# first token and generation rate. Point the API at it with
+#   GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=fake uvicorn app.main:app
+# (the groq SDK reads GROQ_BASE_URL).
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"
+
+
+class FakeGroqConfig:
+
+    def __init__(self, latency_ms: float = 300.0, jitter_ms: float = 0.0,
+                 tokens_per_second: float = 500.0, completion_tokens: int = 200, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.completion_tokens = completion_tokens
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def first_token_delay(self) -> float:
+        with self._rng_lock:
+            jitter = self._rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+
+def prompt_tokens(messages) -> int:
+    # ~4 characters per token, close enough for usage accounting
+    return sum(len(m.get("content") or "") for m in messages) // 4
+
+
+def completion_words(n: int):
+    return [f"token{i}" for i in range(n)]
+
+
+def make_handler(config: FakeGroqConfig):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.rstrip("/") != COMPLETIONS_PATH:
+                self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+                return
+
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            model = request.get("model", "fake")
+            n = min(config.completion_tokens, request.get("max_tokens") or config.completion_tokens)
+            usage = {
+                "prompt_tokens": prompt_tokens(request.get("messages", [])),
+                "completion_tokens": n,
+            }
+            usage["total_tokens"] = usage["prompt_tokens"] + n
+            base = {"id": f"chatcmpl-{time.perf_counter_ns()}", "created": int(time.time()), "model": model}
+
+            time.sleep(config.first_token_delay())
+            if request.get("stream"):
+                self._stream(base, n, usage)
+                return
+
+            time.sleep(n * config.token_delay())
+            self._send_json(200, {
+                **base,
+                "object": "chat.completion",
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": " ".join(completion_words(n))},
+                    "finish_reason": "stop"
+                }],
+                "usage": usage
+            })
+
+        def _stream(self, base: dict, n: int, usage: dict):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(payload):
+                if not isinstance(payload, bytes):
+                    payload = json.dumps(payload).encode("utf-8")
+                data = b"data: " + payload + b"\n\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            delay = config.token_delay()
+            for i, word in enumerate(completion_words(n)):
+                if i:
+                    time.sleep(delay)
+                event({**base, "object": "chat.completion.chunk", "choices": [
+                    {"index": 0, "delta": {"content": word if not i else " " + word}, "finish_reason": None}
+                ]})
+
+            # Groq reports usage on the last chunk under x_groq
+            event({**base, "object": "chat.completion.chunk",
+                   "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                   "x_groq": {"id": base["id"], "usage": usage}})
+            event(b"[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve_in_background(config: FakeGroqConfig, host: str = "127.0.0.1", port: int = 0):
+    """Start the server on a daemon thread; returns (server, base_url). Call server.shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Groq-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=500.0, help="0 = instant")
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    config = FakeGroqConfig(args.latency_ms, args.jitter_ms, args.tokens_per_second, args.completion_tokens)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    server.daemon_threads = True
+    print(f"🤖 Fake Groq listening on http://{args.host}:{args.port} "
+          f"({args.latency_ms:.0f} ms to first token, {args.tokens_per_second:.0f} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
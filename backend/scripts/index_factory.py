@@ -0,0 +1,154 @@
+import faiss
+import numpy as np
+
+from config.settings import (
+    INDEX_TYPE,
+    IVF_NLIST,
+    PQ_M,
+    PQ_NBITS,
+    HNSW_M,
+    HNSW_EF_CONSTRUCTION,
+    TRAIN_SAMPLE_SIZE,
+    NPROBE,
+    EF_SEARCH
+)
+
+
+# ======================================================
+# INDEX CONSTRUCTION
+# ======================================================
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "fp16")
+
+# faiss warns below ~39 training points per IVF centroid
+MIN_POINTS_PER_CENTROID = 39
+
+
+def effective_nlist(num_vectors: int, nlist: int = IVF_NLIST) -> int:
+    return max(1, min(nlist, num_vectors // MIN_POINTS_PER_CENTROID))
+
+
+def make_index(index_type: str, dimension: int, num_vectors: int,
+               nlist: int = IVF_NLIST, pq_m: int = PQ_M, pq_nbits: int = PQ_NBITS,
+               hnsw_m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION):
+    """Return an empty (possibly untrained) L2 index of the requested type."""
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+
+    if index_type in ("ivf_flat", "ivf_pq"):
+        nlist = effective_nlist(num_vectors, nlist)
+        quantizer = faiss.IndexFlatL2(dimension)
+        if index_type == "ivf_flat":
+            return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_L2)
+        if dimension % pq_m:
+            raise ValueError(f"PQ_M={pq_m} must divide the embedding dimension {dimension}")
+        return faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+        return index
+
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_8bit)
+
+    if index_type == "fp16":
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16)
+
+    raise ValueError(f"INDEX_TYPE must be one of {INDEX_TYPES}, got {index_type!r}")
+
+
+# ======================================================
+# TRAINING ON A SAMPLE
+# ======================================================
+def take_rows(arrays, rows):
+    """Gather global row ids (sorted) from a list of 2-D arrays treated as one."""
+    out = []
+    start = 0
+    for array in arrays:
+        lo, hi = np.searchsorted(rows, [start, start + len(array)])
+        if hi > lo:
+            out.append(np.asarray(array[rows[lo:hi] - start], dtype="float32"))
+        start += len(array)
+    return np.concatenate(out)
+
+
+def sample_rows(arrays, sample_size: int = TRAIN_SAMPLE_SIZE, seed: int = 0, rows=None):
+    """
+    Uniformly sample up to `sample_size` rows from a list of 2-D arrays
+    (typically mmapped build segments) without concatenating them.
+    `rows` restricts the sample to those (sorted) global row ids.
+    """
+    if rows is None:
+        total = sum(len(a) for a in arrays)
+        if total <= sample_size:
+            return np.concatenate([np.asarray(a, dtype="float32") for a in arrays])
+        rows = np.arange(total)
+
+    if len(rows) > sample_size:
+        rng = np.random.default_rng(seed)
+        rows = np.sort(rng.choice(rows, size=sample_size, replace=False))
+    return take_rows(arrays, rows)
+
+
+def build_index(arrays, dimension: int, index_type: str = INDEX_TYPE,
+                sample_size: int = TRAIN_SAMPLE_SIZE, rows=None, **kwargs):
+    """
+    Create, train (on a sample) and fill an index from a list of arrays.
+    With `rows` (sorted global row ids), only those rows are added, and
+    they are searchable under their row ids (IndexIDMap).
+    """
+    if rows is None:
+        num_vectors = sum(len(a) for a in arrays)
+        index = make_index(index_type, dimension, num_vectors, **kwargs)
+        if not index.is_trained:
+            index.train(sample_rows(arrays, sample_size))
+        for array in arrays:
+            index.add(np.ascontiguousarray(array, dtype="float32"))
+        return index
+
+    base = make_index(index_type, dimension, len(rows), **kwargs)
+    if not base.is_trained:
+        base.train(sample_rows(arrays, sample_size, rows=rows))
+
+    index = faiss.IndexIDMap(base)
+    start = 0
+    for array in arrays:
+        lo, hi = np.searchsorted(rows, [start, start + len(array)])
+        if hi > lo:
+            local = rows[lo:hi]
+            vectors = np.ascontiguousarray(array[local - start], dtype="float32")
+            index.add_with_ids(vectors, local.astype("int64"))
+        start += len(array)
+
+    return index
+
+
+# ======================================================
+# SERVING-TIME KNOBS
+# ======================================================
+def search_params(index, nprobe: int = NPROBE, ef_search: int = EF_SEARCH, selector=None):
+    """
+    Per-call search parameters for `index.search(..., params=...)`.
+    Returns None for index types without tunable knobs (unless a
+    `selector` restricting the searchable ids is given). Using per-call
+    parameters keeps a shared index safe to search from many threads.
+    """
+    base = index
+    while hasattr(base, "index") and not isinstance(base, faiss.IndexIVF):
+        base = faiss.downcast_index(base.index)   # unwrap IDMap / PreTransform
+
+    base = faiss.downcast_index(base)
+    if isinstance(base, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF()
+        params.nprobe = min(nprobe, base.nlist)
+    elif isinstance(base, faiss.IndexHNSW):
+        params = faiss.SearchParametersHNSW()
+        params.efSearch = ef_search
+    elif selector is not None:
+        params = faiss.SearchParameters()
+    else:
+        return None
+
+    if selector is not None:
+        params.sel = selector
+    return params
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from contextlib import closing
+
+from config.settings import (
+    JOB_DB_PATH,
+    JOB_WORKERS,
+    JOB_RESULT_TTL_SECONDS,
+    JOB_POLL_SECONDS
+)
+from scripts.doc_store import UnknownDocumentError
+from scripts.telemetry import trace_request
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ======================================================
+# JOB HANDLERS (RUN ON A WORKER THREAD)
+# ======================================================
+# Each handler gets the job params and a `report(progress_dict)` callback,
+# which also raises JobCancelled once the job has been cancelled.
+
+def _run_qa(params, report):
+    from scripts.upload_rag import get_session, ask_question
+
+    session = get_session(params.get("text"), params.get("document_id"))
+    report({"stage": "answer", "done": 0, "total": 1})
+    answer = ask_question(session.index, session.chunks, params["question"])
+    return {"document_id": session.document_id, "answer": answer}
+
+
+def _run_section(params, report):
+    from scripts.upload_rag import get_session, iter_section_summaries, SECTION_QUERIES
+
+    session = get_session(params.get("text"), params.get("document_id"))
+    total = len(SECTION_QUERIES)
+    report({"stage": "section", "done": 0, "total": total})
+
+    answers = {}
+    with closing(iter_section_summaries(params.get("text"), session.document_id)) as sections:
+        for title, summary in sections:
+            answers[title] = summary
+            report({"stage": "section", "done": len(answers), "total": total})
+
+    # Keep the canonical section order regardless of completion order
+    ordered = {title: answers[title] for title in SECTION_QUERIES}
+    return {"document_id": session.document_id, "sections": ordered}
+
+
+def _run_summary(params, report):
+    from scripts.upload_rag import get_session, iter_summary_steps, final_summary
+
+    session = get_session(params.get("text"), params.get("document_id"))
+
+    with closing(iter_summary_steps(session.chunks)) as steps:
+        for event, data in steps:
+            if event == "progress":
+                report(data)
+            else:
+                report({"stage": "final", "done": 0, "total": 1})
+                summary = final_summary(data)
+
+    return {"document_id": session.document_id, "summary": summary}
+
+
+JOB_HANDLERS = {
+    "qa": _run_qa,
+    "section": _run_section,
+    "summary": _run_summary,
+}
+
+
+# ======================================================
+# DURABLE QUEUE (SQLITE) + LOCAL WORKER POOL
+# ======================================================
+class JobQueue:
+    """
+    Jobs are rows in a SQLite file, so queued work survives a restart: jobs
+    that were running when the process died are re-queued on start().
+    Finished jobs keep their result for `ttl_seconds` and are then purged.
+
+    One process should own a given queue file; start() assumes any job
+    still marked running was orphaned.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH, workers: int = JOB_WORKERS,
+                 ttl_seconds: float = JOB_RESULT_TTL_SECONDS,
+                 poll_seconds: float = JOB_POLL_SECONDS, handlers=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.workers = workers
+        self.ttl = ttl_seconds
+        self.poll_seconds = poll_seconds
+        self.handlers = handlers or JOB_HANDLERS
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " mode TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " progress TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " started_at REAL,"
+            " finished_at REAL,"
+            " expires_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    # --------------------------
+    # CLIENT SIDE
+    # --------------------------
+    def submit(self, mode: str, params: dict) -> str:
+        if mode not in self.handlers:
+            raise ValueError(f"Unknown job mode {mode!r}")
+
+        job_id = uuid.uuid4().hex
+        self._execute(
+            "INSERT INTO jobs (id, mode, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+            (job_id, mode, json.dumps(params), time.time())
+        )
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str):
+        """Public view of a job, or None when it doesn't exist or has expired."""
+        row = self._execute(
+            "SELECT id, mode, status, progress, result, error, created_at, started_at,"
+            " finished_at, expires_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+
+        if row is None or (row[9] is not None and row[9] <= time.time()):
+            return None
+
+        return {
+            "job_id": row[0],
+            "mode": row[1],
+            "status": row[2],
+            "progress": json.loads(row[3]) if row[3] else None,
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "created_at": row[6],
+            "started_at": row[7],
+            "finished_at": row[8],
+            "expires_at": row[9],
+        }
+
+    def cancel(self, job_id: str):
+        """
+        Cancel a job. Queued jobs stop immediately; running jobs stop at
+        their next progress report. Returns the job, or None if unknown.
+        """
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ?, params = '{}'"
+            " WHERE id = ? AND status = 'queued'",
+            (now, self._expiry(now), job_id)
+        )
+        self._execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,)
+        )
+        return self.get(job_id)
+
+    def stats(self) -> dict:
+        rows = self._execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": self.workers, "jobs": dict(rows)}
+
+    # --------------------------
+    # WORKER SIDE
+    # --------------------------
+    def start(self):
+        if self._threads:
+            return
+
+        # Jobs interrupted by a crash or restart run again from the start,
+        # unless they were being cancelled
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = ?, expires_at = ?, params = '{}'"
+            " WHERE status = 'running' AND cancel_requested = 1",
+            (now, self._expiry(now))
+        )
+        self._execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, progress = NULL"
+            " WHERE status = 'running'"
+        )
+        self._stop.clear()
+        for n in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=self.poll_seconds * 2)
+        self._threads = []
+
+    def purge_expired(self) -> int:
+        return self._execute(
+            "DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        ).rowcount
+
+    def _expiry(self, now: float):
+        return now + self.ttl if self.ttl else None
+
+    def _claim(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, mode, params FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                        (time.time(), row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row
+
+    def _report(self, job_id: str, progress: dict):
+        cancelled = self._execute(
+            "SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if cancelled is None or cancelled[0]:
+            raise JobCancelled(job_id)
+        self._execute("UPDATE jobs SET progress = ? WHERE id = ?", (json.dumps(progress), job_id))
+
+    def _finish(self, job_id: str, status: str, result=None, error: str = None):
+        now = time.time()
+        # The document text is no longer needed once the job has finished
+        self._execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ?,"
+            " params = '{}' WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error,
+             now, self._expiry(now), job_id)
+        )
+
+    def _work(self):
+        while not self._stop.is_set():
+            self.purge_expired()
+            job = self._claim()
+            if job is None:
+                self._wake.wait(self.poll_seconds)
+                self._wake.clear()
+                continue
+
+            job_id, mode, params = job
+            try:
+                with trace_request(job_id, f"job {mode}"):
+                    result = self.handlers[mode](json.loads(params), lambda p: self._report(job_id, p))
+            except JobCancelled:
+                self._finish(job_id, "cancelled")
+            except UnknownDocumentError as exc:
+                self._finish(job_id, "failed", error=f"Unknown document_id {exc}")
+            except Exception as exc:
+                self._finish(job_id, "failed", error=repr(exc))
+            else:
+                self._finish(job_id, "succeeded", result=result)
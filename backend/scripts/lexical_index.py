@@ -0,0 +1,337 @@
+import os
+import re
+import json
+import math
+import mmap
+import shutil
+import argparse
+from collections import Counter
+
+import numpy as np
+from tqdm import tqdm
+
+from config.settings import (
+    CHUNK_STORE_PATH,
+    LEXICAL_INDEX_PATH,
+    BM25_K1,
+    BM25_B
+)
+from scripts.atomic_io import atomic_write_json
+
+
+# ======================================================
+# ON-DISK LAYOUT
+# ======================================================
+# <path>/header.json        {"version", "num_docs", "num_terms", "num_postings", "avgdl", "k1", "b"}
+# <path>/terms.bin          sorted UTF-8 terms, back to back
+# <path>/terms.u64          num_terms + 1 byte offsets into terms.bin
+# <path>/postings.u64       num_terms + 1 offsets into docs.u32 / tfs.u16
+# <path>/docs.u32           chunk row ids (= FAISS ids), ascending per term
+# <path>/tfs.u16            term frequency per posting
+# <path>/doclen.u32         tokens per chunk
+#
+# Everything is mmapped; a query reads only the posting lists of its terms.
+
+FORMAT_VERSION = 1
+
+HEADER_FILE = "header.json"
+TERMS_FILE = "terms.bin"
+TERM_OFFSETS_FILE = "terms.u64"
+POSTING_OFFSETS_FILE = "postings.u64"
+DOCS_FILE = "docs.u32"
+TFS_FILE = "tfs.u16"
+DOCLEN_FILE = "doclen.u32"
+
+BUILD_BLOCK_DOCS = 50_000   # chunks tokenized per build block
+
+# Section numbers, case numbers and years are kept as tokens: "Section 438
+# CrPC" -> section, 438, crpc
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the
+this to was were which with
+""".split())
+
+
+def tokenize(text: str):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+# ======================================================
+# CITATION-STYLE QUERIES (LEXICAL ONLY, NO ENCODER)
+# ======================================================
+# Only structured citation forms: a bare "order 3" or "it's 5" is prose and
+# goes to hybrid search. Lower-case flags are scoped so party names in
+# "State v. Ramesh" must still be capitalised.
+_ACT = r"""(?:ipc|crpc|cr\.?\s*p\.?\s*c|cpc|c\.\s*p\.\s*c|ndps|pocso|uapa|pmla
+             |(?:of\s+)?(?:the\s+)?(?:[a-z][\w.,]*\s+){0,4}?(?:act|code|constitution))\b"""
+
+CITATION_PATTERN = re.compile(rf"""
+      (?i:\b(?:sections?|secs?\.|ss?\.|articles?|arts?\.|rules?)\s*\d+[a-z]?          # Section 438, S. 302, Art. 21
+          (?:\s*(?:,|and|&|/)\s*\d+[a-z]?)*                                         # Sections 302 and 34 ...
+          (?:(?:\(\w{{1,4}}\))+ | \s*,?\s*{_ACT}))                                    # ... IPC / of the ... Act, or 13(1)(ia)
+    | (?i:\border\s+[ivxlc\d]+\s*,?\s*rule\s+\d+)                                # Order 39 Rule 1
+    | (?i:\bnos?\.\s*\d+\s*(?:/|of)\s*(?:19|20)\d{{2}}\b)                          # No. 123/2019, No. 12 of 2020
+    | (?i:\(\d{{4}}\)\s*\d+\s*scc\b | \bair\s*\d{{4}}\b)                            # (2014) 8 SCC, AIR 1978
+    | \b[A-Z][\w.&']*\s+(?i:v|vs|versus)\.?\s+[A-Z]                                 # State v. Ramesh
+""", re.VERBOSE)
+
+
+def is_citation_query(query: str) -> bool:
+    return CITATION_PATTERN.search(query) is not None
+
+
+# ======================================================
+# BUILD (TWO PASSES, BOUNDED MEMORY)
+# ======================================================
+def build_lexical_index(chunk_store, path: str = LEXICAL_INDEX_PATH,
+                        k1: float = BM25_K1, b: float = BM25_B,
+                        block_docs: int = BUILD_BLOCK_DOCS, live=None):
+    """
+    Build a BM25 index over the rows of `chunk_store` (only those marked in
+    the boolean `live` mask, when given). Pass one tokenizes
+    each block of chunks once and spills (term, doc, tf) triples to disk;
+    pass two scatters them into the final posting lists using the document
+    frequencies, so no corpus-sized Python structure is ever held.
+    """
+    num_docs = len(chunk_store)
+    if live is None:
+        live = np.ones(num_docs, dtype=bool)
+    num_live = int(live.sum())
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    blocks_dir = os.path.join(tmp_path, "blocks")
+    os.makedirs(blocks_dir)
+
+    vocab = {}
+    doclen = np.zeros(num_docs, dtype="<u4")
+    block_files = []
+
+    # --------------------------
+    # PASS 1: TOKENIZE
+    # --------------------------
+    for start in tqdm(range(0, num_docs, block_docs), desc="BM25 tokenize", unit="block"):
+        term_ids, doc_ids, tfs = [], [], []
+        for doc in range(start, min(start + block_docs, num_docs)):
+            if not live[doc]:
+                continue
+            counts = Counter(tokenize(chunk_store.text(doc)))
+            doclen[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                tfs.append(min(tf, 65535))
+
+        block_file = os.path.join(blocks_dir, f"{len(block_files):06d}.npz")
+        np.savez(
+            block_file,
+            terms=np.array(term_ids, dtype="<u4"),
+            docs=np.array(doc_ids, dtype="<u4"),
+            tfs=np.array(tfs, dtype="<u2")
+        )
+        block_files.append(block_file)
+
+    # Terms are stored sorted so lookups can binary-search the mmapped file
+    sorted_terms = sorted(vocab)
+    rank = np.empty(len(vocab), dtype=np.int64)
+    rank[np.array([vocab[t] for t in sorted_terms], dtype=np.int64)] = np.arange(len(vocab))
+    del vocab
+
+    df = np.zeros(len(sorted_terms), dtype=np.int64)
+    for block_file in block_files:
+        with np.load(block_file) as block:
+            df += np.bincount(rank[block["terms"]], minlength=len(df))
+
+    posting_offsets = np.concatenate([[0], np.cumsum(df)]).astype("<u8")
+    num_postings = int(posting_offsets[-1])
+
+    # --------------------------
+    # PASS 2: SCATTER POSTINGS
+    # --------------------------
+    docs = np.memmap(os.path.join(tmp_path, DOCS_FILE), dtype="<u4", mode="w+",
+                     shape=(max(num_postings, 1),))
+    tfs = np.memmap(os.path.join(tmp_path, TFS_FILE), dtype="<u2", mode="w+",
+                    shape=(max(num_postings, 1),))
+    cursor = posting_offsets[:-1].astype(np.int64)
+
+    for block_file in tqdm(block_files, desc="BM25 postings", unit="block"):
+        with np.load(block_file) as block:
+            term_rank = rank[block["terms"]]
+            # Stable sort keeps doc ids ascending within every term
+            order = np.argsort(term_rank, kind="stable")
+            term_rank = term_rank[order]
+
+            terms_in_block, first, counts = np.unique(
+                term_rank, return_index=True, return_counts=True
+            )
+            position = cursor[term_rank] + (np.arange(len(term_rank)) - np.repeat(first, counts))
+
+            docs[position] = block["docs"][order]
+            tfs[position] = block["tfs"][order]
+            cursor[terms_in_block] += counts
+
+    docs.flush()
+    tfs.flush()
+    del docs, tfs
+    shutil.rmtree(blocks_dir)
+
+    encoded = [t.encode("utf-8") for t in sorted_terms]
+    term_offsets = np.concatenate([[0], np.cumsum([len(t) for t in encoded])]).astype("<u8")
+    with open(os.path.join(tmp_path, TERMS_FILE), "wb") as f:
+        f.write(b"".join(encoded))
+    term_offsets.tofile(os.path.join(tmp_path, TERM_OFFSETS_FILE))
+    posting_offsets.tofile(os.path.join(tmp_path, POSTING_OFFSETS_FILE))
+    doclen.tofile(os.path.join(tmp_path, DOCLEN_FILE))
+
+    atomic_write_json(os.path.join(tmp_path, HEADER_FILE), {
+        "version": FORMAT_VERSION,
+        "num_docs": num_docs,
+        "num_live": num_live,
+        "num_terms": len(sorted_terms),
+        "num_postings": num_postings,
+        "avgdl": float(doclen[live].mean()) if num_live else 0.0,
+        "k1": k1,
+        "b": b,
+    })
+
+    # Directories can't be replaced atomically; swap via a short rename pair
+    old_path = path + ".old"
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+    return num_postings
+
+
+# ======================================================
+# READER (MMAP, BM25 SCORING)
+# ======================================================
+class LexicalIndex:
+
+    def __init__(self, path: str = LEXICAL_INDEX_PATH):
+        header_path = os.path.join(path, HEADER_FILE)
+        if not os.path.exists(header_path):
+            raise FileNotFoundError(f"No lexical index at {path}")
+        with open(header_path, "r", encoding="utf-8") as f:
+            header = json.load(f)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index version {header['version']}")
+
+        self.path = path
+        self.num_docs = header["num_docs"]                      # row id space
+        self.num_live = header.get("num_live", self.num_docs)   # rows actually indexed
+        self.num_terms = header["num_terms"]
+        self.avgdl = header["avgdl"] or 1.0
+        self.k1 = header["k1"]
+        self.b = header["b"]
+
+        def array(name, dtype, count):
+            if not count:
+                return np.zeros(0, dtype=dtype)
+            return np.memmap(os.path.join(path, name), dtype=dtype, mode="r", shape=(count,))
+
+        self._term_offsets = array(TERM_OFFSETS_FILE, "<u8", self.num_terms + 1)
+        self._posting_offsets = array(POSTING_OFFSETS_FILE, "<u8", self.num_terms + 1)
+        self._docs = array(DOCS_FILE, "<u4", header["num_postings"])
+        self._tfs = array(TFS_FILE, "<u2", header["num_postings"])
+        self._doclen = array(DOCLEN_FILE, "<u4", self.num_docs)
+
+        terms_size = int(self._term_offsets[-1]) if self.num_terms else 0
+        self._terms_file = open(os.path.join(path, TERMS_FILE), "rb")
+        self._terms = mmap.mmap(
+            self._terms_file.fileno(), terms_size, access=mmap.ACCESS_READ
+        ) if terms_size else b""
+
+    def __len__(self):
+        return self.num_docs
+
+    def _term(self, i: int) -> bytes:
+        return self._terms[int(self._term_offsets[i]):int(self._term_offsets[i + 1])]
+
+    def _find(self, term: str):
+        """Rank of `term` in the sorted vocabulary, or None."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.num_terms and self._term(lo) == key else None
+
+    def search(self, query: str, k: int, mask=None):
+        """
+        Top-k (row ids, BM25 scores) for a query; empty arrays when nothing
+        matches. `mask` (bool per row) restricts the candidates.
+        """
+        doc_parts, score_parts = [], []
+
+        for term in set(tokenize(query)):
+            rank = self._find(term)
+            if rank is None:
+                continue
+
+            lo, hi = int(self._posting_offsets[rank]), int(self._posting_offsets[rank + 1])
+            df = hi - lo
+            idf = math.log(1 + (self.num_live - df + 0.5) / (df + 0.5))
+
+            docs = np.asarray(self._docs[lo:hi])
+            tf = self._tfs[lo:hi].astype("float32")
+            norm = self.k1 * (1 - self.b + self.b * self._doclen[docs] / self.avgdl)
+
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (self.k1 + 1) / (tf + norm))
+
+        if not doc_parts:
+            return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+
+        if mask is not None:
+            keep = mask[docs]
+            docs, scores = docs[keep], scores[keep]
+            if not len(docs):
+                return np.zeros(0, dtype="int64"), np.zeros(0, dtype="float32")
+
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return docs[top].astype("int64"), scores[top].astype("float32")
+
+    def close(self):
+        if isinstance(self._terms, mmap.mmap):
+            self._terms.close()
+        self._terms_file.close()
+
+
+# ======================================================
+# CLI (REBUILD FROM AN EXISTING CHUNK STORE)
+# ======================================================
+def main():
+    from scripts.chunk_store import ChunkStore
+
+    parser = argparse.ArgumentParser(description="Build the BM25 index from the chunk store")
+    parser.add_argument("--chunks", default=CHUNK_STORE_PATH)
+    parser.add_argument("--dst", default=LEXICAL_INDEX_PATH)
+    parser.add_argument("--query", help="run one query against --dst instead of building")
+    args = parser.parse_args()
+
+    if args.query:
+        index, store = LexicalIndex(args.dst), ChunkStore(args.chunks)
+        ids, scores = index.search(args.query, 5)
+        for i, score in zip(ids, scores):
+            print(f"{score:7.2f}  {store.source_file(i)} (chunk {store.chunk_id(i)})")
+        return
+
+    store = ChunkStore(args.chunks)
+    live = store.live_mask()
+    num_postings = build_lexical_index(store, args.dst, live=live)
+    print(f"✅ BM25 index over {int(live.sum())} chunks ({num_postings} postings) written to {args.dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import os
+import re
+import json
+import hashlib
+
+from config.settings import (
+    LLM_BACKEND,
+    LLM_BASE_URL,
+    LLM_TIMEOUT_SECONDS,
+    LLM_POOL_MAX_CONNECTIONS
+)
+
+
+# ======================================================
+# LLM BACKENDS
+# ======================================================
+# Every backend exposes the same two calls:
+#   complete(model, messages, temperature, max_tokens) -> (text, usage)
+#   stream(model, messages, temperature, max_tokens)   -> ("token", text)... ("usage", usage)
+# where usage is {"prompt_tokens", "completion_tokens", "total_tokens"} or None.
+# Failures are raised as LLMError; retries, breakers, hedging and fallback
+# models are handled once, in scripts.llm_client.
+
+class LLMError(Exception):
+    """
+    `retryable`: the same call may succeed later (timeouts, 429, 5xx).
+    `model_failure`: the model itself is unusable (counts toward its circuit
+    breaker), as opposed to a bad request. `retry_after`: seconds the server
+    asked us to wait, if it said.
+    """
+
+    def __init__(self, message: str, status: int = None, retryable: bool = False,
+                 model_failure: bool = True, retry_after: float = None):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.model_failure = model_failure
+        self.retry_after = retry_after
+
+
+class LLMUnavailable(LLMError):
+    """Every candidate model failed or was skipped by its circuit breaker."""
+
+
+_DURATION = re.compile(r"^(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+(?:\.\d+)?)ms)?$")
+
+
+def parse_duration(value: str):
+    """Seconds in a rate-limit header: "12", "7.66s", "2m59.56s", "120ms"; None if unreadable."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    match = _DURATION.match(value)
+    if not match or not any(match.groups()):
+        return None
+    hours, minutes, seconds, millis = (float(g) if g else 0.0 for g in match.groups())
+    return hours * 3600 + minutes * 60 + seconds + millis / 1000
+
+
+def retry_after(headers):
+    """
+    How long a rate-limited server wants us to wait: retry-after when sent,
+    otherwise the reset time of whichever x-ratelimit budget is exhausted.
+    """
+    if headers is None:
+        return None
+    wait = parse_duration(headers.get("retry-after"))
+    if wait is not None:
+        return wait
+
+    waits = []
+    for kind in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{kind}") == "0":
+            waits.append(parse_duration(headers.get(f"x-ratelimit-reset-{kind}")))
+    waits = [w for w in waits if w is not None]
+    return max(waits) if waits else None
+
+
+def status_error(status: int, message: str, headers=None) -> LLMError:
+    retryable = status in (408, 409, 429) or status >= 500
+    # 401 / 403 / 404 and decommissioned models: this model won't work for anyone
+    model_failure = retryable or status in (401, 403, 404) or "model_" in message
+    return LLMError(
+        f"HTTP {status}: {message}", status, retryable, model_failure,
+        retry_after(headers) if status == 429 or status == 503 else None
+    )
+
+
+def usage_dict(usage):
+    """Normalize an SDK usage object or an API usage dict."""
+    if usage is None:
+        return None
+    get = usage.get if isinstance(usage, dict) else lambda name: getattr(usage, name, None)
+    prompt = get("prompt_tokens") or 0
+    completion = get("completion_tokens") or 0
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": get("total_tokens") or prompt + completion,
+    }
+
+
+def pool_limits(max_connections: int):
+    import httpx
+    return httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=60
+    )
+
+
+# ======================================================
+# GROQ (OFFICIAL SDK ON A SHARED KEEP-ALIVE POOL)
+# ======================================================
+class GroqBackend:
+    name = "groq"
+
+    def __init__(self, timeout: float = LLM_TIMEOUT_SECONDS,
+                 max_connections: int = LLM_POOL_MAX_CONNECTIONS):
+        import httpx
+        import groq
+
+        self._groq = groq
+        # GROQ_API_KEY / GROQ_BASE_URL come from the environment. The SDK's
+        # own retries are off: llm_client budgets them across all calls.
+        self.client = groq.Groq(
+            timeout=timeout,
+            max_retries=0,
+            http_client=httpx.Client(timeout=timeout, limits=pool_limits(max_connections))
+        )
+        self.base_url = str(self.client.base_url)
+
+    def _error(self, exc) -> LLMError:
+        groq = self._groq
+        if isinstance(exc, groq.APIStatusError):
+            return status_error(exc.status_code, str(exc), exc.response.headers)
+        if isinstance(exc, (groq.APITimeoutError, groq.APIConnectionError)):
+            return LLMError(repr(exc), retryable=True)
+        return LLMError(repr(exc))
+
+    def complete(self, model, messages, temperature, max_tokens):
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens
+            )
+        except Exception as exc:
+            raise self._error(exc) from exc
+        return response.choices[0].message.content, usage_dict(getattr(response, "usage", None))
+
+    def stream(self, model, messages, temperature, max_tokens):
+        try:
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                stream=True
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield "token", chunk.choices[0].delta.content
+
+                # Groq reports usage on the final chunk under x_groq
+                usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                if usage is not None:
+                    yield "usage", usage_dict(usage)
+        except LLMError:
+            raise
+        except Exception as exc:
+            raise self._error(exc) from exc
+
+
+# ======================================================
+# OPENAI-COMPATIBLE SERVERS (vLLM, llama.cpp, OLLAMA, ...)
+# ======================================================
+class OpenAICompatibleBackend:
+    name = "openai"
+
+    def __init__(self, base_url: str = LLM_BASE_URL, api_key: str = None,
+                 timeout: float = LLM_TIMEOUT_SECONDS, max_connections: int = LLM_POOL_MAX_CONNECTIONS):
+        import httpx
+
+        self._httpx = httpx
+        self.base_url = base_url
+        api_key = api_key or os.environ.get("LLM_API_KEY")
+        self.client = httpx.Client(
+            base_url=base_url.rstrip("/") + "/",
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=timeout,
+            limits=pool_limits(max_connections)
+        )
+
+    def _payload(self, model, messages, temperature, max_tokens, stream=False):
+        payload = {"model": model, "messages": messages,
+                   "temperature": temperature, "max_tokens": max_tokens}
+        if stream:
+            payload.update(stream=True, stream_options={"include_usage": True})
+        return payload
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            response.read()
+            raise status_error(response.status_code, response.text[:500], response.headers)
+
+    def complete(self, model, messages, temperature, max_tokens):
+        try:
+            response = self.client.post(
+                "chat/completions", json=self._payload(model, messages, temperature, max_tokens)
+            )
+        except self._httpx.HTTPError as exc:
+            raise LLMError(repr(exc), retryable=True) from exc
+        self._check(response)
+
+        data = response.json()
+        return data["choices"][0]["message"]["content"], usage_dict(data.get("usage"))
+
+    def stream(self, model, messages, temperature, max_tokens):
+        payload = self._payload(model, messages, temperature, max_tokens, stream=True)
+        try:
+            with self.client.stream("POST", "chat/completions", json=payload) as response:
+                self._check(response)
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if choices and (choices[0].get("delta") or {}).get("content"):
+                        yield "token", choices[0]["delta"]["content"]
+                    usage = chunk.get("usage") or (chunk.get("x_groq") or {}).get("usage")
+                    if usage:
+                        yield "usage", usage_dict(usage)
+        except self._httpx.HTTPError as exc:
+            raise LLMError(repr(exc), retryable=True) from exc
+
+
+# ======================================================
+# DETERMINISTIC OFFLINE MOCK (TESTS, BENCHMARKS, NO NETWORK)
+# ======================================================
+class MockBackend:
+    """
+    Replies are a pure function of (model, messages, max_tokens). Models in
+    `failing_models` answer 404, to exercise fallbacks and breakers.
+    """
+    name = "mock"
+    base_url = None
+
+    def __init__(self, failing_models=()):
+        self.failing_models = set(failing_models)
+
+    def reply(self, model, messages, max_tokens):
+        if model in self.failing_models:
+            raise status_error(404, f"model_not_found: {model}")
+
+        request = json.dumps([model, messages], ensure_ascii=False, sort_keys=True)
+        digest = hashlib.sha256(request.encode("utf-8")).hexdigest()[:12]
+        prompt = messages[-1]["content"] if messages else ""
+        words = [f"[mock {digest}]"] + prompt.split()[:max(0, max_tokens - 1)]
+
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                 "total_tokens": prompt_tokens + len(words)}
+        return words, usage
+
+    def complete(self, model, messages, temperature, max_tokens):
+        words, usage = self.reply(model, messages, max_tokens)
+        return " ".join(words), usage
+
+    def stream(self, model, messages, temperature, max_tokens):
+        words, usage = self.reply(model, messages, max_tokens)
+        for i, word in enumerate(words):
+            yield "token", word if not i else " " + word
+        yield "usage", usage
+
+
+BACKENDS = {
+    "groq": GroqBackend,
+    "openai": OpenAICompatibleBackend,
+    "mock": MockBackend,
+}
+
+
+def make_backend(name: str = LLM_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"LLM_BACKEND must be one of {sorted(BACKENDS)}, got {name!r}")
+    return BACKENDS[name]()
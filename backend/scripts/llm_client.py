@@ -0,0 +1,301 @@
+import json
+import time
+import random
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, TimeoutError as FutureTimeout, wait
+
+from config.settings import (
+    LLM_MODEL,
+    LLM_FALLBACK_MODELS,
+    LLM_CACHE_PATH,
+    LLM_CACHE_MAX_BYTES,
+    LLM_CACHE_TTL_SECONDS,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BACKOFF_SECONDS,
+    LLM_MAX_BACKOFF_SECONDS,
+    LLM_HEDGE_AFTER_MS
+)
+from scripts.cache import SqliteCache
+from scripts.concurrency import CircuitBreaker, RetryBudget
+from scripts.executors import hedge_pool
+from scripts.llm_backends import LLMError, LLMUnavailable
+from scripts.registry import get_llm_backend, get_llm_cache
+from scripts.telemetry import (
+    LLM_REQUESTS,
+    LLM_RETRIES,
+    LLM_HEDGES,
+    LLM_BREAKER_OPEN,
+    LLM_FIRST_TOKEN_SECONDS,
+    span,
+    record_span,
+    record_llm_usage
+)
+
+
+# ======================================================
+# CONTENT-ADDRESSED RESPONSE CACHE
+# ======================================================
+def cache_key(model: str, messages, temperature: float, max_tokens: int, backend=None) -> str:
+    # messages carry both the system prompt and the user content; the backend
+    # and its server keep mock / fake-server replies from answering real calls
+    backend = backend or get_llm_backend()
+    payload = json.dumps(
+        [backend.name, backend.base_url, model, messages, temperature, max_tokens],
+        ensure_ascii=False, sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.store = SqliteCache(path, ttl_seconds, max_bytes)
+        self.tokens_saved = 0
+
+    def get(self, key: str):
+        value = self.store.get(key)
+        if value is None:
+            return None
+        entry = json.loads(value)
+        self.tokens_saved += entry.get("total_tokens") or 0
+        return entry["content"]
+
+    def set(self, key: str, content: str, total_tokens: int):
+        entry = {"content": content, "total_tokens": total_tokens}
+        self.store.set(key, json.dumps(entry).encode("utf-8"))
+
+    def stats(self) -> dict:
+        return {**self.store.stats(), "tokens_saved": self.tokens_saved}
+
+
+# ======================================================
+# RESILIENCE (RETRY BUDGET, PER-MODEL BREAKERS, HEDGING)
+# ======================================================
+retry_budget = RetryBudget()
+
+_breakers = {}
+_breakers_guard = threading.Lock()
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    with _breakers_guard:
+        return _breakers.setdefault(model, CircuitBreaker())
+
+
+def candidate_models(model: str, fallbacks=None):
+    fallbacks = LLM_FALLBACK_MODELS if fallbacks is None else fallbacks
+    return [model] + [m for m in fallbacks if m != model]
+
+
+def _record_outcome(model: str, breaker: CircuitBreaker, error: LLMError = None):
+    if error is None or not error.model_failure:
+        breaker.record_success()    # a bad request still proves the model is up
+    else:
+        breaker.record_failure()
+    LLM_BREAKER_OPEN.set(1 if breaker.state == "open" else 0, model=model)
+
+
+def _retry_delay(error: LLMError, attempt: int, breaker: CircuitBreaker):
+    """Seconds to wait before retrying, or None to give up on this model."""
+    if not error.retryable or attempt >= LLM_MAX_RETRIES:
+        return None
+    delay = error.retry_after
+    if delay is None:
+        delay = LLM_RETRY_BACKOFF_SECONDS * (2 ** attempt) * random.uniform(0.5, 1.0)
+    if delay > LLM_MAX_BACKOFF_SECONDS:
+        return None     # rate limited for longer than we'd wait: try the next model
+    if not breaker.allow() or not retry_budget.try_spend():
+        return None
+    return delay
+
+
+def _hedged(call):
+    """
+    Run `call()`; if it hasn't finished after LLM_HEDGE_AFTER_MS, start a
+    duplicate and return whichever succeeds first. The slower one runs to
+    completion in the background (a blocking HTTP call can't be cancelled).
+    """
+    if not LLM_HEDGE_AFTER_MS:
+        return call()
+
+    pool = hedge_pool()
+    first = pool.submit(contextvars.copy_context().run, call)
+    try:
+        return first.result(timeout=LLM_HEDGE_AFTER_MS / 1000)
+    except FutureTimeout:
+        pass
+
+    if not retry_budget.try_spend():    # hedges spend the retry budget too
+        return first.result()
+    second = pool.submit(contextvars.copy_context().run, call)
+    LLM_HEDGES.inc(outcome="sent")
+
+    pending, error = {first, second}, None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                LLM_HEDGES.inc(outcome="hedge_won" if future is second else "primary_won")
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+# ======================================================
+# CHAT COMPLETION (ALL LLM CALLS GO THROUGH HERE)
+# ======================================================
+def _complete_with_retries(backend, model, messages, temperature, max_tokens, breaker):
+    attempt = 0
+    while True:
+        def call():
+            with span("llm", model=model, attempt=attempt) as attrs:
+                content, usage = backend.complete(model, messages, temperature, max_tokens)
+                record_llm_usage(model, usage, attrs)
+                return content, usage
+
+        try:
+            result = _hedged(call)
+        except LLMError as exc:
+            _record_outcome(model, breaker, exc)
+            delay = _retry_delay(exc, attempt, breaker)
+            if delay is None:
+                raise
+            LLM_RETRIES.inc(model=model, reason=str(exc.status or "network"))
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        _record_outcome(model, breaker)
+        return result
+
+
+def chat_completion(messages, model: str = LLM_MODEL, temperature: float = 0.1,
+                    max_tokens: int = 512, fallbacks=None) -> str:
+    """
+    Complete with `model`, then each fallback model in turn. Models whose
+    breaker is open are skipped without a call; raises LLMUnavailable when
+    no model answers.
+    """
+    cache = get_llm_cache()
+    backend = get_llm_backend()
+    retry_budget.record_call()
+    error = None
+
+    for candidate in candidate_models(model, fallbacks):
+        key = cache_key(candidate, messages, temperature, max_tokens)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=candidate, outcome="cache_hit")
+                return cached
+
+        breaker = get_breaker(candidate)
+        if not breaker.allow():
+            LLM_REQUESTS.inc(model=candidate, outcome="breaker_open")
+            continue
+
+        try:
+            content, usage = _complete_with_retries(
+                backend, candidate, messages, temperature, max_tokens, breaker
+            )
+        except LLMError as exc:
+            LLM_REQUESTS.inc(model=candidate, outcome="error")
+            print(f"⚠️ Model failed: {candidate} ({exc}) → trying next")
+            error = exc
+            continue
+
+        LLM_REQUESTS.inc(model=candidate, outcome="ok")
+        if cache is not None and content:
+            cache.set(key, content, (usage or {}).get("total_tokens") or 0)
+        return content
+
+    raise LLMUnavailable(f"No LLM model available (last error: {error})") from error
+
+
+# ======================================================
+# STREAMING CHAT COMPLETION (TOKENS AS THEY ARRIVE)
+# ======================================================
+def stream_chat_completion(messages, model: str = LLM_MODEL, temperature: float = 0.1,
+                           max_tokens: int = 512, fallbacks=None):
+    """
+    Yield the completion text incrementally. A cache hit is yielded as a
+    single piece; a fresh completion is cached once the stream finishes.
+    Retries and fallback models are only possible before the first piece
+    has been yielded; streams are never hedged.
+    """
+    cache = get_llm_cache()
+    backend = get_llm_backend()
+    retry_budget.record_call()
+    error = None
+
+    for candidate in candidate_models(model, fallbacks):
+        key = cache_key(candidate, messages, temperature, max_tokens)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                LLM_REQUESTS.inc(model=candidate, outcome="cache_hit")
+                yield cached
+                return
+
+        breaker = get_breaker(candidate)
+        if not breaker.allow():
+            LLM_REQUESTS.inc(model=candidate, outcome="breaker_open")
+            continue
+
+        attempt = 0
+        while True:
+            # Recorded by hand: the span covers time spent in the consumer
+            # between pieces, and a `with span()` can't be held open across yields
+            start = time.perf_counter()
+            attrs = {"model": candidate, "attempt": attempt, "stream": True}
+            pieces, usage = [], None
+            try:
+                for kind, data in backend.stream(candidate, messages, temperature, max_tokens):
+                    if kind == "usage":
+                        usage = data
+                        continue
+                    if not pieces:
+                        first_token = time.perf_counter() - start
+                        LLM_FIRST_TOKEN_SECONDS.observe(first_token, model=candidate)
+                        attrs["first_token_ms"] = round(first_token * 1000, 3)
+                    pieces.append(data)
+                    yield data
+            except LLMError as exc:
+                record_span("llm", start, time.perf_counter(), attrs, type(exc).__name__)
+                _record_outcome(candidate, breaker, exc)
+                delay = None if pieces else _retry_delay(exc, attempt, breaker)
+                if delay is None:
+                    LLM_REQUESTS.inc(model=candidate, outcome="error")
+                    if pieces:
+                        raise   # the caller already has part of this model's answer
+                    print(f"⚠️ Model failed: {candidate} ({exc}) → trying next")
+                    error = exc
+                    break
+                LLM_RETRIES.inc(model=candidate, reason=str(exc.status or "network"))
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            record_llm_usage(candidate, usage, attrs)
+            record_span("llm", start, time.perf_counter(), attrs)
+            _record_outcome(candidate, breaker)
+            LLM_REQUESTS.inc(model=candidate, outcome="ok")
+            if cache is not None and pieces:
+                cache.set(key, "".join(pieces), (usage or {}).get("total_tokens") or 0)
+            return
+
+    raise LLMUnavailable(f"No LLM model available (last error: {error})") from error
+
+
+def llm_status() -> dict:
+    with _breakers_guard:
+        breakers = {model: breaker.stats() for model, breaker in _breakers.items()}
+    return {
+        "backend": get_llm_backend().name,
+        "models": candidate_models(LLM_MODEL),
+        "hedge_after_ms": LLM_HEDGE_AFTER_MS,
+        "breakers": breakers,
+    }
@@ -0,0 +1,95 @@
+import time
+import json
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+from scripts.benchmark_chunking import synthetic_judgment
+
+
+# ======================================================
+# /health LATENCY UNDER SUMMARY LOAD
+# ======================================================
+# Run against a live server, e.g.
+#   uvicorn app.main:app --port 8000
+#   python -m scripts.load_test_health --url http://127.0.0.1:8000
+# If blocking work leaked onto the event loop, /health latency under load
+# would climb to the length of a summary request.
+
+def post_form(url: str, fields: dict, timeout: float):
+    body = urllib.parse.urlencode(fields).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def sample_health(url: str, seconds: float, interval: float):
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        with urllib.request.urlopen(f"{url}/health", timeout=30) as response:
+            response.read()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(interval)
+    return np.array(latencies)
+
+
+def summary_traffic(url: str, text: str, stop: threading.Event, counts: dict, lock):
+    # Distinct text per request so neither the session store nor the
+    # LLM cache turns the load into cache hits
+    while not stop.is_set():
+        nonce = f"\n\nRequest {time.perf_counter_ns()}"
+        try:
+            post_form(f"{url}/document/process", {"mode": "summary", "text": text + nonce}, 600)
+            key = "ok"
+        except Exception:
+            key = "failed"
+        with lock:
+            counts[key] += 1
+
+
+def report(name: str, latencies):
+    print(f"{name:>10} {len(latencies):>8} {np.percentile(latencies, 50):8.1f} "
+          f"{np.percentile(latencies, 99):8.1f} {latencies.max():8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/health latency with and without summary load")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent summary requests")
+    parser.add_argument("--doc-chars", type=int, default=60_000)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/")
+    text = synthetic_judgment(args.doc_chars)
+
+    print(f"{'phase':>10} {'samples':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    report("idle", sample_health(url, args.seconds, args.interval))
+
+    stop = threading.Event()
+    counts = {"ok": 0, "failed": 0}
+    lock = threading.Lock()
+    clients = [
+        threading.Thread(target=summary_traffic, args=(url, text, stop, counts, lock), daemon=True)
+        for _ in range(args.clients)
+    ]
+    for client in clients:
+        client.start()
+
+    try:
+        report("loaded", sample_health(url, args.seconds, args.interval))
+    finally:
+        stop.set()
+
+    print(f"\nsummary requests finished during the loaded phase: "
+          f"{counts['ok']} ok, {counts['failed']} failed ({args.clients} clients)")
+
+
+if __name__ == "__main__":
+    main()
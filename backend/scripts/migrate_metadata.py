@@ -0,0 +1,69 @@
+import os
+import pickle
+import argparse
+
+from tqdm import tqdm
+
+from config.settings import CHUNK_STORE_PATH, DOCUMENT_METADATA_PATH
+from scripts.chunk_store import ChunkStore, ChunkStoreWriter, read_header, upgrade_chunk_store
+from scripts.document_metadata import load_document_metadata
+
+
+# ======================================================
+# metadata.pkl -> mmap chunk store
+# ======================================================
+MIGRATE_BATCH = 10000
+
+
+def migrate(src: str, dst: str, document_metadata: dict):
+    if read_header(dst) is not None:
+        raise SystemExit(f"❌ {dst} already contains a chunk store, remove it first")
+
+    print(f"📦 Loading {src}...")
+    with open(src, "rb") as f:
+        metadata = pickle.load(f)
+
+    writer = ChunkStoreWriter(dst)
+    for start in tqdm(range(0, len(metadata), MIGRATE_BATCH), desc="Migrating"):
+        writer.extend([
+            {**record, **document_metadata.get(record["source_file"], {})}
+            for record in metadata[start:start + MIGRATE_BATCH]
+        ])
+    writer.close()
+
+    # Spot-check the first and last rows round-trip
+    store = ChunkStore(dst)
+    assert len(store) == len(metadata)
+    for i in {0, len(metadata) - 1} if metadata else ():
+        record = store[i]
+        assert (record["source_file"], record["chunk_id"], record["text"]) == (
+            metadata[i]["source_file"], metadata[i]["chunk_id"], metadata[i]["text"]
+        )
+    store.close()
+
+    print(f"✅ Migrated {len(metadata)} chunks to {dst}")
+
+
+def upgrade(dst: str, document_metadata: dict):
+    if not document_metadata:
+        print(f"⚠️ No document metadata at {DOCUMENT_METADATA_PATH}; "
+              f"court / year / outcome will be unknown. Re-run extract_text.py first.")
+    count = upgrade_chunk_store(dst, document_metadata)
+    print(f"✅ Upgraded {count} chunks in {dst} to chunk store version 2")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert metadata.pkl to the mmap chunk store")
+    parser.add_argument("--src", default=os.path.join("embeddings", "metadata.pkl"))
+    parser.add_argument("--dst", default=CHUNK_STORE_PATH)
+    parser.add_argument("--metadata", default=DOCUMENT_METADATA_PATH,
+                        help="per-document court / year / outcome written by extract_text.py")
+    parser.add_argument("--upgrade", action="store_true",
+                        help="add metadata to an existing version 1 chunk store at --dst")
+    args = parser.parse_args()
+
+    document_metadata = load_document_metadata(args.metadata)
+    if args.upgrade:
+        upgrade(args.dst, document_metadata)
+    else:
+        migrate(args.src, args.dst, document_metadata)
@@ -0,0 +1,61 @@
+import queue
+import threading
+
+
+# ======================================================
+# BOUNDED BACKGROUND STAGE
+# ======================================================
+_DONE = object()
+
+
+class _StageError:
+    def __init__(self, exc):
+        self.exc = exc
+
+
+def prefetch(iterable, maxsize: int):
+    """
+    Run `iterable` in a background thread and yield its items through a
+    queue holding at most `maxsize` of them.
+
+    Stages chained with prefetch() overlap in time while memory stays
+    bounded by the queue sizes. Exceptions raised by the producer are
+    re-raised in the consumer; closing the generator early stops the
+    producer.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+        except BaseException as exc:
+            put(_StageError(exc))
+            return
+        put(_DONE)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.exc
+            yield item
+    finally:
+        stop.set()
+        worker.join(timeout=1)
@@ -0,0 +1,83 @@
+import re
+import hashlib
+
+import numpy as np
+
+from config.settings import (
+    QUERY_CACHE_MAX_ITEMS,
+    QUERY_CACHE_TTL_SECONDS,
+    QUERY_CACHE_PATH
+)
+from scripts.cache import LRUCache, SqliteCache
+
+
+# ======================================================
+# QUERY NORMALIZATION
+# ======================================================
+def normalize_query(query: str) -> str:
+    query = re.sub(r'\s+', ' ', query).strip().lower()
+    return query.rstrip("?.! ")
+
+
+def _key(kind: str, *parts: str) -> str:
+    digest = hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+    return f"{kind}:{digest}"
+
+
+# ======================================================
+# TWO-LEVEL CACHE: original -> rewritten -> embedding
+# ======================================================
+class QueryCache:
+    """
+    In-process LRU in front of an optional SQLite store. Rewrites are keyed
+    on (scope, normalized original query), where the caller's scope names
+    whatever produced the rewrite (backend, server, model, prompt);
+    embeddings on (model, normalized rewritten query). Repeat questions
+    skip both the LLM round-trip and the encoder.
+    """
+
+    def __init__(self, max_items: int = QUERY_CACHE_MAX_ITEMS,
+                 ttl_seconds: float = QUERY_CACHE_TTL_SECONDS,
+                 path: str = QUERY_CACHE_PATH):
+        self.memory = LRUCache(max_items, ttl_seconds)
+        self.disk = SqliteCache(path, ttl_seconds) if path else None
+
+    def _get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        return value
+
+    def _set(self, key, value: bytes):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    # --------------------------
+    # REWRITES
+    # --------------------------
+    def get_rewrite(self, query: str, scope=()):
+        value = self._get(_key("rewrite", *scope, normalize_query(query)))
+        return value.decode("utf-8") if value is not None else None
+
+    def set_rewrite(self, query: str, rewritten: str, scope=()):
+        self._set(_key("rewrite", *scope, normalize_query(query)), rewritten.encode("utf-8"))
+
+    # --------------------------
+    # EMBEDDINGS
+    # --------------------------
+    def get_embedding(self, model: str, text: str):
+        value = self._get(_key("embedding", model, normalize_query(text)))
+        return np.frombuffer(value, dtype="float32") if value is not None else None
+
+    def set_embedding(self, model: str, text: str, vector):
+        vector = np.ascontiguousarray(vector, dtype="float32")
+        self._set(_key("embedding", model, normalize_query(text)), vector.tobytes())
+
+    def stats(self) -> dict:
+        return {
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
@@ -1,44 +1,48 @@
-import os
-import faiss
-import pickle
 import re
-from groq import Groq
-from sentence_transformers import SentenceTransformer
-
-from config.settings import EMBED_MODEL, TOP_K
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+
+from config.settings import (
+    EMBED_MODEL,
+    TOP_K,
+    NPROBE,
+    EF_SEARCH,
+    RETRIEVAL_MODE,
+    HYBRID_CANDIDATES,
+    RRF_K,
+    LLM_MODEL
+)
+from scripts.embedders import embedder_id
+from scripts.index_factory import search_params
+from scripts.lexical_index import is_citation_query
+from scripts.shards import id_selector
+from scripts.registry import (
+    get_embedder,
+    get_index,
+    get_chunk_store,
+    get_lexical_index,
+    has_lexical_index,
+    get_shards,
+    has_shards,
+    get_query_cache,
+    get_llm_backend,
+    add_reload_hook
+)
+from scripts.llm_backends import LLMUnavailable
+from scripts.llm_client import chat_completion
+from scripts.telemetry import CHUNKS, EMBED_BATCH_SIZE, span
 
 
 # ======================================================
 # CONFIG (TOKEN SAFE FOR GROQ FREE TIER)
 # ======================================================
-INDEX_PATH = "embeddings/faiss.index"
-META_PATH = "embeddings/metadata.pkl"
-
 MAX_CHARS_PER_CHUNK = 1200      # limit per retrieved chunk
 MAX_CONTEXT_CHARS = 3000        # hard cap for total context
 TEMPERATURE = 0.1
 MAX_TOKENS = 512
-
-
-# ======================================================
-# LOAD KNOWLEDGE BASE
-# ======================================================
-index = faiss.read_index(INDEX_PATH)
-with open(META_PATH, "rb") as f:
-    metadata = pickle.load(f)
-
-embedder = SentenceTransformer(EMBED_MODEL)
-
-
-# ======================================================
-# GROQ CLIENT (ENV VAR REQUIRED)
-# ======================================================
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-MODEL_CANDIDATES = [
-    "llama-3.1-8b-instant",     # stable free-tier
-    "mixtral-8x7b-32768"        # fallback
-]
+# Models: LLM_MODEL, then LLM_FALLBACK_MODELS (config/settings.py)
 
 
 # ======================================================
@@ -57,33 +61,181 @@ def trim_chunk(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> str:
 # ======================================================
 # RETRIEVAL (WITH METADATA FOR CITATIONS)
 # ======================================================
-def retrieve(query: str, k: int = TOP_K):
-    q_emb = embedder.encode([query]).astype("float32")
-    _, idxs = index.search(q_emb, k)
-
-    results = []
-    for i in idxs[0]:
-        results.append({
-            "text": metadata[i]["text"],
-            "source": metadata[i]["source_file"],
-            "chunk_id": metadata[i]["chunk_id"]
-        })
-    return results
+def embed_queries(queries):
+    """Encode queries, reusing cached embeddings for ones seen before."""
+    queries = list(queries)
+    cache = get_query_cache()
+    key = embedder_id(EMBED_MODEL)
+    vectors = [cache.get_embedding(key, q) for q in queries]
+    missing = [i for i, v in enumerate(vectors) if v is None]
+
+    if missing:
+        with span("embed_query", model=EMBED_MODEL, batch_size=len(missing),
+                  cache_hits=len(queries) - len(missing)):
+            EMBED_BATCH_SIZE.observe(len(missing), model=EMBED_MODEL)
+            encoded = get_embedder(EMBED_MODEL).encode(
+                [queries[i] for i in missing], batch_size=len(missing)
+            ).astype("float32")
+        for i, vector in zip(missing, encoded):
+            cache.set_embedding(key, queries[i], vector)
+            vectors[i] = vector
+
+    return np.vstack(vectors).astype("float32")
+
+
+RETRIEVAL_MODES = ("dense", "lexical", "hybrid", "auto")
+
+
+def route_query(query: str, mode: str = RETRIEVAL_MODE) -> str:
+    """Resolve "auto" to the retriever a query should use."""
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"mode must be one of {RETRIEVAL_MODES}, got {mode!r}")
+    if mode != "auto":
+        return mode
+    if not has_lexical_index():
+        return "dense"
+    # Section / case numbers and party names: exact tokens beat embeddings
+    return "lexical" if is_citation_query(query) else "hybrid"
+
+
+def reciprocal_rank_fusion(rankings, k: int, rrf_k: int = RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+@lru_cache(maxsize=64)
+def _filter_mask(chunk_store, filters):
+    return chunk_store.filter_mask(filters)
+
+
+def filter_mask(filters):
+    """Rows matching a normalize_filters() key (cached per chunk store and filter)."""
+    return _filter_mask(get_chunk_store(), filters)
+
+
+add_reload_hook(_filter_mask.cache_clear)   # don't keep swapped-out stores alive
+
+
+def dense_search(q_emb, k: int, filters=None, nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+    """
+    Top-k row ids per query vector. A court filter searches only those
+    courts' shards (in parallel); year / outcome filters, or any filter
+    when no shards were built, become an ID selector.
+    """
+    with span("faiss_search", queries=len(q_emb), k=k, filtered=filters is not None):
+        return _dense_search(q_emb, k, filters, nprobe, ef_search)
+
+
+def _dense_search(q_emb, k, filters, nprobe, ef_search):
+    if filters is None:
+        index = get_index()
+        _, idxs = index.search(q_emb, k, params=search_params(index, nprobe, ef_search))
+        return idxs
+
+    courts, years, outcomes = filters
+    if courts is not None and has_shards():
+        inner = (None, years, outcomes)
+        mask = filter_mask(inner) if years is not None or outcomes is not None else None
+        _, idxs = get_shards().search(q_emb, k, courts, mask, nprobe, ef_search)
+        return idxs
+
+    index = get_index()
+    selector, bitmap = id_selector(filter_mask(filters))   # bitmap backs the selector
+    _, idxs = index.search(q_emb, k, params=search_params(index, nprobe, ef_search, selector))
+    return idxs
+
+
+def lexical_search(query: str, k: int, filters=None, route: str = "lexical"):
+    with span("bm25_search", route=route):
+        rows, _ = get_lexical_index().search(query, k, mask=filter_mask(filters))
+    return [int(i) for i in rows]
+
+
+def retrieve_batch(queries, k: int = TOP_K, nprobe: int = NPROBE, ef_search: int = EF_SEARCH,
+                   mode: str = RETRIEVAL_MODE, filters=None):
+    """
+    Retrieve for a whole list of queries: one encode call and one index
+    search cover every query that needs dense results, while lexical-only
+    queries never touch the encoder. A lexical-only query with no BM25
+    hits falls back to hybrid. `filters` is a normalize_filters() key
+    applied to every query.
+    """
+    queries = list(queries)
+    routes = [route_query(q, mode) for q in queries]
+
+    lexical = {}
+    for position, (query, route) in enumerate(zip(queries, routes)):
+        if route == "lexical":
+            lexical[position] = lexical_search(query, k, filters, route)
+            if not lexical[position]:
+                routes[position] = "hybrid"
+    depth = max(k, HYBRID_CANDIDATES) if "hybrid" in routes else k
+
+    dense = {}
+    dense_positions = [i for i, route in enumerate(routes) if route != "lexical"]
+    if dense_positions:
+        q_emb = embed_queries([queries[i] for i in dense_positions])
+        idxs = dense_search(q_emb, depth, filters, nprobe, ef_search)
+        for position, row in zip(dense_positions, idxs):
+            dense[position] = [int(i) for i in row if i >= 0]   # -1: fewer than k vectors
+
+    rows = []
+    for position, (query, route) in enumerate(zip(queries, routes)):
+        if route == "dense":
+            rows.append(dense[position][:k])
+        elif route == "lexical":
+            rows.append(lexical[position])
+        else:
+            if position not in lexical:
+                lexical[position] = lexical_search(query, depth, filters, route)
+            rows.append(reciprocal_rank_fusion([dense[position], lexical[position]], k))
+
+    metadata = get_chunk_store()
+    batch_results = []
+    with span("fetch_chunks", chunks=sum(len(row) for row in rows)):
+        for row in rows:
+            CHUNKS.observe(len(row), source="retrieval")
+            results = []
+            for i in row:
+                record = metadata[i]
+                locations = metadata.locations(i)    # every live copy of a deduplicated chunk
+                source, chunk_id = locations[0] if locations else (record["source_file"], record["chunk_id"])
+                results.append({
+                    "text": record["text"],
+                    "source": source,
+                    "chunk_id": chunk_id,
+                    "court": record.get("court"),
+                    "year": record.get("year"),
+                    "outcome": record.get("outcome"),
+                    "locations": locations
+                })
+            batch_results.append(results)
+    return batch_results
+
+
+def retrieve(query: str, k: int = TOP_K, nprobe: int = NPROBE, ef_search: int = EF_SEARCH,
+             mode: str = RETRIEVAL_MODE, filters=None):
+    return retrieve_batch([query], k, nprobe, ef_search, mode, filters)[0]
 
 
 def build_context(results):
     context_blocks = []
     citations = []
 
-    for r in results:
-        cleaned = trim_chunk(clean_for_llm(r["text"]))
-        context_blocks.append(cleaned)
-        citations.append(f"{r['source']} (chunk {r['chunk_id']})")
+    with span("build_context", chunks=len(results)) as attrs:
+        for r in results:
+            cleaned = trim_chunk(clean_for_llm(r["text"]))
+            context_blocks.append(cleaned)
+            citations.append(f"{r['source']} (chunk {r['chunk_id']})")
 
-    context = "\n\n".join(context_blocks)
+        context = "\n\n".join(context_blocks)
 
-    if len(context) > MAX_CONTEXT_CHARS:
-        context = context[:MAX_CONTEXT_CHARS]
+        if len(context) > MAX_CONTEXT_CHARS:
+            context = context[:MAX_CONTEXT_CHARS]
+        attrs["chars"] = len(context)
 
     return context, citations
 
@@ -98,21 +250,47 @@ QUERY_REWRITE_PROMPT = (
     "Question: {query}\n\n"
     "Rewritten Question:"
 )
+REWRITE_TEMPERATURE = 0.0
+REWRITE_MAX_TOKENS = 64
+
+# Editing the prompt or its sampling settings changes the version, so stale rewrites are never served
+REWRITE_PROMPT_VERSION = hashlib.sha256(
+    f"{QUERY_REWRITE_PROMPT}\x00{REWRITE_TEMPERATURE}\x00{REWRITE_MAX_TOKENS}".encode("utf-8")
+).hexdigest()[:16]
+
+
+def rewrite_scope():
+    """What a cached rewrite depends on besides the query (as in llm_client.cache_key)."""
+    backend = get_llm_backend()
+    return (backend.name, str(backend.base_url), LLM_MODEL, REWRITE_PROMPT_VERSION)
+
 
 def rewrite_query(query: str) -> str:
     try:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {"role": "user", "content": QUERY_REWRITE_PROMPT.format(query=query)}
-            ],
-            temperature=0.0,
-            max_tokens=64
-        )
-        return response.choices[0].message.content.strip()
+        scope = rewrite_scope()
+    except Exception:
+        return query     # no usable LLM backend: search with the original wording
+
+    cache = get_query_cache()
+    cached = cache.get_rewrite(query, scope)
+    if cached is not None:
+        return cached
+
+    try:
+        with span("query_rewrite"):
+            rewritten = chat_completion(
+                messages=[
+                    {"role": "user", "content": QUERY_REWRITE_PROMPT.format(query=query)}
+                ],
+                temperature=REWRITE_TEMPERATURE,
+                max_tokens=REWRITE_MAX_TOKENS
+            ).strip()
     except:
         return query
 
+    cache.set_rewrite(query, rewritten, scope)
+    return rewritten
+
 
 # ======================================================
 # PROMPTS
@@ -151,20 +329,17 @@ def call_llm(context: str, query: str = None, mode: str = "qa"):
             {"role": "user", "content": f"Context:\n{context}\n\nSummary:"}
         ]
 
-    for model in MODEL_CANDIDATES:
+    # Fallback models, retries and circuit breakers live in llm_client;
+    # per-model outcomes and token usage are on /metrics (nayaya_llm_*)
+    with span("generate", mode=mode):
         try:
-            response = client.chat.completions.create(
-                model=model,
+            return chat_completion(
                 messages=messages,
                 temperature=TEMPERATURE,
                 max_tokens=MAX_TOKENS
             )
-            print(f"✅ Using model: {model}")
-            return response.choices[0].message.content
-        except Exception:
-            print(f"⚠️ Model failed: {model} → trying next")
-
-    return "Model unavailable at the moment."
+        except LLMUnavailable:
+            return "Model unavailable at the moment."
 
 
 # ======================================================
@@ -0,0 +1,326 @@
+import os
+import json
+import time
+import threading
+
+from config.settings import (
+    EMBED_MODEL,
+    UPLOAD_EMBED_MODEL,
+    INDEX_PATH,
+    CHUNK_STORE_PATH,
+    LEXICAL_INDEX_PATH,
+    SHARDS_PATH,
+    KB_VERSION_PATH,
+    KB_RELOAD_POLL_SECONDS,
+    LLM_BACKEND,
+    LLM_CACHE_PATH,
+    DOC_STORE_MAX_BYTES,
+    DOC_STORE_SPILL_DIR,
+    DOC_STORE_SPILL_MAX_BYTES,
+    DOC_STORE_SPILL_TTL_SECONDS
+)
+
+
+# ======================================================
+# PROCESS-WIDE LAZY REGISTRY
+# ======================================================
+# Models, indexes and clients are loaded on first use, exactly once per
+# process, and shared by every module (upload_rag, rag_groq, app.main).
+# Nothing heavy is imported until a route actually needs it.
+
+_resources = {}
+_load_seconds = {}
+_errors = {}
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _key_lock(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _get(key, loader):
+    value = _resources.get(key)
+    if value is not None:
+        return value
+
+    # Per-key lock: loading one model never blocks users of another
+    with _key_lock(key):
+        value = _resources.get(key)
+        if value is not None:
+            return value
+
+        start = time.perf_counter()
+        try:
+            value = loader()
+        except Exception as exc:
+            _errors[key] = repr(exc)
+            raise
+
+        _load_seconds[key] = round(time.perf_counter() - start, 3)
+        _errors.pop(key, None)
+        _resources[key] = value
+        return value
+
+
+# ======================================================
+# LOADERS
+# ======================================================
+def get_embedder(name: str = EMBED_MODEL):
+    def load():
+        # SentenceTransformer or ONNX Runtime, per EMBED_BACKEND
+        from scripts.embedders import load_embedder
+        return load_embedder(name)
+
+    return _get(("embedder", name), load)
+
+
+def get_tokenizer(name: str = EMBED_MODEL):
+    return get_embedder(name).tokenizer
+
+
+def _load_index(path: str = INDEX_PATH):
+    import faiss
+    try:
+        # Share pages with other workers instead of copying the index
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Not every index type supports mmap loading
+        return faiss.read_index(path)
+
+
+def _load_chunk_store(path: str = CHUNK_STORE_PATH):
+    from scripts.chunk_store import ChunkStore
+    return ChunkStore(path)
+
+
+def _load_lexical_index(path: str = LEXICAL_INDEX_PATH):
+    from scripts.lexical_index import LexicalIndex
+    return LexicalIndex(path)
+
+
+def _load_shards(path: str = SHARDS_PATH):
+    from scripts.shards import ShardedIndex
+    return ShardedIndex(path)
+
+
+def get_index(path: str = INDEX_PATH):
+    return _get(("index", path), lambda: _load_index(path))
+
+
+def get_chunk_store(path: str = CHUNK_STORE_PATH):
+    return _get(("chunk_store", path), lambda: _load_chunk_store(path))
+
+
+def get_lexical_index(path: str = LEXICAL_INDEX_PATH):
+    return _get(("lexical_index", path), lambda: _load_lexical_index(path))
+
+
+def has_lexical_index(path: str = LEXICAL_INDEX_PATH) -> bool:
+    from scripts.lexical_index import HEADER_FILE
+    return ("lexical_index", path) in _resources or os.path.exists(os.path.join(path, HEADER_FILE))
+
+
+def get_shards(path: str = SHARDS_PATH):
+    return _get(("shards", path), lambda: _load_shards(path))
+
+
+def has_shards(path: str = SHARDS_PATH) -> bool:
+    from scripts.shards import MANIFEST_FILE
+    return ("shards", path) in _resources or os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def get_llm_backend(name: str = LLM_BACKEND):
+    """Shared LLM backend (one keep-alive connection pool per process)."""
+    def load():
+        from scripts.llm_backends import make_backend
+        return make_backend(name)
+
+    return _get(("llm_backend", name), load)
+
+
+def get_query_cache():
+    def load():
+        from scripts.query_cache import QueryCache
+        return QueryCache()
+
+    return _get(("query_cache",), load)
+
+
+def get_llm_cache():
+    """Shared LLM response cache, or None when LLM_CACHE_PATH is unset."""
+    if not LLM_CACHE_PATH:
+        return None
+
+    def load():
+        from scripts.llm_client import LLMCache
+        return LLMCache()
+
+    return _get(("llm_cache",), load)
+
+
+def get_document_store():
+    """Uploaded-document sessions; the spill directory is created on first use."""
+    def load():
+        from scripts.doc_store import DocumentStore
+        return DocumentStore(DOC_STORE_MAX_BYTES, DOC_STORE_SPILL_DIR,
+                             DOC_STORE_SPILL_MAX_BYTES, DOC_STORE_SPILL_TTL_SECONDS)
+
+    return _get(("document_store",), load)
+
+
+def get_job_queue():
+    def load():
+        from scripts.jobs import JobQueue
+        return JobQueue()
+
+    return _get(("job_queue",), load)
+
+
+# ======================================================
+# KB HOT-SWAP
+# ======================================================
+# build_kb writes KB_VERSION_PATH after every other artifact. Reloading
+# loads the new chunk store / indexes next to the served ones and then
+# swaps them in; requests already running keep the objects they hold.
+# The chunk store goes first: rows are append-only, so an index of either
+# version only ever returns rows the current store has.
+
+def _kb_resources():
+    """(registry key, loader, available on disk) in swap order."""
+    from scripts.lexical_index import HEADER_FILE
+    from scripts.shards import MANIFEST_FILE
+    return [
+        (("chunk_store", CHUNK_STORE_PATH), _load_chunk_store, True),
+        (("lexical_index", LEXICAL_INDEX_PATH), _load_lexical_index,
+         os.path.exists(os.path.join(LEXICAL_INDEX_PATH, HEADER_FILE))),
+        (("shards", SHARDS_PATH), _load_shards,
+         os.path.exists(os.path.join(SHARDS_PATH, MANIFEST_FILE))),
+        (("index", INDEX_PATH), _load_index, True),
+    ]
+
+
+_kb = {"version": None, "reloaded_at": None}
+_reload_lock = threading.Lock()
+_reload_hooks = []
+_watcher_stop = threading.Event()
+
+
+def read_kb_version(path: str = KB_VERSION_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def add_reload_hook(hook):
+    """Call `hook()` after every KB swap (e.g. to drop caches derived from the old KB)."""
+    _reload_hooks.append(hook)
+
+
+def reload_kb() -> dict:
+    """
+    Swap the served KB for the one on disk. Nothing is swapped if any
+    artifact fails to load. Resources never loaded are left to load
+    lazily (they will read the new files anyway).
+    """
+    with _reload_lock:
+        version = read_kb_version()
+        resources = _kb_resources()
+
+        if any(key in _resources for key, _, _ in resources):
+            loaded = {}
+            start = time.perf_counter()
+            try:
+                for key, loader, available in resources:
+                    if available:
+                        loaded[key] = loader(key[1])
+            except Exception as exc:
+                _errors[("kb_reload",)] = repr(exc)
+                raise
+
+            for key, _, _ in resources:
+                if key in loaded:
+                    _resources[key] = loaded[key]
+                else:
+                    _resources.pop(key, None)
+            _load_seconds[("kb_reload",)] = round(time.perf_counter() - start, 3)
+            _errors.pop(("kb_reload",), None)
+
+            for hook in _reload_hooks:
+                hook()
+
+        _kb.update(version=version, reloaded_at=time.time())
+        return dict(_kb)
+
+
+def _watch_kb(poll_seconds: float):
+    while not _watcher_stop.wait(poll_seconds):
+        try:
+            version = read_kb_version()
+            if version is not None and version != _kb["version"]:
+                print(f"🔄 KB version {version.get('version')} found, reloading...")
+                reload_kb()
+        except Exception as exc:
+            print(f"⚠️ KB reload failed, still serving the previous version: {exc!r}")
+
+
+def start_kb_watcher(poll_seconds: float = KB_RELOAD_POLL_SECONDS):
+    _kb["version"] = read_kb_version()   # what lazy loads will pick up
+    if poll_seconds:
+        _watcher_stop.clear()
+        threading.Thread(target=_watch_kb, args=(poll_seconds,), daemon=True).start()
+
+
+def stop_kb_watcher():
+    _watcher_stop.set()
+
+
+# ======================================================
+# WARM-UP + READINESS
+# ======================================================
+WARMUP_TARGETS = {
+    "upload_embedder": lambda: get_embedder(UPLOAD_EMBED_MODEL),
+    "kb_embedder": lambda: get_embedder(EMBED_MODEL),
+    "kb_index": get_index,
+    "kb_chunks": get_chunk_store,
+    "kb_lexical": get_lexical_index,
+    "llm": get_llm_backend,
+}
+
+
+_warmup = {"targets": [], "failed": [], "finished": False}
+
+
+def warm_up(targets):
+    """Eagerly load the named WARMUP_TARGETS; failures are recorded, not raised."""
+    _warmup.update(targets=list(targets), failed=[], finished=False)
+
+    for target in targets:
+        try:
+            WARMUP_TARGETS[target]()
+        except Exception as exc:
+            _warmup["failed"].append(target)
+            print(f"⚠️ Warm-up failed for {target}: {exc!r}")
+
+    _warmup["finished"] = True
+
+
+def is_ready() -> bool:
+    if not _warmup["targets"]:
+        return True
+    return _warmup["finished"] and not _warmup["failed"]
+
+
+def status() -> dict:
+    def name(key):
+        return "/".join(str(part) for part in key)
+
+    return {
+        "ready": is_ready(),
+        "warmup": dict(_warmup),
+        "kb": dict(_kb),
+        "loaded": {name(key): seconds for key, seconds in _load_seconds.items()},
+        "errors": {name(key): error for key, error in _errors.items()},
+    }
@@ -0,0 +1,149 @@
+import os
+import re
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+
+from config.settings import (
+    INDEX_TYPE,
+    SHARDS_PATH,
+    SHARD_FIELD,
+    SHARD_MIN_TRAINED_SIZE,
+    SHARD_SEARCH_WORKERS,
+    NPROBE,
+    EF_SEARCH
+)
+from scripts.atomic_io import atomic_write_json, atomic_write_index
+from scripts.index_factory import build_index, search_params
+
+
+# ======================================================
+# ON-DISK LAYOUT
+# ======================================================
+# <path>/manifest.json   {"field", "shards": {value: {"file", "rows", "index_type"}}}
+# <path>/<value>.index   vectors of every chunk whose SHARD_FIELD == value,
+#                        under their global row ids (IndexIDMap)
+#
+# The manifest is written last, so a reader never sees a shard set that
+# mixes two builds.
+
+MANIFEST_FILE = "manifest.json"
+UNKNOWN_SHARD = "unknown"
+
+
+def shard_file(value: str) -> str:
+    return re.sub(r"[^a-z0-9_]+", "_", (value or UNKNOWN_SHARD).lower()) + ".index"
+
+
+# ======================================================
+# BUILD (FROM MMAPPED SEGMENTS + CHUNK STORE METADATA)
+# ======================================================
+def build_shard_index(arrays, rows, dimension: int, index_type: str = INDEX_TYPE):
+    """Index of the given (sorted) global rows, searchable under those ids."""
+    if index_type != "flat" and len(rows) < SHARD_MIN_TRAINED_SIZE:
+        index_type = "flat"   # too few vectors to train IVF / PQ well
+
+    return build_index(arrays, dimension, index_type, rows=rows), index_type
+
+
+def build_shards(arrays, chunk_store, dimension: int, path: str = SHARDS_PATH,
+                 field: str = SHARD_FIELD, index_type: str = INDEX_TYPE):
+    """Write one index per distinct `field` value of the live rows; returns {value: rows}."""
+    if not chunk_store.has_metadata:
+        print("⚠️ Chunk store has no metadata, skipping shards")
+        return {}
+
+    os.makedirs(path, exist_ok=True)
+    codes = np.asarray(chunk_store.column(field))
+    values = chunk_store.categories[field]
+    live = chunk_store.live_mask()
+
+    manifest = {"field": field, "shards": {}}
+    for code in np.unique(codes[live]):
+        value = values[code] or UNKNOWN_SHARD
+        rows = np.flatnonzero((codes == code) & live)
+        index, used_type = build_shard_index(arrays, rows, dimension, index_type)
+
+        filename = shard_file(value)
+        atomic_write_index(index, os.path.join(path, filename))
+        manifest["shards"][value] = {"file": filename, "rows": int(len(rows)), "index_type": used_type}
+        print(f"   🗂️ shard {value}: {len(rows)} chunks ({used_type})")
+
+    atomic_write_json(os.path.join(path, MANIFEST_FILE), manifest)
+
+    # Shards of values that no longer exist
+    keep = {shard["file"] for shard in manifest["shards"].values()}
+    for name in os.listdir(path):
+        if name.endswith(".index") and name not in keep:
+            os.remove(os.path.join(path, name))
+
+    return {value: shard["rows"] for value, shard in manifest["shards"].items()}
+
+
+# ======================================================
+# SEARCH (PARALLEL OVER SHARDS, MERGED TOP-K)
+# ======================================================
+def id_selector(mask):
+    """
+    faiss selector over global row ids from a boolean mask. Returns
+    (selector, bitmap); keep the bitmap alive while the selector is used.
+    """
+    bitmap = np.packbits(mask, bitorder="little")
+    # faiss takes the bitmap size in bytes; ids past it are not selected
+    return faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)), bitmap
+
+
+class ShardedIndex:
+
+    def __init__(self, path: str = SHARDS_PATH, workers: int = SHARD_SEARCH_WORKERS):
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No shards at {path}")
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+
+        self.path = path
+        self.field = manifest["field"]
+        self.shards = {}
+        for value, shard in manifest["shards"].items():
+            shard_path = os.path.join(path, shard["file"])
+            try:
+                self.shards[value] = faiss.read_index(
+                    shard_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+                )
+            except RuntimeError:
+                self.shards[value] = faiss.read_index(shard_path)
+
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard")
+
+    def search(self, queries, k: int, values, mask=None,
+               nprobe: int = NPROBE, ef_search: int = EF_SEARCH):
+        """
+        Search the shards for `values` (unknown values are skipped) in
+        parallel and merge their top-k. `mask` optionally restricts results
+        to the global rows it marks. Returns (distances, ids) like faiss.
+        """
+        shards = [self.shards[v] for v in values if v in self.shards]
+        if not shards:
+            return (np.full((len(queries), k), np.inf, dtype="float32"),
+                    np.full((len(queries), k), -1, dtype="int64"))
+
+        # `bitmap` backs the selector and must stay referenced until all
+        # shard searches below have finished
+        selector, bitmap = id_selector(mask) if mask is not None else (None, None)
+
+        def search_one(index):
+            params = search_params(index, nprobe, ef_search, selector)
+            return index.search(queries, k, params=params)
+
+        results = list(self._pool.map(search_one, shards))
+
+        distances = np.concatenate([d for d, _ in results], axis=1)
+        ids = np.concatenate([i for _, i in results], axis=1)
+        distances[ids < 0] = np.inf
+
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+        return (np.take_along_axis(distances, order, axis=1),
+                np.take_along_axis(ids, order, axis=1))
@@ -0,0 +1,314 @@
+import json
+import time
+import uuid
+import itertools
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from config.settings import TRACE_BUFFER_SIZE, TRACE_LOG_SLOW_MS
+
+
+# ======================================================
+# PROMETHEUS METRICS (TEXT EXPOSITION FORMAT, NO CLIENT LIBRARY)
+# ======================================================
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+_metrics = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield from self._render_value(key, value)
+
+    def _render_value(self, key, value):
+        yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def _render_value(self, key, value):
+        counts, total = value
+        cumulative = 0
+        for bound, count in zip(self.buckets, counts):
+            cumulative += count
+            le = 'le="' + _number(bound) + '"'
+            yield f"{self.name}_bucket{_labels(self.labelnames, key, [le])} {cumulative}"
+        yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}"
+        yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --------------------------
+# PIPELINE METRICS
+# --------------------------
+HTTP_REQUEST_SECONDS = Histogram(
+    "nayaya_http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+HTTP_IN_FLIGHT = Gauge("nayaya_http_requests_in_flight", "HTTP requests being handled")
+STAGE_SECONDS = Histogram(
+    "nayaya_stage_seconds", "Time spent in one pipeline stage", ["stage"]
+)
+CHUNKS = Histogram(
+    "nayaya_chunks", "Chunks produced per document or returned per retrieval",
+    ["source"], buckets=COUNT_BUCKETS
+)
+EMBED_BATCH_SIZE = Histogram(
+    "nayaya_embedding_batch_size", "Texts per encoder call", ["model"], buckets=COUNT_BUCKETS
+)
+LLM_REQUESTS = Counter(
+    "nayaya_llm_requests_total", "LLM calls by outcome (ok, error, cache_hit, breaker_open)",
+    ["model", "outcome"]
+)
+LLM_RETRIES = Counter(
+    "nayaya_llm_retries_total", "LLM call retries by HTTP status (or network)", ["model", "reason"]
+)
+LLM_HEDGES = Counter(
+    "nayaya_llm_hedges_total", "Hedged LLM requests sent and which copy answered first", ["outcome"]
+)
+LLM_BREAKER_OPEN = Gauge(
+    "nayaya_llm_breaker_open", "1 while a model's circuit breaker is open", ["model"]
+)
+LLM_TOKENS = Counter(
+    "nayaya_llm_tokens_total", "Token usage reported by the LLM API", ["model", "kind"]
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "nayaya_llm_time_to_first_token_seconds", "Streaming LLM time to first token", ["model"]
+)
+
+
+def record_llm_usage(model: str, usage: dict, attrs: dict = None):
+    """Count prompt / completion tokens from a backend's usage dict (may be None)."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = usage.get(kind) or 0
+        LLM_TOKENS.inc(tokens, model=model, kind=kind[:-len("_tokens")])
+        if attrs is not None:
+            attrs[kind] = tokens
+
+
+# ======================================================
+# REQUEST-SCOPED TRACES
+# ======================================================
+# A trace is opened per HTTP request (or background job) and collects one
+# span per stage. The current trace and span travel in context variables;
+# executors.run_cpu / run_io and concurrency.bounded_* copy the context
+# into their worker threads, so spans from the pools land in the right
+# trace. Spans outside any trace (micro-batched KB searches, CLI scripts)
+# only update the metrics.
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+_span_ids = itertools.count(1)
+
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+class Trace:
+
+    def __init__(self, request_id: str, name: str):
+        self.request_id = request_id
+        self.name = name
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.attrs = {}
+        self.spans = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def offset_ms(self, at: float) -> float:
+        return round((at - self._start) * 1000, 3)
+
+    def add_span(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "request_id": self.request_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "attrs": dict(self.attrs),
+            "spans": spans,
+        }
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def current_attrs() -> dict:
+    """Attributes of the innermost open span (a throwaway dict outside spans)."""
+    span = _current_span.get()
+    return span[1] if span is not None else {}
+
+
+@contextmanager
+def trace_request(request_id: str = None, name: str = "", keep: bool = True):
+    """Open a trace for the enclosed work; `keep=False` collects it without storing it."""
+    trace = Trace(request_id or new_request_id(), name)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+        trace.duration_ms = trace.offset_ms(time.perf_counter())
+        if keep:
+            finish_trace(trace)
+
+
+def finish_trace(trace: Trace):
+    """Keep a finished trace for /traces and log it when slow."""
+    with _recent_lock:
+        _recent[trace.request_id] = trace
+        _recent.move_to_end(trace.request_id)
+        while len(_recent) > TRACE_BUFFER_SIZE:
+            _recent.popitem(last=False)
+
+    if TRACE_LOG_SLOW_MS is not None and trace.duration_ms > TRACE_LOG_SLOW_MS:
+        print(f"🐢 Slow request {trace.request_id}: {json.dumps(trace.to_dict(), default=str)}")
+
+
+def get_trace(request_id: str):
+    with _recent_lock:
+        trace = _recent.get(request_id)
+    return trace.to_dict() if trace is not None else None
+
+
+def recent_traces(limit: int = 20):
+    with _recent_lock:
+        traces = list(_recent.values())[-limit:]
+    return [trace.to_dict() for trace in reversed(traces)]
+
+
+def record_span(stage: str, start: float, end: float, attrs: dict = None,
+                error: str = None, parent=None, span_id: int = None):
+    """Record a finished stage (perf_counter bounds) in the metrics and the current trace."""
+    STAGE_SECONDS.observe(end - start, stage=stage)
+
+    trace = _current_trace.get()
+    if trace is None:
+        return
+    span = {
+        "id": span_id or next(_span_ids),
+        "parent": parent,
+        "stage": stage,
+        "start_ms": trace.offset_ms(start),
+        "duration_ms": round((end - start) * 1000, 3),
+        "thread": threading.current_thread().name,
+        "attrs": attrs or {},
+    }
+    if error:
+        span["error"] = error
+    trace.add_span(span)
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a pipeline stage. The yielded dict can be filled with attributes
+    (counts, models, token usage) while the stage runs.
+    """
+    parent = _current_span.get()
+    span_id = next(_span_ids)
+    token = _current_span.set((span_id, attrs))
+    start = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as exc:
+        error = type(exc).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        record_span(stage, start, time.perf_counter(), attrs, error,
+                    parent[0] if parent is not None else None, span_id)
@@ -1,22 +1,37 @@
 import faiss
 import re
+import time
+import codecs
+import hashlib
 import numpy as np
-from groq import Groq
-from sentence_transformers import SentenceTransformer
+
+from config.settings import (
+    UPLOAD_EMBED_MODEL,
+    SUMMARY_TOKENIZER,
+    SUMMARY_MAP_TOKEN_BUDGET,
+    SUMMARY_REDUCE_TOKEN_BUDGET,
+    MAX_UPLOAD_BYTES,
+    UPLOAD_EMBED_BATCH_SIZE
+)
+from scripts.doc_store import DocumentSession, UnknownDocumentError, document_hash
+from scripts.concurrency import bounded_map, bounded_as_completed
+from scripts.chunk_text import Chunker, iter_chunks
+from scripts.registry import get_document_store, get_embedder, get_tokenizer
+from scripts.llm_client import chat_completion, stream_chat_completion
+from scripts.telemetry import CHUNKS, EMBED_BATCH_SIZE, STAGE_SECONDS, span
 
 
 # ======================================================
 # CONFIG
 # ======================================================
-EMBED_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 MAX_CHARS_PER_CHUNK = 1200
+CHUNK_OVERLAP_CHARS = 0
 TOP_K = 3
 TEMPERATURE = 0.1
 MAX_TOKENS_QA = 512
 MAX_TOKENS_SUMMARY = 256
-
-client = Groq()   # uses GROQ_API_KEY env variable
-embedder = SentenceTransformer(EMBED_MODEL)
+MAX_TOKENS_MERGE = 384
+MAX_TOKENS_FINAL = 512
 
 
 # ======================================================
@@ -28,31 +43,154 @@ def clean_text(text: str) -> str:
 
 
 def chunk_text(text: str, max_chars: int = MAX_CHARS_PER_CHUNK):
-    chunks = []
-    current = ""
-    for sentence in text.split(". "):
-        if len(current) + len(sentence) <= max_chars:
-            current += sentence + ". "
-        else:
-            chunks.append(current.strip())
-            current = sentence + ". "
-    if current:
-        chunks.append(current.strip())
-    return chunks
+    return list(iter_chunks(text, max_chars, CHUNK_OVERLAP_CHARS, unit="char"))
+
+
+def embed(texts, stage: str = "embed"):
+    """Encode with the upload model, recorded as one `stage` span."""
+    with span(stage, model=UPLOAD_EMBED_MODEL, batch_size=len(texts)):
+        EMBED_BATCH_SIZE.observe(len(texts), model=UPLOAD_EMBED_MODEL)
+        return np.asarray(get_embedder(UPLOAD_EMBED_MODEL).encode(texts), dtype="float32")
 
 
 # ======================================================
 # BUILD TEMP FAISS INDEX (SESSION LEVEL)
 # ======================================================
+def _build_session(text: str, document_id: str):
+    with span("clean", chars=len(text)):
+        cleaned = clean_text(text)
+    with span("chunk") as attrs:
+        chunks = chunk_text(cleaned)
+        attrs["chunks"] = len(chunks)
+    CHUNKS.observe(len(chunks), source="upload")
+
+    embeddings = embed(chunks)
+
+    with span("index_build", vectors=len(embeddings)):
+        index = faiss.IndexFlatL2(embeddings.shape[1])
+        index.add(embeddings)
+
+    return DocumentSession(document_id, index, chunks, embeddings)
+
+
 def build_temp_index(text: str):
-    chunks = chunk_text(clean_text(text))
-    embeddings = embedder.encode(chunks)
-    embeddings = np.array(embeddings).astype("float32")
+    session = _build_session(text, document_hash(text))
+    return session.index, session.chunks
+
 
-    index = faiss.IndexFlatL2(embeddings.shape[1])
-    index.add(embeddings)
+# ======================================================
+# STREAMING INGEST (DECODE AND CHUNK AS BYTES ARRIVE)
+# ======================================================
+class DocumentTooLarge(ValueError):
+    pass
+
+
+class StreamingIngest:
+    """
+    Builds a document session from an upload fed in byte blocks, without
+    ever holding the raw bytes or one big string. UTF-8 is decoded
+    incrementally, whitespace is collapsed as clean_text() does, chunks are
+    cut as soon as they are complete and the document_id hash (of the raw
+    text) is updated as the text goes by. Embedding waits for finish():
+    only then is the hash known, and a document already in the store must
+    not be embedded again. The Chunker cuts the same way however the text
+    is split into blocks, so this gives the same chunks and document_id as
+    get_session() on the full text.
+    """
+
+    def __init__(self, max_bytes: int = MAX_UPLOAD_BYTES,
+                 batch_size: int = UPLOAD_EMBED_BATCH_SIZE):
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.num_bytes = 0
+        self.chunks = []
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        self._hash = hashlib.sha256()
+        self._chunker = Chunker(MAX_CHARS_PER_CHUNK, CHUNK_OVERLAP_CHARS, unit="char")
+        self._chunk_seconds = 0.0     # decode + chunk time, summed over blocks
+        self._after_space = True      # drop leading / repeated whitespace across blocks
+
+    def feed(self, block: bytes):
+        self.num_bytes += len(block)
+        if self.max_bytes and self.num_bytes > self.max_bytes:
+            raise DocumentTooLarge(f"Document exceeds {self.max_bytes} bytes")
+        self._add_text(self._decoder.decode(block))
+
+    def finish(self, min_chars: int = 1) -> DocumentSession:
+        """
+        Flush the last chunk and return the cached session, or embed the
+        chunks (in `batch_size` batches) and store a new one. Raises
+        ValueError for documents shorter than `min_chars` once whitespace
+        is collapsed.
+        """
+        self._add_text(self._decoder.decode(b"", final=True))
+        self.chunks.extend(self._chunker.finish())
+        CHUNKS.observe(len(self.chunks), source="upload")
+
+        # Upload chunks don't overlap, so their lengths add up to the cleaned text
+        if sum(len(chunk) for chunk in self.chunks) < min_chars:
+            raise ValueError("Document text too short")
+
+        document_id = self._hash.hexdigest()
+        session = get_document_store().get(document_id)
+        if session is not None:
+            return session
+
+        # Per-block decode / chunk time is only worth a span in aggregate
+        STAGE_SECONDS.observe(self._chunk_seconds, stage="chunk")
+        embeddings = np.concatenate([
+            embed(self.chunks[start:start + self.batch_size])
+            for start in range(0, len(self.chunks), self.batch_size)
+        ])
+        with span("index_build", bytes=self.num_bytes, chunks=len(self.chunks),
+                  chunk_ms=round(self._chunk_seconds * 1000, 3)):
+            index = faiss.IndexFlatL2(embeddings.shape[1])
+            index.add(embeddings)
+
+        return get_document_store().put(DocumentSession(document_id, index, self.chunks, embeddings))
+
+    def _add_text(self, text: str):
+        if not text:
+            return
+        start = time.perf_counter()
+        self._hash.update(text.encode("utf-8"))
+
+        text = re.sub(r'\s+', ' ', text)
+        if self._after_space and text.startswith(" "):
+            text = text[1:]
+        if text:
+            self._after_space = text.endswith(" ")
+            self.chunks.extend(self._chunker.feed(text))
+        self._chunk_seconds += time.perf_counter() - start
 
-    return index, chunks
+
+# ======================================================
+# DOCUMENT SESSIONS (EMBED ONCE, ASK MANY TIMES)
+# ======================================================
+def get_session(text: str = None, document_id: str = None):
+    """
+    Return the session for a document, building it only on first use.
+
+    Lookup is by `document_id` (the SHA-256 of the text) when given,
+    otherwise by hashing `text`. Raises UnknownDocumentError when an
+    unknown id is passed without the text to rebuild it from.
+    """
+    with span("session") as attrs:
+        attrs["cached"] = True
+        if document_id:
+            session = get_document_store().get(document_id)
+            if session is not None:
+                return session
+            if text is None:
+                raise UnknownDocumentError(document_id)
+
+        doc_id = document_hash(text)
+        session = get_document_store().get(doc_id)
+        if session is None:
+            attrs["cached"] = False
+            session = get_document_store().put(_build_session(text, doc_id))
+        return session
 
 
 # ======================================================
@@ -66,23 +204,34 @@ QA_SYSTEM_PROMPT = (
 )
 
 
-def ask_question(index, chunks, question: str):
-    q_emb = embedder.encode([question]).astype("float32")
-    _, idxs = index.search(q_emb, TOP_K)
+def _qa_messages(index, chunks, question: str):
+    q_emb = embed([question], stage="embed_query")
+    with span("search", k=TOP_K):
+        _, idxs = index.search(q_emb, TOP_K)
 
-    context = "\n\n".join([chunks[i] for i in idxs[0]])
+    context = "\n\n".join([chunks[i] for i in idxs[0] if i >= 0])
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[
-            {"role": "system", "content": QA_SYSTEM_PROMPT},
-            {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}\n\nAnswer:"}
-        ],
+    return [
+        {"role": "system", "content": QA_SYSTEM_PROMPT},
+        {"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{question}\n\nAnswer:"}
+    ]
+
+
+def ask_question(index, chunks, question: str):
+    return chat_completion(
+        messages=_qa_messages(index, chunks, question),
         temperature=TEMPERATURE,
         max_tokens=MAX_TOKENS_QA
     )
 
-    return response.choices[0].message.content
+
+def stream_answer(index, chunks, question: str):
+    """Yield the QA answer token by token."""
+    yield from stream_chat_completion(
+        messages=_qa_messages(index, chunks, question),
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS_QA
+    )
 
 
 # ======================================================
@@ -97,18 +246,32 @@ SECTION_QUERIES = {
 }
 
 
-def summarize_by_sections(text: str):
-    index, chunks = build_temp_index(text)
-    section_summaries = {}
+def summarize_by_sections(text: str = None, document_id: str = None):
+    session = get_session(text, document_id)
+
+    answers = bounded_map(
+        lambda query: ask_question(session.index, session.chunks, query),
+        SECTION_QUERIES.values()
+    )
+
+    return dict(zip(SECTION_QUERIES.keys(), answers))
+
 
-    for section, query in SECTION_QUERIES.items():
-        section_summaries[section] = ask_question(index, chunks, query)
+def iter_section_summaries(text: str = None, document_id: str = None):
+    """Yield (section, summary) pairs as soon as each one is ready."""
+    session = get_session(text, document_id)
+    sections = list(SECTION_QUERIES.items())
 
-    return section_summaries
+    completed = bounded_as_completed(
+        lambda query: ask_question(session.index, session.chunks, query),
+        [query for _, query in sections]
+    )
+    for position, answer in completed:
+        yield sections[position][0], answer
 
 
 # ======================================================
-# FULL DOCUMENT SUMMARY (MAP–REDUCE)
+# FULL DOCUMENT SUMMARY (TOKEN-PACKED MAP + TREE REDUCE)
 # ======================================================
 SUMMARY_PROMPT = (
     "You are a legal summarization assistant. "
@@ -116,6 +279,14 @@ SUMMARY_PROMPT = (
     "Do not add new information."
 )
 
+MERGE_SUMMARY_PROMPT = (
+    "You are a legal summarization assistant. "
+    "The following are consecutive partial summaries of one legal judgment. "
+    "Merge them into a single concise summary that keeps every fact, party, "
+    "date and holding they mention, in order. "
+    "Do not add new information."
+)
+
 FINAL_SUMMARY_PROMPT = (
     "You are a legal analyst. "
     "Combine the following partial summaries into a single, coherent summary "
@@ -127,38 +298,131 @@ FINAL_SUMMARY_PROMPT = (
 )
 
 
+def count_tokens(text: str) -> int:
+    # A proxy for the LLM tokenizer; budgets in settings leave headroom
+    return len(get_tokenizer(SUMMARY_TOKENIZER).tokenize(text))
 
-def summarize_document(text: str):
-    chunks = chunk_text(clean_text(text))
-    partial_summaries = []
 
-    # Step 1: Summarize each chunk
-    for chunk in chunks:
-        response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[
-                {"role": "system", "content": SUMMARY_PROMPT},
-                {"role": "user", "content": chunk}
-            ],
-            temperature=TEMPERATURE,
-            max_tokens=MAX_TOKENS_SUMMARY
-        )
-        partial_summaries.append(response.choices[0].message.content)
+def pack_by_tokens(texts, budget: int):
+    """
+    Greedily group consecutive texts so each group stays within `budget`
+    tokens. Every group (except a lone last one) holds at least two texts,
+    so packing always shrinks a list of summaries.
+    """
+    groups = []
+    current, used = [], 0
 
-    # Step 2: Merge summaries
-    merged_text = "\n".join(partial_summaries)
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and used + tokens > budget and len(current) > 1:
+            groups.append(current)
+            current, used = [], 0
+        current.append(text)
+        used += tokens
 
-    final_response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
+    if current:
+        groups.append(current)
+    return groups
+
+
+def summarize_chunk(chunk: str):
+    return chat_completion(
         messages=[
-            {"role": "system", "content": FINAL_SUMMARY_PROMPT},
-            {"role": "user", "content": merged_text}
+            {"role": "system", "content": SUMMARY_PROMPT},
+            {"role": "user", "content": chunk}
         ],
         temperature=TEMPERATURE,
-        max_tokens=512
+        max_tokens=MAX_TOKENS_SUMMARY
+    )
+
+
+def merge_summaries(summaries):
+    return chat_completion(
+        messages=[
+            {"role": "system", "content": MERGE_SUMMARY_PROMPT},
+            {"role": "user", "content": "\n".join(summaries)}
+        ],
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS_MERGE
+    )
+
+
+def _final_summary_messages(partial_summaries):
+    return [
+        {"role": "system", "content": FINAL_SUMMARY_PROMPT},
+        {"role": "user", "content": "\n".join(partial_summaries)}
+    ]
+
+
+def iter_summary_steps(chunks):
+    """
+    Run the map and reduce levels, yielding ("progress", {...}) after every
+    LLM call and finally ("final", messages) for the closing summary call.
+
+    Map: retrieval chunks are packed into calls of SUMMARY_MAP_TOKEN_BUDGET
+    tokens. Reduce: partial summaries are merged in groups that fit
+    SUMMARY_REDUCE_TOKEN_BUDGET, all groups of a level in parallel, until
+    everything fits in one final prompt. Depth grows logarithmically with
+    document length and no prompt exceeds the budgets.
+    """
+    inputs = ["\n".join(group) for group in pack_by_tokens(chunks, SUMMARY_MAP_TOKEN_BUDGET)]
+    partials = [None] * len(inputs)
+
+    completed = bounded_as_completed(summarize_chunk, inputs)
+    for done, (position, summary) in enumerate(completed, start=1):
+        partials[position] = summary
+        yield "progress", {"stage": "map", "level": 0, "done": done, "total": len(inputs)}
+
+    level = 0
+    while len(partials) > 1 and count_tokens("\n".join(partials)) > SUMMARY_REDUCE_TOKEN_BUDGET:
+        level += 1
+        groups = pack_by_tokens(partials, SUMMARY_REDUCE_TOKEN_BUDGET)
+        merged = [None] * len(groups)
+
+        completed = bounded_as_completed(merge_summaries, groups)
+        for done, (position, summary) in enumerate(completed, start=1):
+            merged[position] = summary
+            yield "progress", {"stage": "reduce", "level": level, "done": done, "total": len(groups)}
+
+        partials = merged
+
+    yield "final", _final_summary_messages(partials)
+
+
+def final_summary(messages):
+    return chat_completion(
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=MAX_TOKENS_FINAL
     )
 
-    return final_response.choices[0].message.content
+
+def summarize_document(text: str = None, document_id: str = None):
+    chunks = get_session(text, document_id).chunks
+
+    for event, data in iter_summary_steps(chunks):
+        if event == "final":
+            return final_summary(data)
+
+
+def stream_summary(text: str = None, document_id: str = None):
+    """
+    Yield ("progress", {...}) after every map / reduce call, then the final
+    summary as ("token", text) pieces while the LLM produces it.
+    """
+    chunks = get_session(text, document_id).chunks
+
+    for event, data in iter_summary_steps(chunks):
+        if event == "progress":
+            yield event, data
+            continue
+
+        for piece in stream_chat_completion(
+            messages=data,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS_FINAL
+        ):
+            yield "token", piece
 
 
 # ======================================================
@@ -169,7 +433,8 @@ if __name__ == "__main__":
         document_text = f.read()
 
     print("\n📄 Uploaded document loaded successfully.")
-    index, chunks = build_temp_index(document_text)
+    session = get_session(document_text)
+    index, chunks = session.index, session.chunks
 
     while True:
         mode = input("\nChoose mode (qa / section / summary / exit): ").strip().lower()